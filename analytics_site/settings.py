@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 import sys
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -38,7 +39,6 @@ ALLOWED_HOSTS = ["localhost", "127.0.0.1"] + os.getenv(
 # Application definition
 
 INSTALLED_APPS = [
-    "debug_toolbar",
     "django_tables2",
     "bootstrap3",
     "django_celery_results",
@@ -53,17 +53,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "spotify_filter.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "spotify_filter.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The debug toolbar is for development only, in production staff members
+# profile requests with ProfilingMiddleware instead
+if DEBUG:
+    INSTALLED_APPS.insert(0, "debug_toolbar")
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("whitenoise.middleware.WhiteNoiseMiddleware") + 1,
+        "debug_toolbar.middleware.DebugToolbarMiddleware",
+    )
+
 ROOT_URLCONF = "analytics_site.urls"
 
 TEMPLATES = [
@@ -98,6 +108,28 @@ DATABASES = {
     }
 }
 
+# Streaming replica of the primary database, serving the read-only views
+# wrapped by reads_from_replica. Writes always go to the primary.
+if os.getenv("POSTGRES_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("POSTGRES_REPLICA_HOST"),
+        "PORT": os.getenv("POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["spotify_filter.routers.ReplicaRouter"]
+REPLICA_DATABASE = "replica"
+# After a user's library changed, e.g. by an import, their views read from
+# the primary for this long so that they see the change despite replica lag
+REPLICA_READ_YOUR_WRITES_WINDOW = timedelta(minutes=2)
+# Adds the second database the replica tests read from
+TEST_RUNNER = "spotify_filter.tests.runner.ReplicaTestRunner"
+
+# Number of hash partitions on user_id of the library membership tables
+# created by migrations, 0 for plain tables (see spotify_filter.partitioning).
+# Existing databases are repartitioned with the partition_library command.
+LIBRARY_PARTITIONS = int(os.getenv("LIBRARY_PARTITIONS", "0"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,17 +175,112 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 INTERNAL_IPS = ["127.0.0.1"]
 
+# Staff members profile a request by sending the X-Profile header or the
+# "_profile" query parameter. At most REQUEST_PROFILE_MAX_QUERIES queries of
+# a profiled request are kept.
+REQUEST_PROFILE_MAX_QUERIES = 1000
+
 CELERY_BROKER_URL = (
     f"redis://default:{os.getenv('REDIS_PASSWORD')}"
     f"@{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT')}/0"
 )
-CELERY_RESULT_BACKEND = "django-db"
-CELERY_CACHE_BACKEND = "django-cache"
+
+# Task results (import status polled by the importing page) live in an
+# expiring cache instead of database rows. Redis db 1 in deployments, a
+# process-local stand-in when no Redis is configured (tests, local runs).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "task-results": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": (
+                f"redis://default:{os.getenv('REDIS_PASSWORD')}"
+                f"@{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT')}/1"
+            ),
+        }
+        if os.getenv("REDIS_HOST")
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "task-results",
+        }
+    ),
+}
+CELERY_RESULT_BACKEND = "django-cache"
+CELERY_CACHE_BACKEND = "task-results"
+CELERY_RESULT_EXPIRES = timedelta(days=1)
 CELERY_RESULTS_EXTENDED = True
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
+# Imports a user is waiting for, background syncs and artist enrichment run
+# on their own queues, so a short enrichment never waits behind a long sync:
+#   interactive,default  -c 4 --prefetch-multiplier=1  (first imports, tokens)
+#   sync                 -c 2 --prefetch-multiplier=1  (long delta syncs)
+#   enrichment           -c 2 --prefetch-multiplier=4  (short artist updates)
+# A worker consuming several queues reads them in the order given to -Q.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_ROUTES = {
+    "spotify_filter.tasks.import_spotify_data_task": {
+        "queue": "interactive",
+        "priority": 0,
+    },
+    "spotify_filter.tasks.import_library_file_task": {
+        "queue": "interactive",
+        "priority": 0,
+    },
+    "spotify_filter.tasks.enrich_library_task": {"queue": "enrichment", "priority": 3},
+    "spotify_filter.tasks.sync_library_task": {"queue": "sync", "priority": 6},
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+# Redis emulates priorities (0 = highest) with one list per priority step
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+# long tasks: reserve one message at a time and acknowledge it when done,
+# so a busy worker doesn't hold back messages other workers could run
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+
+# Spotify access tokens live for an hour. The beat job refreshes the ones
+# expiring within the margin, so imports almost always find a fresh token.
+SPOTIFY_TOKEN_REFRESH_MARGIN = timedelta(minutes=15)
+SPOTIFY_TOKEN_REFRESH_JITTER = timedelta(minutes=2)
+SPOTIFY_TOKEN_REFRESH_BATCH_SIZE = 500
+SPOTIFY_TOKEN_RETRY_DELAY = timedelta(minutes=30)
+# refresh claims older than this are left by crashed tasks and are taken over
+SPOTIFY_TOKEN_REFRESH_TIMEOUT = timedelta(minutes=2)
+
+# Scheduled delta syncs. Every run queues the most overdue libraries, up to
+# the concurrency cap, with start times spread over the run interval. Users
+# who logged in within the active window are synced more often.
+SPOTIFY_SYNC_SCHEDULE_INTERVAL = timedelta(minutes=10)
+SPOTIFY_SYNC_INTERVAL = timedelta(hours=6)
+SPOTIFY_SYNC_INACTIVE_INTERVAL = timedelta(days=1)
+SPOTIFY_SYNC_ACTIVE_WINDOW = timedelta(days=7)
+SPOTIFY_SYNC_MAX_CONCURRENT = 10
+# queued syncs that didn't finish in time no longer count against the cap
+SPOTIFY_SYNC_TIMEOUT = timedelta(hours=1)
+
+CELERY_BEAT_SCHEDULE = {
+    "refresh-spotify-tokens": {
+        "task": "spotify_filter.tasks.refresh_expiring_tokens_task",
+        "schedule": timedelta(minutes=5),
+    },
+    "schedule-library-syncs": {
+        "task": "spotify_filter.tasks.schedule_library_syncs_task",
+        "schedule": SPOTIFY_SYNC_SCHEDULE_INTERVAL,
+    },
+    "prune-task-results": {
+        "task": "spotify_filter.tasks.prune_task_results_task",
+        "schedule": timedelta(hours=1),
+    },
+}
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -181,6 +308,22 @@ LOGIN_REDIRECT_URL = "/spotify_filter/"
 LOGOUT_URL = "/spotify_filter/logout/"
 LOGOUT_REDIRECT_URL = "/spotify_filter/"
 
+# Backend writing imported albums: "copy" (PostgreSQL COPY into staging
+# tables), "orm" (bulk_create) or "auto" (copy on PostgreSQL, orm otherwise)
+SPOTIFY_IMPORT_LOADER = os.getenv("SPOTIFY_IMPORT_LOADER", "auto")
+
+# Client reading the Spotify API: "spotipy" (one request at a time) or
+# "async" (httpx, up to SPOTIFY_IMPORT_CONCURRENCY requests in flight)
+SPOTIFY_IMPORTER = os.getenv("SPOTIFY_IMPORTER", "spotipy")
+SPOTIFY_IMPORT_CONCURRENCY = int(os.getenv("SPOTIFY_IMPORT_CONCURRENCY", "8"))
+
+# Port on which Celery workers expose their Prometheus metrics, the web
+# process serves them at /metrics. Forking servers and workers also need
+# PROMETHEUS_MULTIPROC_DIR in the environment.
+PROMETHEUS_WORKER_PORT = int(os.getenv("PROMETHEUS_WORKER_PORT", "0")) or None
+# Bearer token the scraper sends to read /metrics, which is disabled without it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
@@ -15,12 +15,20 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from debug_toolbar.toolbar import debug_toolbar_urls
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from spotify_filter.metrics import metrics_view
+
 urlpatterns = [
     path("spotify_filter/", include("spotify_filter.urls")),
     path("polls/", include("polls.urls")),
     path("admin/", admin.site.urls),
-] + debug_toolbar_urls()
+    path("metrics", metrics_view, name="metrics"),
+]
+
+if settings.DEBUG:
+    from debug_toolbar.toolbar import debug_toolbar_urls
+
+    urlpatterns += debug_toolbar_urls()
@@ -1,12 +1,24 @@
 from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-from .models import Album, Artist, SpotifyToken, Track
+from .models import (
+    Album,
+    Artist,
+    ImportRun,
+    LibraryAlbum,
+    RequestProfile,
+    SpotifyToken,
+    Track,
+)
 
 
 class ArtistAdmin(admin.ModelAdmin):
     """Admin representation for Artist model."""
 
-    list_display = ("name", "spotify_id", "user_id")
+    list_display = ("name", "spotify_id")
     list_filter = ["genres"]
     search_fields = ["name"]
 
@@ -14,11 +26,19 @@ class ArtistAdmin(admin.ModelAdmin):
 class AlbumAdmin(admin.ModelAdmin):
     """Admin representation for Album model."""
 
-    list_display = ("title", "added_at", "release_date", "popularity", "user_id")
+    list_display = ("title", "release_date", "popularity", "spotify_id")
     list_filter = ["release_date"]
     search_fields = ["title"]
 
 
+class LibraryAlbumAdmin(admin.ModelAdmin):
+    """Admin representation for LibraryAlbum model."""
+
+    list_display = ("album", "user", "added_at")
+    list_select_related = ("album", "user")
+    search_fields = ["album__title", "user__username"]
+
+
 class TrackAdmin(admin.ModelAdmin):
     """Admin representation for Track model."""
 
@@ -29,11 +49,77 @@ class TrackAdmin(admin.ModelAdmin):
 class TokenAdmin(admin.ModelAdmin):
     """Admin representation for SpotifyToken model."""
 
-    list_display = ("user", "expires_at")
-    search_fields = ["user"]
+    list_display = ("user", "expires_at", "refreshed_at", "refresh_failures")
+    list_filter = ["refresh_failed_at"]
+    search_fields = ["user__username"]
+
+
+class ImportRunAdmin(admin.ModelAdmin):
+    """Admin representation for ImportRun model."""
+
+    list_display = ("user", "kind", "importer", "started_at", "wall_time")
+    list_filter = ["kind", "importer"]
+    list_select_related = ("user",)
+    search_fields = ["user__username"]
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Admin representation for RequestProfile model, with profile download."""
+
+    list_display = (
+        "created_at",
+        "method",
+        "path",
+        "status_code",
+        "duration",
+        "query_count",
+        "user",
+    )
+    list_filter = ["view_name"]
+    list_select_related = ("user",)
+    search_fields = ["path", "user__username"]
+    exclude = ["profile"]
+    readonly_fields = ["download_link"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="spotify_filter_requestprofile_download",
+            )
+        ] + super().get_urls()
+
+    @admin.display(description="Profile")
+    def download_link(self, obj):
+        """Link to the pstats file of the profile."""
+        url = reverse("admin:spotify_filter_requestprofile_download", args=[obj.pk])
+        return format_html('<a href="{}">Download (.prof)</a>', url)
+
+    def download_view(self, request, pk):
+        """Serve the profile as a pstats file, e.g. for snakeviz."""
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            bytes(profile.profile), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="request-{profile.pk}.prof"'
+        )
+        return response
 
 
 admin.site.register(Artist, ArtistAdmin)
 admin.site.register(Album, AlbumAdmin)
+admin.site.register(LibraryAlbum, LibraryAlbumAdmin)
 admin.site.register(Track, TrackAdmin)
 admin.site.register(SpotifyToken, TokenAdmin)
+admin.site.register(ImportRun, ImportRunAdmin)
+admin.site.register(RequestProfile, RequestProfileAdmin)
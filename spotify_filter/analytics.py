@@ -0,0 +1,222 @@
+import numpy as np
+
+from .models import Album, AlbumTrack, Artist, Genre
+
+
+def _column(rows, index, dtype):
+    """Return one column of values_list rows as a NumPy array."""
+    return np.fromiter((row[index] for row in rows), dtype=dtype, count=len(rows))
+
+
+def _dense_index(ids, keys):
+    """
+    Map database ids to their positions in the sorted `keys` array.
+
+    Returns:
+        tuple: The positions, and the mask of the ids found in `keys`. The
+            positions of the other ids are meaningless.
+    """
+    positions = np.searchsorted(keys, ids)
+    # ids above the largest key get len(keys), past the end of `keys`
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == ids[found]
+    return positions, found
+
+
+def _dense_links(rows, left_keys, right_keys):
+    """
+    Map (left id, right id) link rows to pairs of dense row indices, dropping
+    the links to ids missing from the keys, e.g. rows written between the
+    queries of LibraryAnalytics.load.
+    """
+    left, left_found = _dense_index(_column(rows, 0, np.int64), left_keys)
+    right, right_found = _dense_index(_column(rows, 1, np.int64), right_keys)
+    found = left_found & right_found
+    return left[found], right[found]
+
+
+class LibraryAnalytics:  # pylint: disable=too-many-instance-attributes
+    """
+    Columnar snapshot of one user's library for vectorized statistics.
+
+    The library is loaded with a handful of bulk values_list queries into
+    NumPy arrays. Relationships are stored as pairs of dense row indices
+    (e.g. album_artist_album[i] and album_artist_artist[i] form one link),
+    so every statistic is computed with array operations instead of
+    Python loops over ORM instances.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, albums, artists, genres, album_tracks, album_artists, genre_links
+    ):
+        """Build the arrays from the raw values_list rows.
+
+        Args:
+            albums (list): (id, release_date, added_at) rows.
+            artists (list): (id, name) rows.
+            genres (list): (id, name) rows.
+            album_tracks (list): (album_id, duration_ms) rows.
+            album_artists (list): (album_id, artist_id) rows.
+            genre_links (list): (artist_id, genre_id) rows.
+        """
+        albums = sorted(albums)
+        artists = sorted(artists)
+        genres = sorted(genres)
+
+        self.album_ids = _column(albums, 0, np.int64)
+        self.album_release_year = (
+            _column(albums, 1, "datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+            + 1970
+        )
+        self.album_added_at = np.fromiter(
+            (row[2].timestamp() for row in albums), dtype=np.float64, count=len(albums)
+        ).astype("datetime64[s]")
+
+        self.artist_ids = _column(artists, 0, np.int64)
+        self.artist_names = np.array([row[1] for row in artists], dtype=object)
+
+        self.genre_ids = _column(genres, 0, np.int64)
+        self.genre_names = np.array([row[1] for row in genres], dtype=object)
+
+        track_album, found = _dense_index(
+            _column(album_tracks, 0, np.int64), self.album_ids
+        )
+        self.track_album = track_album[found]
+        self.track_duration_ms = _column(album_tracks, 1, np.int64)[found]
+
+        self.album_artist_album, self.album_artist_artist = _dense_links(
+            album_artists, self.album_ids, self.artist_ids
+        )
+        self.artist_genre_artist, self.artist_genre_genre = _dense_links(
+            genre_links, self.artist_ids, self.genre_ids
+        )
+
+    @classmethod
+    def load(cls, user):
+        """Load the user's library with one bulk query per table."""
+        return cls(
+            albums=list(
+                Album.objects.for_user(user).values_list(
+                    "id", "release_date", "added_at"
+                )
+            ),
+            artists=list(Artist.objects.for_user(user).values_list("id", "name")),
+            genres=list(
+                Genre.objects.filter(artists__memberships__user=user)
+                .distinct()
+                .values_list("id", "name")
+            ),
+            album_tracks=list(
+                AlbumTrack.objects.filter(album__memberships__user=user)
+                .order_by()
+                .values_list("album_id", "track__duration_ms")
+            ),
+            album_artists=list(
+                Album.artists.through.objects.filter(
+                    album__memberships__user=user
+                ).values_list("album_id", "artist_id")
+            ),
+            genre_links=list(
+                Artist.genres.through.objects.filter(
+                    artist__memberships__user=user
+                ).values_list("artist_id", "genre_id")
+            ),
+        )
+
+    def release_year_histogram(self):
+        """
+        Count the albums released in each year.
+
+        Returns:
+            tuple: (years, counts) arrays covering every year from the oldest
+                to the newest release, including years without albums.
+        """
+        if self.album_release_year.size == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        first = self.album_release_year.min()
+        counts = np.bincount(self.album_release_year - first)
+        return np.arange(first, first + counts.size), counts
+
+    def added_at_series(self, unit="M"):
+        """
+        Count the albums saved to the library per period.
+
+        Args:
+            unit (str): NumPy datetime unit of the periods, e.g. "M" or "W".
+        Returns:
+            tuple: (periods, counts) arrays covering every period from the
+                first to the last save, including periods without saves.
+        """
+        if self.album_added_at.size == 0:
+            return np.array([], dtype=f"datetime64[{unit}]"), np.array(
+                [], dtype=np.int64
+            )
+        periods = self.album_added_at.astype(f"datetime64[{unit}]")
+        first = periods.min()
+        counts = np.bincount((periods - first).astype(np.int64))
+        return first + np.arange(counts.size), counts
+
+    def album_durations(self):
+        """Return the total duration in ms of each album, aligned with album_ids."""
+        return np.bincount(
+            self.track_album,
+            weights=self.track_duration_ms,
+            minlength=self.album_ids.size,
+        ).astype(np.int64)
+
+    def artist_duration_totals(self):
+        """
+        Return the total duration in ms of each artist's albums, aligned with
+        artist_ids. Albums with several artists count fully for each of them.
+        """
+        album_durations = self.album_durations()
+        return np.bincount(
+            self.album_artist_artist,
+            weights=album_durations[self.album_artist_album],
+            minlength=self.artist_ids.size,
+        ).astype(np.int64)
+
+    def top_artists_by_duration(self, n=10):
+        """Return [(artist name, duration ms), ...] for the n longest artists."""
+        totals = self.artist_duration_totals()
+        order = np.argsort(-totals, kind="stable")[:n]
+        return [(self.artist_names[i], int(totals[i])) for i in order if totals[i] > 0]
+
+    def genre_cooccurrence(self, max_genres=50):
+        """
+        Count how many artists share each pair of genres.
+
+        Only the `max_genres` most common genres are considered, so the
+        result stays small for libraries with thousands of genres.
+
+        Returns:
+            tuple: (genre names, matrix) where matrix[i, j] is the number of
+                artists tagged with both genres i and j, and matrix[i, i] the
+                number of artists tagged with genre i.
+        """
+        genre_counts = np.bincount(
+            self.artist_genre_genre, minlength=self.genre_ids.size
+        )
+        top = np.argsort(-genre_counts, kind="stable")[:max_genres]
+        top = top[genre_counts[top] > 0]
+        column = np.full(self.genre_ids.size, -1, dtype=np.int64)
+        column[top] = np.arange(top.size)
+
+        links = column[self.artist_genre_genre] >= 0
+        incidence = np.zeros((self.artist_ids.size, top.size), dtype=np.int64)
+        incidence[
+            self.artist_genre_artist[links], column[self.artist_genre_genre[links]]
+        ] = 1
+        return self.genre_names[top], incidence.T @ incidence
+
+    def top_genre_pairs(self, n=10, max_genres=50):
+        """Return [(genre, genre, artist count), ...] for the most shared pairs."""
+        names, matrix = self.genre_cooccurrence(max_genres=max_genres)
+        rows, cols = np.triu_indices(names.size, k=1)
+        counts = matrix[rows, cols]
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [
+            (names[rows[i]], names[cols[i]], int(counts[i]))
+            for i in order
+            if counts[i] > 0
+        ]
@@ -1,3 +1,5 @@
+from importlib import import_module
+
 from django.apps import AppConfig
 
 
@@ -6,3 +8,7 @@ class SpotifyFilterConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "spotify_filter"
+
+    def ready(self):
+        # connect the Celery signal handlers recording task metrics
+        import_module(f"{self.name}.metrics")
@@ -9,12 +9,7 @@ class ArtistFilter(FilterSet):
     artist_name = CharFilter(
         field_name="name", lookup_expr="icontains", label="Artist", distinct=True
     )
-    album_name = CharFilter(
-        field_name="albums__title",
-        lookup_expr="icontains",
-        label="Album",
-        distinct=True,
-    )
+    album_name = CharFilter(method="filter_by_album", label="Album", distinct=True)
     genre_name = CharFilter(method="filter_by_genre", label="Genres", distinct=True)
 
     class Meta:
@@ -23,6 +18,12 @@ class ArtistFilter(FilterSet):
         model = Artist
         fields = ["artist_name", "album_name", "genre_name"]
 
+    def filter_by_album(self, queryset, _name, value):
+        """Filter by the titles of the albums in the requesting user's library"""
+        return queryset.filter(
+            albums__title__icontains=value, albums__memberships__user=self.request.user
+        ).distinct()
+
     def filter_by_genre(self, queryset, _name, value):
         """Allow filtering of multiple comma- or space-separated genre keywords"""
         # separate the keywords to a list
@@ -11,3 +11,12 @@ class UserRegisterForm(UserCreationForm):
     class Meta:
         model = get_user_model()
         fields = ["username", "email", "password1", "password2"]
+
+
+class LibraryUploadForm(forms.Form):
+    """Form for uploading a Spotify account data export."""
+
+    library_file = forms.FileField(
+        label="Library file",
+        help_text="YourLibrary.json from your Spotify account data export.",
+    )
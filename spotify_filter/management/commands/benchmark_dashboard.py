@@ -0,0 +1,245 @@
+import re
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from spotify_filter.models import Album, Artist, LibraryAlbum, LibraryArtist
+
+PAGE_SIZE = 25
+# cost and timing details of EXPLAIN ANALYZE plan nodes
+PLAN_DETAILS = re.compile(r"\s+\(cost=.*$")
+BATCH_SIZE = 5000
+
+# (table, sort) pairs offered by ArtistTable and AlbumTable
+DASHBOARD_SORTS = [
+    ("artists", "name"),
+    ("artists", "-name"),
+    ("albums", "title"),
+    ("albums", "-release_date"),
+    ("albums", "-popularity"),
+    ("albums", "-added_at"),
+    ("albums", "added_at"),
+]
+
+
+def _slice(ids, n, share):
+    """
+    Yield the (position, id) pairs of the ids owned by the n-th benchmark
+    user: all of them for the first user, else a window of `share` of them
+    wrapping around the end, starting half a window after the previous one.
+    """
+    if n == 0:
+        yield from enumerate(ids)
+        return
+    window = max(round(len(ids) * share), 1)
+    start = (n - 1) * window // 2
+    for i, item in enumerate(ids):
+        if (i - start) % len(ids) < window:
+            yield i, item
+
+
+class Command(BaseCommand):
+    """Compare dashboard query plans and latency with and without the indexes."""
+
+    help = (
+        "Build a large synthetic library inside a transaction that is rolled "
+        "back, then EXPLAIN ANALYZE the dashboard's first-page queries for every "
+        "sort order with and without the models' secondary indexes, for a user "
+        "owning the whole catalog and for one owning a slice of it. Until the "
+        "rollback the benchmark holds locks on the library tables, so run it "
+        "on a scratch database and confirm with --yes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--albums", type=int, default=50000, help="Albums in the library."
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=5,
+            help=(
+                "Users sharing the catalog, one owning all of it and the others "
+                "overlapping slices."
+            ),
+        )
+        parser.add_argument(
+            "--share",
+            type=float,
+            default=0.1,
+            help="Fraction of the catalog in each slice.",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Timed runs per query."
+        )
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Print the full query plans instead of their node types.",
+        )
+        parser.add_argument(
+            "--database", default="default", help="Scratch database to use."
+        )
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            help="Confirm that the database may be written to and locked.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if connections[using].vendor != "postgresql":
+            raise CommandError("The benchmark needs PostgreSQL for EXPLAIN ANALYZE.")
+        if not 0 < options["share"] <= 1:
+            raise CommandError("--share must be a fraction between 0 and 1.")
+        if not options["yes"]:
+            raise CommandError(
+                f"The benchmark inserts rows into and drops indexes of the "
+                f"{using!r} database, locking its library tables until it rolls "
+                f"back. Run it on a scratch database and pass --yes."
+            )
+        with transaction.atomic(using=using):
+            libraries = self._build_library(
+                options["albums"], options["users"], options["share"], using
+            )
+            with_indexes = {
+                library: self._measure(user, options)
+                for library, user in libraries.items()
+            }
+            self._drop_indexes(using)
+            without_indexes = {
+                library: self._measure(user, options)
+                for library, user in libraries.items()
+            }
+            transaction.set_rollback(True, using=using)
+
+        for library, results in with_indexes.items():
+            self._report(library, results, without_indexes[library], options)
+
+    def _report(self, library, with_indexes, without_indexes, options):
+        """Print the latency and the plans of one library's queries."""
+        self.stdout.write(f"{library}:")
+        self.stdout.write(f"{'query':<28}{'indexed ms':>12}{'plain ms':>12}")
+        for label, (indexed_ms, indexed_plan) in with_indexes.items():
+            plain_ms, plain_plan = without_indexes[label]
+            self.stdout.write(f"{label:<28}{indexed_ms:>12.2f}{plain_ms:>12.2f}")
+            for name, plan in [("indexed", indexed_plan), ("plain", plain_plan)]:
+                self.stdout.write(f"  {name} plan:")
+                for line in plan.splitlines():
+                    if not options["plans"]:
+                        if "->" not in line and not line[:1].isalpha():
+                            continue
+                        line = PLAN_DETAILS.sub("", line)
+                    self.stdout.write(f"    {line}")
+
+    @staticmethod
+    def _build_library(album_count, user_count, share, using):
+        """
+        Create a catalog of album_count albums, a user owning all of it and
+        users owning slices of `share` of it, each overlapping the next by
+        half. Returns {description: user} for the full library and, with
+        more than one user, for the first slice.
+        """
+        users = [
+            get_user_model().objects.using(using).create(username=f"benchmark-{i}")
+            for i in range(max(user_count, 1))
+        ]
+        now = timezone.now()
+        Album.objects.using(using).bulk_create(
+            (
+                Album(
+                    spotify_id=f"benchmark-album-{i}",
+                    title=f"Album {i * 7919 % album_count:06d}",
+                    release_date=(now - timedelta(days=i * 37 % 20000)).date(),
+                    popularity=i * 31 % 101,
+                    total_tracks=i % 20 + 1,
+                )
+                for i in range(album_count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Artist.objects.using(using).bulk_create(
+            (
+                Artist(
+                    spotify_id=f"benchmark-artist-{i}",
+                    name=f"Artist {i * 7919 % album_count:06d}",
+                )
+                for i in range(album_count // 2)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        album_ids = list(
+            Album.objects.using(using)
+            .filter(spotify_id__startswith="benchmark-")
+            .values_list("id", flat=True)
+        )
+        artist_ids = list(
+            Artist.objects.using(using)
+            .filter(spotify_id__startswith="benchmark-")
+            .values_list("id", flat=True)
+        )
+        for n, user in enumerate(users):
+            LibraryAlbum.objects.using(using).bulk_create(
+                (
+                    LibraryAlbum(
+                        user=user,
+                        album_id=album_id,
+                        added_at=now - timedelta(minutes=i * 13 % 500000),
+                    )
+                    for i, album_id in _slice(album_ids, n, share)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            LibraryArtist.objects.using(using).bulk_create(
+                (
+                    LibraryArtist(user=user, artist_id=artist_id)
+                    for _, artist_id in _slice(artist_ids, n, share)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        with connections[using].cursor() as cursor:
+            for model in [Album, Artist, LibraryAlbum, LibraryArtist]:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        libraries = {f"full library ({len(album_ids)} albums)": users[0]}
+        if len(users) > 1:
+            sliced = LibraryAlbum.objects.using(using).filter(user=users[1]).count()
+            libraries[f"partial library ({sliced} albums)"] = users[1]
+        return libraries
+
+    @staticmethod
+    def _queryset(user, table, sort, using):
+        """Return the first dashboard page of the table in the given order."""
+        if table == "artists":
+            queryset = Artist.objects.using(using).for_user(user)
+        else:
+            queryset = Album.objects.using(using).for_user(user)
+        return queryset.order_by(sort)[:PAGE_SIZE]
+
+    def _measure(self, user, options):
+        """Return {label: (median ms, plan)} for every dashboard sort."""
+        results = {}
+        for table, sort in DASHBOARD_SORTS:
+            queryset = self._queryset(user, table, sort, options["database"])
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[f"{table} by {sort}"] = (
+                statistics.median(timings),
+                queryset.explain(analyze=True),
+            )
+        return results
+
+    @staticmethod
+    def _drop_indexes(using):
+        """Drop the secondary indexes of the dashboard models."""
+        with connections[using].schema_editor(atomic=False) as schema_editor:
+            for model in [Album, Artist, LibraryAlbum]:
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
@@ -0,0 +1,129 @@
+import json
+import tracemalloc
+from itertools import product
+from string import ascii_uppercase
+
+from django.core.management.base import BaseCommand
+
+from spotify_filter.spotify_import.records import SavedAlbum
+
+# about as many markets as Spotify lists for a worldwide release
+MARKETS = ["".join(pair) for pair in product(ascii_uppercase, repeat=2)][:185]
+
+
+def _artist(i):
+    """Return a simplified artist object of the Spotify API."""
+    return {
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/artist{i}"},
+        "href": f"https://api.spotify.com/v1/artists/artist{i}",
+        "id": f"artist{i}",
+        "name": f"Artist {i}",
+        "type": "artist",
+        "uri": f"spotify:artist:artist{i}",
+    }
+
+
+def saved_album_payload(i, tracks):
+    """
+    Return the JSON of a saved-album entry shaped like those of the Spotify
+    API, with the given number of tracks.
+    """
+    album_id = f"album{i}"
+    items = [
+        {
+            "artists": [_artist(i)],
+            "available_markets": MARKETS,
+            "disc_number": 1,
+            "duration_ms": 200000 + n,
+            "explicit": False,
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{i}-{n}"},
+            "href": f"https://api.spotify.com/v1/tracks/{i}-{n}",
+            "id": f"{i}-{n}",
+            "is_local": False,
+            "name": f"Track {n} of album {i}",
+            "preview_url": None,
+            "track_number": n + 1,
+            "type": "track",
+            "uri": f"spotify:track:{i}-{n}",
+        }
+        for n in range(tracks)
+    ]
+    album = {
+        "album_type": "album",
+        "total_tracks": tracks,
+        "available_markets": MARKETS,
+        "external_urls": {"spotify": f"https://open.spotify.com/album/{album_id}"},
+        "href": f"https://api.spotify.com/v1/albums/{album_id}",
+        "id": album_id,
+        "images": [
+            {"url": f"https://i.scdn.co/image/{album_id}-{size}", "height": size}
+            for size in [640, 300, 64]
+        ],
+        "name": f"Album {i}",
+        "release_date": "2020-01-31",
+        "release_date_precision": "day",
+        "type": "album",
+        "uri": f"spotify:album:{album_id}",
+        "artists": [_artist(i)],
+        "tracks": {
+            "href": f"https://api.spotify.com/v1/albums/{album_id}/tracks",
+            "limit": 50,
+            "next": None,
+            "offset": 0,
+            "previous": None,
+            "total": tracks,
+            "items": items,
+        },
+        "copyrights": [
+            {"text": f"(C) 2020 Label {i}", "type": "C"},
+            {"text": f"(P) 2020 Label {i}", "type": "P"},
+        ],
+        "external_ids": {"upc": f"{i:012d}"},
+        "genres": [],
+        "label": f"Label {i}",
+        "popularity": i % 101,
+    }
+    return json.dumps({"added_at": "2025-01-31T12:00:00Z", "album": album})
+
+
+class Command(BaseCommand):
+    """Compare the memory of raw and projected saved-album entries."""
+
+    help = (
+        "Decode synthetic saved-album pages like an import does and report the "
+        "memory held per album by the raw entries and by their SavedAlbum "
+        "projections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--albums", type=int, default=2000, help="Albums in the library."
+        )
+        parser.add_argument("--tracks", type=int, default=12, help="Tracks per album.")
+
+    def handle(self, *args, **options):
+        payloads = [
+            saved_album_payload(i, options["tracks"]) for i in range(options["albums"])
+        ]
+        # a fresh decode per album, as every API page is decoded separately
+        raw = self._measure(lambda: [json.loads(p) for p in payloads])
+        projected = self._measure(lambda: [SavedAlbum(json.loads(p)) for p in payloads])
+        self.stdout.write(f"{'':<12}{'bytes/album':>14}{'total MiB':>12}")
+        for label, size in [("raw", raw), ("projected", projected)]:
+            self.stdout.write(
+                f"{label:<12}{size / len(payloads):>14.0f}{size / 2**20:>12.1f}"
+            )
+        self.stdout.write(f"reduction: {raw / projected:.1f}x")
+
+    @staticmethod
+    def _measure(build):
+        """Return the bytes still allocated by the result of `build`."""
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            result = build()
+            size = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        del result
+        return size
@@ -0,0 +1,99 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# modules a web process should only load once a Spotify view or task needs them
+LAZY_MODULES = ["spotipy", "requests", "httpx"]
+
+# Run in a fresh interpreter: boot the WSGI application like a gunicorn
+# worker, then time the first and a second request through it
+PROBE = """
+import json, sys, time
+from io import BytesIO
+
+start = time.perf_counter()
+from analytics_site.wsgi import application
+boot = time.perf_counter() - start
+
+
+def request():
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": sys.argv[1],
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "443",
+        "HTTP_HOST": "localhost",
+        "HTTP_X_FORWARDED_PROTO": "https",
+        "wsgi.url_scheme": "https",
+        "wsgi.input": BytesIO(),
+        "wsgi.errors": sys.stderr,
+    }
+    statuses = []
+    start = time.perf_counter()
+    body = application(environ, lambda status, headers: statuses.append(status))
+    b"".join(body)
+    return time.perf_counter() - start, statuses[0]
+
+
+cold, status = request()
+warm, _ = request()
+print(json.dumps({
+    "boot": boot,
+    "cold": cold,
+    "warm": warm,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    """Measure web process startup and cold request latency."""
+
+    help = (
+        "Boot the WSGI application in fresh interpreters, as a gunicorn worker "
+        "does, and report the boot time, the latency of the first and a second "
+        "request, and which Spotify client modules got loaded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/spotify_filter/",
+            help="Path requested after the boot.",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Interpreters started."
+        )
+
+    def handle(self, *args, **options):
+        runs = [self._probe(options["path"]) for _ in range(options["repeat"])]
+        self.stdout.write(f"{'':<16}{'median ms':>12}{'max ms':>12}")
+        for key, label in [
+            ("boot", "boot"),
+            ("cold", "first request"),
+            ("warm", "second request"),
+        ]:
+            timings = [run[key] * 1000 for run in runs]
+            self.stdout.write(
+                f"{label:<16}{statistics.median(timings):>12.1f}{max(timings):>12.1f}"
+            )
+        self.stdout.write(f"status: {runs[0]['status']}")
+        loaded = sorted({name for run in runs for name in run["loaded"]})
+        self.stdout.write(f"Spotify client modules loaded: {', '.join(loaded) or '-'}")
+
+    @staticmethod
+    def _probe(path):
+        """Return the timings of one fresh interpreter."""
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE % LAZY_MODULES, path],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"The startup probe failed:\n{result.stderr}")
+        return json.loads(result.stdout.splitlines()[-1])
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from spotify_filter.spotify_import.import_logic import import_from_spotify
+from spotify_filter.spotify_import.loaders import LOADERS, get_loader
+from spotify_filter.spotify_import.offline import FileImporter
+
+
+class Command(BaseCommand):
+    """Import a user's library from exported JSON files without network calls."""
+
+    help = (
+        "Import saved albums from Spotify account data exports (YourLibrary.json) "
+        "or saved-album API dumps into a user's library."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="Owner of the imported library.")
+        parser.add_argument("album_files", nargs="+", help="Files with saved albums.")
+        parser.add_argument(
+            "--artists",
+            action="append",
+            default=[],
+            help="File with artist objects used for genres and images.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of albums written to the database at once "
+            "(defaults to the batch size of the loader).",
+        )
+        parser.add_argument(
+            "--loader",
+            choices=["auto", *LOADERS],
+            help="Loader backend writing the albums "
+            "(defaults to the SPOTIFY_IMPORT_LOADER setting).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["username"])
+        except get_user_model().DoesNotExist as exc:
+            raise CommandError(f"User {options['username']} does not exist") from exc
+        importer = FileImporter(user, options["album_files"], options["artists"])
+        stats = import_from_spotify(
+            user,
+            importer=importer,
+            batch_size=options["batch_size"],
+            loader=get_loader(options["loader"]),
+        )
+        self.stdout.write(str(stats))
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from spotify_filter.partitioning import PARTITIONED_MODELS, partition_of, partitions
+
+
+class Command(BaseCommand):
+    """Report on and vacuum the library partitions one at a time."""
+
+    help = (
+        "List the partitions of the library membership tables with their rows, "
+        "table and index sizes, optionally only the partition of one user, and "
+        "VACUUM ANALYZE them one partition at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Only the partitions holding this user's library."
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="VACUUM ANALYZE the partitions before reporting.",
+        )
+        parser.add_argument("--database", default="default", help="Database to use.")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        connection = connections[using]
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning needs PostgreSQL.")
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist as e:
+                raise CommandError(f"Unknown user {options['user']}") from e
+
+        tables = self._tables(user, using)
+        with connection.cursor() as cursor:
+            if options["vacuum"]:
+                for table in tables:
+                    cursor.execute(
+                        f"VACUUM (ANALYZE) {connection.ops.quote_name(table)}"
+                    )
+            cursor.execute(
+                """
+                SELECT c.relname, stats.n_live_tup, stats.n_dead_tup,
+                    pg_table_size(c.oid), pg_indexes_size(c.oid)
+                FROM pg_class c
+                LEFT JOIN pg_stat_user_tables stats ON stats.relid = c.oid
+                WHERE c.relname = ANY(%s)
+                """,
+                [tables],
+            )
+            rows = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        self.stdout.write(
+            f"{'partition':<40}{'rows':>10}{'dead':>10}{'table kB':>10}{'index kB':>10}"
+        )
+        for table in tables:
+            live, dead, table_size, index_size = rows[table]
+            self.stdout.write(
+                f"{table:<40}{live or 0:>10}{dead or 0:>10}"
+                f"{table_size // 1024:>10}{index_size // 1024:>10}"
+            )
+
+    @staticmethod
+    def _tables(user, using):
+        """Return the partitions to work on, only the user's if given."""
+        tables = []
+        for model in PARTITIONED_MODELS:
+            if user is not None:
+                tables += filter(None, [partition_of(model, user, using)])
+            else:
+                # plain tables are reported as a single partition
+                tables += partitions(model, using) or [model._meta.db_table]
+        return tables
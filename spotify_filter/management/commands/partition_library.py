@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from spotify_filter.partitioning import (
+    PARTITIONED_MODELS,
+    partition_table,
+    partitions,
+)
+
+
+class Command(BaseCommand):
+    """Repartition the library membership tables."""
+
+    help = (
+        "Rebuild the library membership tables with the given number of hash "
+        "partitions on the user, or as plain tables with 0. The tables are "
+        "locked while their rows are copied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "partitions", type=int, help="Number of partitions, 0 for plain tables."
+        )
+        parser.add_argument(
+            "--database", default="default", help="Database to repartition."
+        )
+
+    def handle(self, *args, **options):
+        count = options["partitions"]
+        using = options["database"]
+        if connections[using].vendor != "postgresql":
+            raise CommandError("Partitioning needs PostgreSQL.")
+        if count < 0:
+            raise CommandError("The number of partitions can't be negative.")
+        for model in PARTITIONED_MODELS:
+            try:
+                partition_table(model, count, using=using)
+            except ValueError as e:
+                raise CommandError(str(e)) from e
+            self.stdout.write(
+                f"{model._meta.db_table}: {len(partitions(model, using))} partitions"
+            )
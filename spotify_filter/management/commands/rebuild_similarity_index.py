@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from spotify_filter.similarity import SIMILAR_ARTISTS, rebuild_similarity_index
+
+
+class Command(BaseCommand):
+    """Rebuild the similar-artist index from scratch."""
+
+    help = "Rebuild the similar-artist index of all users or the given users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Only rebuild these users.")
+        parser.add_argument(
+            "-k",
+            type=int,
+            default=SIMILAR_ARTISTS,
+            help="Number of similar artists stored per artist.",
+        )
+
+    def handle(self, *args, **options):
+        users = (
+            get_user_model().objects.filter(library_artists__isnull=False).distinct()
+        )
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+        for user in users:
+            rebuilt = rebuild_similarity_index(user, k=options["k"])
+            self.stdout.write(f"{user.username}: indexed {rebuilt} artists")
@@ -0,0 +1,179 @@
+"""
+Prometheus metrics of the web and worker hot paths.
+
+The web process serves them at /metrics to scrapers bearing the
+METRICS_TOKEN setting, a Celery worker on the port of the
+PROMETHEUS_WORKER_PORT setting. Processes forking workers (gunicorn, the
+prefork pool of Celery) need the PROMETHEUS_MULTIPROC_DIR environment
+variable so that the metrics of all worker processes are aggregated.
+"""
+
+import hmac
+import os
+import shutil
+import time
+from contextlib import ExitStack, contextmanager
+
+from celery import signals
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+# buckets of the query count histograms
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by URL name.",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries per HTTP request by URL name.",
+    ["view"],
+    buckets=QUERY_BUCKETS,
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Run time of Celery tasks.",
+    ["task", "state"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+TASK_FAILURES = Counter(
+    "celery_task_failures_total",
+    "Celery tasks that raised an exception.",
+    ["task", "exception"],
+)
+TASK_QUERIES = Histogram(
+    "celery_task_db_queries",
+    "Database queries per Celery task.",
+    ["task"],
+    buckets=QUERY_BUCKETS + (2000, 5000, 10000, 50000),
+)
+SPOTIFY_API_LATENCY = Histogram(
+    "spotify_api_request_duration_seconds",
+    "Latency of Spotify Web API calls by endpoint and status code.",
+    ["endpoint", "status"],
+)
+
+
+def _registry():
+    """Return the registry to expose, aggregating worker processes if needed."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Serve the metrics in the Prometheus text format to requests bearing the
+    METRICS_TOKEN setting, the endpoint doesn't exist without the setting.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        credentials.encode(), token.encode()
+    ):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+@contextmanager
+def all_connections_wrapped(wrapper):
+    """
+    Install an execute wrapper on the connections of all databases, so that
+    the queries routed to the replica are seen with those of the primary.
+    """
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
+
+
+class QueryCounter:
+    """Execute wrapper counting the database queries it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, *args):
+        self.count += 1
+        return execute(*args)
+
+
+def observe_spotify_call(endpoint, status, started):
+    """Record a Spotify API call started at `started` (perf_counter)."""
+    SPOTIFY_API_LATENCY.labels(endpoint, str(status)).observe(
+        time.perf_counter() - started
+    )
+
+
+# Celery tasks, keyed on the task id; prerun and postrun run in the same
+# worker process
+_running_tasks = {}
+
+
+@signals.task_prerun.connect
+def _task_started(task_id=None, **_kwargs):
+    counter = QueryCounter()
+    for conn in connections.all():
+        conn.execute_wrappers.append(counter)
+    _running_tasks[task_id] = (time.perf_counter(), counter)
+
+
+@signals.task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **_kwargs):
+    started, counter = _running_tasks.pop(task_id, (None, None))
+    if started is None:
+        return
+    for conn in connections.all():
+        if counter in conn.execute_wrappers:
+            conn.execute_wrappers.remove(counter)
+    TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+        time.perf_counter() - started
+    )
+    TASK_QUERIES.labels(task.name).observe(counter.count)
+
+
+@signals.task_failure.connect
+def _task_failed(sender=None, exception=None, **_kwargs):
+    TASK_FAILURES.labels(sender.name, type(exception).__name__).inc()
+
+
+@signals.worker_init.connect
+def _reset_multiprocess_dir(**_kwargs):
+    """Start the worker with an empty multiprocess directory."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+@signals.worker_ready.connect
+def _start_exporter(**_kwargs):
+    """Expose the worker's metrics over HTTP, if a port is configured."""
+    port = settings.PROMETHEUS_WORKER_PORT
+    if port:
+        start_http_server(port, registry=_registry())
+
+
+@signals.worker_process_shutdown.connect
+def _mark_process_dead(pid=None, **_kwargs):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,116 @@
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+
+from .metrics import (
+    REQUEST_LATENCY,
+    REQUEST_QUERIES,
+    QueryCounter,
+    all_connections_wrapped,
+)
+from .models import RequestProfile
+
+
+class MetricsMiddleware:
+    """
+    Record the latency and the database queries of every request, labelled
+    with the name of the URL pattern serving it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with all_connections_wrapped(counter):
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+        REQUEST_QUERIES.labels(view).observe(counter.count)
+        return response
+
+
+class QueryRecorder:
+    """Execute wrapper recording the SQL and run time of the queries it sees."""
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+        self.queries = []
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, *args):
+        started = time.perf_counter()
+        try:
+            return execute(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            if len(self.queries) < self.max_queries:
+                self.queries.append({"sql": sql, "time": round(elapsed, 6)})
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests of staff members asking for it with the X-Profile
+    header or the "_profile" query parameter. The cProfile profile and the
+    SQL queries of the request are stored as a RequestProfile, whose id is
+    returned in the X-Profile-Id response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        recorder = QueryRecorder(settings.REQUEST_PROFILE_MAX_QUERIES)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with all_connections_wrapped(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+        profile = self.save_profile(request, response, profiler, recorder, duration)
+        response["X-Profile-Id"] = str(profile.pk)
+        return response
+
+    @staticmethod
+    def wants_profile(request):
+        """Return whether a staff member asked to profile the request."""
+        # the flag first, so that other requests don't load the session user
+        return (
+            "X-Profile" in request.headers or "_profile" in request.GET
+        ) and request.user.is_staff
+
+    @staticmethod
+    def save_profile(request, response, profiler, recorder, duration):
+        """Store the profile of a request."""
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        stats.sort_stats("cumulative").print_stats(50)
+        match = request.resolver_match
+        return RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path(),
+            view_name=match.view_name if match else "",
+            status_code=response.status_code,
+            duration=duration,
+            query_count=recorder.count,
+            query_time=recorder.time,
+            queries=recorder.queries,
+            summary=stats.stream.getvalue(),
+            profile=marshal.dumps(stats.stats),
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0011_librarystate"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("album_count", models.IntegerField(default=0)),
+                ("artist_count", models.IntegerField(default=0)),
+                ("track_count", models.IntegerField(default=0)),
+                ("total_duration_ms", models.BigIntegerField(default=0)),
+                ("albums_per_decade", models.JSONField(default=list)),
+                ("top_genres", models.JSONField(default=list)),
+                ("updated_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "library stats",
+            },
+        ),
+    ]
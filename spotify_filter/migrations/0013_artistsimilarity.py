@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0012_librarystats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArtistSimilarity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                (
+                    "artist",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similarities",
+                        to="spotify_filter.artist",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="spotify_filter.artist",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "artist similarities",
+                "ordering": ["-score", "similar_id"],
+                "unique_together": {("artist", "similar")},
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+from django.db import migrations
+from django.db.models import OuterRef, Q, Subquery
+
+BATCH_SIZE = 1000
+
+
+def _canonical_ids(model, db_alias):
+    """Map every row id to the id of the oldest row with the same Spotify id."""
+    canonical = {}
+    mapping = {}
+    rows = model.objects.using(db_alias).order_by("id").values_list("id", "spotify_id")
+    for pk, spotify_id in rows.iterator(chunk_size=BATCH_SIZE):
+        mapping[pk] = canonical.setdefault(spotify_id, pk)
+    return mapping
+
+
+def _remap(model, mappings, db_alias):
+    """
+    Point the rows of `model` that reference duplicates to the canonical rows.
+
+    Args:
+        model: Model whose foreign keys to rewrite.
+        mappings (dict): Foreign key attname -> {old id: canonical id}.
+        db_alias (str): Alias of the database being migrated.
+    """
+    objects = model.objects.using(db_alias)
+    duplicates = Q()
+    for attname, mapping in mappings.items():
+        duplicates |= Q(
+            **{f"{attname}__in": [pk for pk, canonical in mapping.items() if pk != canonical]}
+        )
+    rows = list(objects.filter(duplicates))
+    for row in rows:
+        row.pk = None
+        for attname, mapping in mappings.items():
+            setattr(row, attname, mapping[getattr(row, attname)])
+    objects.filter(duplicates).delete()
+    # rows already linked to the canonical entry are dropped as conflicts
+    objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def merge_catalog(apps, schema_editor):
+    """
+    Move library ownership to the membership tables and merge the per-user
+    copies of every album and artist into one catalog entry.
+    """
+    Album = apps.get_model("spotify_filter", "Album")
+    Artist = apps.get_model("spotify_filter", "Artist")
+    AlbumTrack = apps.get_model("spotify_filter", "AlbumTrack")
+    ArtistSimilarity = apps.get_model("spotify_filter", "ArtistSimilarity")
+    LibraryAlbum = apps.get_model("spotify_filter", "LibraryAlbum")
+    LibraryArtist = apps.get_model("spotify_filter", "LibraryArtist")
+    AlbumArtists = Album._meta.get_field("artists").remote_field.through
+    ArtistGenres = Artist._meta.get_field("genres").remote_field.through
+    db_alias = schema_editor.connection.alias
+
+    album_ids = _canonical_ids(Album, db_alias)
+    artist_ids = _canonical_ids(Artist, db_alias)
+
+    LibraryAlbum.objects.using(db_alias).bulk_create(
+        (
+            LibraryAlbum(user_id=user_id, album_id=album_ids[pk], added_at=added_at)
+            for pk, user_id, added_at in Album.objects.using(db_alias).values_list(
+                "id", "user_id", "added_at"
+            ).iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    LibraryArtist.objects.using(db_alias).bulk_create(
+        (
+            LibraryArtist(user_id=user_id, artist_id=artist_ids[pk])
+            for pk, user_id in Artist.objects.using(db_alias)
+            .values_list("id", "user_id")
+            .iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    ArtistSimilarity.objects.using(db_alias).update(
+        user_id=Subquery(
+            Artist.objects.filter(pk=OuterRef("artist_id")).values("user_id")[:1]
+        )
+    )
+
+    _remap(AlbumArtists, {"album_id": album_ids, "artist_id": artist_ids}, db_alias)
+    _remap(AlbumTrack, {"album_id": album_ids}, db_alias)
+    _remap(ArtistGenres, {"artist_id": artist_ids}, db_alias)
+    _remap(
+        ArtistSimilarity,
+        {"artist_id": artist_ids, "similar_id": artist_ids},
+        db_alias,
+    )
+
+    Album.objects.using(db_alias).filter(
+        pk__in=[pk for pk, canonical in album_ids.items() if pk != canonical]
+    ).delete()
+    Artist.objects.using(db_alias).filter(
+        pk__in=[pk for pk, canonical in artist_ids.items() if pk != canonical]
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0014_library_membership"),
+    ]
+
+    operations = [
+        # the per-user copies can't be restored, so going back is only
+        # possible with empty library tables
+        migrations.RunPython(merge_catalog, migrations.RunPython.noop),
+    ]
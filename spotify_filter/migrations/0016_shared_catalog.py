@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0015_merge_catalog_duplicates"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="album",
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="artist",
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name="album",
+            name="spotify_id",
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="artist",
+            name="spotify_id",
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="artistsimilarity",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.RemoveField(
+            model_name="album",
+            name="added_at",
+        ),
+        migrations.RemoveField(
+            model_name="album",
+            name="user",
+        ),
+        migrations.RemoveField(
+            model_name="artist",
+            name="user",
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0016_shared_catalog"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="album",
+            index=models.Index(fields=["title"], name="album_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="album",
+            index=models.Index(fields=["release_date"], name="album_release_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="album",
+            index=models.Index(fields=["popularity"], name="album_popularity_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="artist",
+            index=models.Index(fields=["name"], name="artist_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="libraryalbum",
+            index=models.Index(
+                fields=["user", "added_at"],
+                include=("album",),
+                name="libraryalbum_user_added_idx",
+            ),
+        ),
+    ]
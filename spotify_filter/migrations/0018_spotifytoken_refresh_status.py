@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0017_dashboard_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="spotifytoken",
+            name="refresh_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="spotifytoken",
+            name="refresh_failed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="spotifytoken",
+            name="refresh_failures",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="spotifytoken",
+            name="refreshed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0018_spotifytoken_refresh_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarystate",
+            name="sync_queued_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="librarystate",
+            name="synced_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0019_librarystate_sync"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("full", "Full import"),
+                            ("delta", "Delta sync"),
+                            ("enrich", "Enrichment"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("importer", models.CharField(max_length=50)),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("wall_time", models.FloatField()),
+                ("albums_processed", models.IntegerField(default=0)),
+                ("stats", models.JSONField(default=dict)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_runs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-started_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-started_at"], name="importrun_user_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import migrations
+
+from spotify_filter.partitioning import is_partitioned, partition_table
+
+LIBRARY_MODELS = ["LibraryAlbum", "LibraryArtist"]
+
+
+def partition_library(apps, schema_editor):
+    """Hash partition the library tables if LIBRARY_PARTITIONS is set."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql" or not settings.LIBRARY_PARTITIONS:
+        return
+    for name in LIBRARY_MODELS:
+        model = apps.get_model("spotify_filter", name)
+        partition_table(model, settings.LIBRARY_PARTITIONS, using=connection.alias)
+
+
+def unpartition_library(apps, schema_editor):
+    """Turn partitioned library tables back into plain tables."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    for name in LIBRARY_MODELS:
+        model = apps.get_model("spotify_filter", name)
+        if is_partitioned(model, using=connection.alias):
+            partition_table(model, 0, using=connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0021_requestprofile"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_library, unpartition_library),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("spotify_filter", "0024_catalogstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="spotifytoken",
+            name="refreshing_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
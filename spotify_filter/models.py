@@ -2,14 +2,33 @@ from datetime import timedelta
 
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Count, F, Subquery, Sum
+from django.db.models.functions import Cast, ExtractYear
 from django.utils import timezone
 
 
+class ArtistQuerySet(models.QuerySet):
+    """QuerySet of catalog artists."""
+
+    def for_user(self, user):
+        """Return the artists in the user's library."""
+        return self.filter(memberships__user=user)
+
+    def create(self, user=None, **kwargs):
+        """Create an artist and add it to the user's library if one is given."""
+        artist = super().create(**kwargs)
+        if user is not None:
+            LibraryArtist.objects.create(user=user, artist=artist)
+        return artist
+
+
 class Artist(models.Model):
-    """Model representing a musical artist."""
+    """
+    Model representing a musical artist of the shared catalog. Users own
+    artists through LibraryArtist memberships.
+    """
 
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
-    spotify_id = models.CharField(max_length=50)
+    spotify_id = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=200, verbose_name="Artist Name")
     image_large = models.URLField(max_length=500, blank=True, null=True)
     image_medium = models.URLField(max_length=500, blank=True, null=True)
@@ -18,8 +37,11 @@ class Artist(models.Model):
         "Genre", related_name="artists", verbose_name="Genres"
     )
 
+    objects = ArtistQuerySet.as_manager()
+
     class Meta:
-        unique_together = ["user", "spotify_id"]
+        # sort order of the dashboard's artist table
+        indexes = [models.Index(fields=["name"], name="artist_name_idx")]
 
     def __str__(self):
         return str(self.name)
@@ -30,6 +52,28 @@ class Artist(models.Model):
         return f"https://open.spotify.com/artist/{self.spotify_id}"
 
 
+class ArtistSimilarity(models.Model):
+    """
+    Model storing the precomputed nearest neighbours of an artist within
+    the same user's library, based on the cosine similarity of their genres.
+    """
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    artist = models.ForeignKey(
+        Artist, on_delete=models.CASCADE, related_name="similarities"
+    )
+    similar = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ("user", "artist", "similar")
+        ordering = ["-score", "similar_id"]
+        verbose_name_plural = "artist similarities"
+
+    def __str__(self):
+        return f"{self.artist} ~ {self.similar} ({self.score:.2f})"
+
+
 class Genre(models.Model):
     """Model representing a musical genre."""
 
@@ -39,11 +83,34 @@ class Genre(models.Model):
         return str(self.name)
 
 
+class AlbumQuerySet(models.QuerySet):
+    """QuerySet of catalog albums."""
+
+    def for_user(self, user):
+        """Return the albums in the user's library annotated with added_at."""
+        return self.filter(memberships__user=user).annotate(
+            added_at=F("memberships__added_at")
+        )
+
+    def create(self, user=None, added_at=None, **kwargs):
+        """Create an album and add it to the user's library if one is given."""
+        album = super().create(**kwargs)
+        if user is not None:
+            membership = LibraryAlbum(user=user, album=album)
+            if added_at is not None:
+                membership.added_at = added_at
+            membership.save()
+        return album
+
+
 class Album(models.Model):
-    """Model representing a musical album."""
+    """
+    Model representing a musical album of the shared catalog. Users own
+    albums through LibraryAlbum memberships, which also store when the
+    album was saved.
+    """
 
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
-    spotify_id = models.CharField(max_length=50)
+    spotify_id = models.CharField(max_length=50, unique=True)
     title = models.CharField(max_length=200)
     artists = models.ManyToManyField(
         "Artist",
@@ -52,14 +119,21 @@ class Album(models.Model):
     )
     total_tracks = models.IntegerField(default=0)
     release_date = models.DateField(default=timezone.now)
-    added_at = models.DateTimeField(default=timezone.now)
     popularity = models.IntegerField(default=0)
     album_cover_large = models.URLField(max_length=500, blank=True, null=True)
     album_cover_medium = models.URLField(max_length=500, blank=True, null=True)
     album_cover_small = models.URLField(max_length=500, blank=True, null=True)
 
+    objects = AlbumQuerySet.as_manager()
+
     class Meta:
-        unique_together = ["user", "spotify_id"]
+        # sort orders of the dashboard's album table, read in index order
+        # while the user's memberships are probed for each row of a page
+        indexes = [
+            models.Index(fields=["title"], name="album_title_idx"),
+            models.Index(fields=["release_date"], name="album_release_date_idx"),
+            models.Index(fields=["popularity"], name="album_popularity_idx"),
+        ]
 
     def __str__(self):
         return str(self.title)
@@ -70,6 +144,49 @@ class Album(models.Model):
         return f"https://open.spotify.com/album/{self.spotify_id}"
 
 
+class LibraryAlbum(models.Model):
+    """Membership of an album in a user's library."""
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="library_albums"
+    )
+    album = models.ForeignKey(
+        Album, on_delete=models.CASCADE, related_name="memberships"
+    )
+    added_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ["user", "album"]
+        indexes = [
+            # the user's albums by date saved, without visiting the table
+            models.Index(
+                fields=["user", "added_at"],
+                include=["album"],
+                name="libraryalbum_user_added_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.album} in the library of {self.user}"
+
+
+class LibraryArtist(models.Model):
+    """Membership of an artist in a user's library."""
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="library_artists"
+    )
+    artist = models.ForeignKey(
+        Artist, on_delete=models.CASCADE, related_name="memberships"
+    )
+
+    class Meta:
+        unique_together = ["user", "artist"]
+
+    def __str__(self):
+        return f"{self.artist} in the library of {self.user}"
+
+
 class Track(models.Model):
     """Model representing a musical track."""
 
@@ -100,7 +217,7 @@ class AlbumTrack(models.Model):
         ordering = ["disc_number", "track_number"]
 
 
-class SpotifyToken(models.Model):
+class SpotifyToken(models.Model):  # pylint: disable=too-many-instance-attributes
     """
     Model storing information about spotify token for each user
     """
@@ -109,6 +226,13 @@ class SpotifyToken(models.Model):
     access_token = models.CharField(max_length=500)
     refresh_token = models.CharField(max_length=500)
     expires_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    # set while the latest refresh attempts keep failing
+    refresh_failed_at = models.DateTimeField(null=True, blank=True)
+    refresh_failures = models.IntegerField(default=0)
+    refresh_error = models.TextField(blank=True, default="")
+    # set while a refresh task waits for Spotify, so that others skip the token
+    refreshing_at = models.DateTimeField(null=True, blank=True)
 
     @classmethod
     def compute_expiration(cls, expires_in_seconds: int):
@@ -122,5 +246,301 @@ class SpotifyToken(models.Model):
         """Check if the token is expired."""
         return timezone.now() >= self.expires_at
 
+    def expires_within(self, margin):
+        """Check if the token expires within the given timedelta."""
+        return timezone.now() + margin >= self.expires_at
+
+    def record_refresh(self, token_info):
+        """Store a token refreshed by Spotify and clear previous failures."""
+        self.access_token = token_info["access_token"]
+        # Spotify may or may not rotate the refresh token
+        self.refresh_token = token_info.get("refresh_token") or self.refresh_token
+        self.expires_at = self.compute_expiration(token_info["expires_in"])
+        self.refreshed_at = timezone.now()
+        self.refresh_failed_at = None
+        self.refresh_failures = 0
+        self.refresh_error = ""
+        self.refreshing_at = None
+        self.save(
+            update_fields=[
+                "access_token",
+                "refresh_token",
+                "expires_at",
+                "refreshed_at",
+                "refresh_failed_at",
+                "refresh_failures",
+                "refresh_error",
+                "refreshing_at",
+            ]
+        )
+
+    def record_refresh_failure(self, error):
+        """Mark a failed refresh attempt on the token."""
+        self.refresh_failed_at = timezone.now()
+        self.refresh_failures += 1
+        self.refresh_error = str(error)
+        self.refreshing_at = None
+        self.save(
+            update_fields=[
+                "refresh_failed_at",
+                "refresh_failures",
+                "refresh_error",
+                "refreshing_at",
+            ]
+        )
+
     def __str__(self):
         return f"Spotify token for {self.user.username}"  # pylint: disable=no-member
+
+
+class LibraryState(models.Model):
+    """
+    Model tracking when each user's library content last changed
+    """
+
+    user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE)
+    last_modified = models.DateTimeField(default=timezone.now)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    # set while a scheduled sync of the library is queued or running
+    sync_queued_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def touch(cls, user):
+        """Mark the user's library as modified now."""
+        state, _ = cls.objects.update_or_create(
+            user=user, defaults={"last_modified": timezone.now()}
+        )
+        return state
+
+    @classmethod
+    def record_sync(cls, user):
+        """Mark the user's library as modified and synced with Spotify now."""
+        now = timezone.now()
+        state, _ = cls.objects.update_or_create(
+            user=user,
+            defaults={"last_modified": now, "synced_at": now, "sync_queued_at": None},
+        )
+        return state
+
+    @classmethod
+    def last_modified_for(cls, user):
+        """Return when the user's library last changed, or None if never imported."""
+        return (
+            cls.objects.filter(user=user)
+            .values_list("last_modified", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def content_last_modified_for(cls, user):
+        """
+        Return when the user's library or the shared catalog shown with it
+        last changed, or None if the user never imported.
+        """
+        row = (
+            cls.objects.filter(user=user)
+            .annotate(
+                catalog_modified=Subquery(
+                    CatalogState.objects.values("last_modified")[:1]
+                )
+            )
+            .values_list("last_modified", "catalog_modified")
+            .first()
+        )
+        if row is None:
+            return None
+        return max(modified for modified in row if modified is not None)
+
+    def __str__(self):
+        return f"Library of {self.user.username}"  # pylint: disable=no-member
+
+
+class CatalogState(models.Model):
+    """
+    Model tracking in a single row when the shared catalog of albums and
+    artists last changed, e.g. by another user's import
+    """
+
+    last_modified = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def touch(cls):
+        """Mark the catalog as modified now."""
+        cls.objects.update_or_create(pk=1, defaults={"last_modified": timezone.now()})
+
+    def __str__(self):
+        return f"Catalog modified at {self.last_modified}"
+
+
+class LibraryStats(models.Model):
+    """
+    Model storing precomputed summary figures about each user's library,
+    refreshed at the end of every import so the dashboard reads a single row.
+    """
+
+    TOP_GENRES = 10
+
+    user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE)
+    album_count = models.IntegerField(default=0)
+    artist_count = models.IntegerField(default=0)
+    track_count = models.IntegerField(default=0)
+    total_duration_ms = models.BigIntegerField(default=0)
+    # [[decade, album count], ...] sorted by decade
+    albums_per_decade = models.JSONField(default=list)
+    # [[genre name, artist count], ...] sorted by count, most common first
+    top_genres = models.JSONField(default=list)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "library stats"
+
+    @classmethod
+    def refresh_for(cls, user):
+        """Recompute the statistics of the user's library with aggregate queries."""
+        albums = Album.objects.filter(memberships__user=user)
+        tracks = AlbumTrack.objects.filter(album__memberships__user=user).aggregate(
+            count=Count("id"), duration=Sum("track__duration_ms")
+        )
+        decades = (
+            albums.annotate(
+                decade=Cast(ExtractYear("release_date"), models.IntegerField())
+                / 10
+                * 10
+            )
+            .values("decade")
+            .annotate(count=Count("id"))
+            .order_by("decade")
+        )
+        genres = (
+            Genre.objects.filter(artists__memberships__user=user)
+            .annotate(count=Count("artists"))
+            .order_by("-count", "name")[: cls.TOP_GENRES]
+        )
+        stats, _ = cls.objects.update_or_create(
+            user=user,
+            defaults={
+                "album_count": LibraryAlbum.objects.filter(user=user).count(),
+                "artist_count": LibraryArtist.objects.filter(user=user).count(),
+                "track_count": tracks["count"],
+                "total_duration_ms": tracks["duration"] or 0,
+                "albums_per_decade": [[d["decade"], d["count"]] for d in decades],
+                "top_genres": [[genre.name, genre.count] for genre in genres],
+                "updated_at": timezone.now(),
+            },
+        )
+        return stats
+
+    @property
+    def total_duration(self):
+        """Return the total listening time as a timedelta."""
+        return timedelta(milliseconds=self.total_duration_ms)
+
+    @property
+    def listening_time(self):
+        """Return the total listening time formatted as hours and minutes."""
+        minutes = self.total_duration_ms // 60000
+        return f"{minutes // 60} h {minutes % 60} min"
+
+    def __str__(self):
+        return f"Library stats of {self.user.username}"  # pylint: disable=no-member
+
+
+class ImportRun(models.Model):
+    """
+    Model keeping the statistics of every import, with the per-phase timing
+    breakdown, for capacity planning across users
+    """
+
+    KINDS = [("full", "Full import"), ("delta", "Delta sync"), ("enrich", "Enrichment")]
+
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="import_runs",
+    )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # class name of the importer, e.g. SpotifyImporter or FileImporter
+    importer = models.CharField(max_length=50)
+    started_at = models.DateTimeField(default=timezone.now)
+    wall_time = models.FloatField()
+    albums_processed = models.IntegerField(default=0)
+    # the full statistics returned by the import, including "timing"
+    stats = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["user", "-started_at"], name="importrun_user_idx")
+        ]
+
+    @classmethod
+    def record(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        cls, user, kind, importer, stats, started_at
+    ):
+        """Store the statistics of a finished import."""
+        return cls.objects.create(
+            user=user,
+            kind=kind,
+            importer=type(importer).__name__,
+            started_at=started_at,
+            wall_time=stats["timing"]["wall_time"],
+            albums_processed=stats["albums_processed"],
+            stats=stats,
+        )
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.user} at {self.started_at}"
+
+
+class RequestProfile(models.Model):
+    """
+    Model storing the cProfile profile and the SQL queries of a request
+    profiled on demand by a staff member
+    """
+
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="request_profiles",
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_time = models.FloatField()
+    # [{"sql": ..., "time": ...}] in execution order
+    queries = models.JSONField(default=list)
+    # the 50 most expensive functions by cumulative time, as printed by pstats
+    summary = models.TextField()
+    # marshalled pstats data, loadable with pstats.Stats or snakeviz
+    profile = models.BinaryField()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} at {self.created_at}"
+
+
+class LibraryUpload(models.Model):
+    """
+    Model holding an uploaded library export until a worker imports it.
+    Uploads are stored in the database, which web processes and workers
+    share, unlike their file systems.
+    """
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="library_uploads"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    # the uploaded file as sent by the browser
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"Library upload of {self.user} at {self.created_at}"
@@ -0,0 +1,170 @@
+"""
+Optional PostgreSQL hash partitioning of the per-user library tables.
+
+The catalog tables are shared between users, but the library memberships
+are always read and written one user at a time. Hash partitioning them on
+user_id keeps each user's rows in one partition: the planner prunes the
+queries filtering on the user to that partition, the indexes of every
+partition stay small, and VACUUM or the bulk deletes of a user's rows only
+touch one partition. The ORM is unchanged.
+
+PostgreSQL requires the partition key in the primary key and in the unique
+constraints of a partitioned table, so the primary key becomes
+(user_id, id). Ids stay unique as they come from a single sequence.
+Migrations adding indexes or constraints keep working on the partitioned
+tables, as long as unique constraints include the user and indexes are not
+created concurrently.
+"""
+
+from django.db import connections, transaction
+
+from .models import LibraryAlbum, LibraryArtist
+
+PARTITIONED_MODELS = [LibraryAlbum, LibraryArtist]
+PARTITION_KEY = "user_id"
+
+
+def is_partitioned(model, using="default"):
+    """Return whether the model's table is partitioned."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone()[0] == "p"
+
+
+def partitions(model, using="default"):
+    """Return the partition tables of the model's table, by remainder."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [model._meta.db_table],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    return sorted(names, key=lambda name: int(name.rsplit("_p", 1)[1]))
+
+
+def partition_of(model, user, using="default"):
+    """Return the partition holding the user's rows, None if there are none."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tableoid::regclass::text "
+            f"FROM {connection.ops.quote_name(model._meta.db_table)} "
+            f"WHERE {PARTITION_KEY} = %s LIMIT 1",
+            [user.pk],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _definitions(cursor, table):
+    """
+    Return the (name, definition) pairs of the table's constraints other than
+    the primary key, and the definitions of its other indexes.
+    """
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('c', 'f', 'u', 'x')
+        """,
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = %s::regclass AND indexrelid NOT IN (
+            SELECT conindid FROM pg_constraint WHERE conrelid = %s::regclass
+        )
+        """,
+        [table, table],
+    )
+    indexes = [definition for (definition,) in cursor.fetchall()]
+    return constraints, indexes
+
+
+def partition_table(model, count, using="default"):
+    """
+    Rebuild the model's table with `count` hash partitions on user_id, or as
+    a plain table if `count` is 0.
+
+    The rows are copied into the new table and the constraints and indexes
+    are recreated with their names, in one transaction that locks the table.
+
+    Raises:
+        ValueError: Other tables have foreign keys to the table.
+    """
+    table = model._meta.db_table
+    old_table = f"{table}_old"
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with transaction.atomic(using), connection.cursor() as cursor:
+        # a table with pending deferred foreign key checks can't be dropped
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE confrelid = %s::regclass",
+            [table],
+        )
+        if referencing := cursor.fetchall():
+            raise ValueError(f"{table} is referenced by {referencing}")
+        constraints, indexes = _definitions(cursor, table)
+
+        # the old partitions make way for the new ones
+        for partition in partitions(model, using):
+            cursor.execute(
+                f"ALTER TABLE {quote(partition)} RENAME TO {quote(f'{partition}_old')}"
+            )
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+        partition_by = f" PARTITION BY HASH ({PARTITION_KEY})" if count else ""
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} "
+            f"(LIKE {quote(old_table)} INCLUDING DEFAULTS){partition_by}"
+        )
+        for remainder in range(count):
+            cursor.execute(
+                f"CREATE TABLE {quote(f'{table}_p{remainder}')} "
+                f"PARTITION OF {quote(table)} "
+                f"FOR VALUES WITH (MODULUS {count}, REMAINDER {remainder})"
+            )
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}")
+        cursor.execute(f"DROP TABLE {quote(old_table)}")
+
+        _add_keys(cursor, table, count)
+        _add_definitions(cursor, table, constraints, indexes)
+
+
+def _add_keys(cursor, table, count):
+    """Add the primary key and the identity of the rebuilt table."""
+    quote = cursor.db.ops.quote_name
+    primary_key = f"{PARTITION_KEY}, id" if count else "id"
+    cursor.execute(
+        f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f'{table}_pkey')} "
+        f"PRIMARY KEY ({primary_key})"
+    )
+    cursor.execute(
+        f"ALTER TABLE {quote(table)} "
+        "ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+    )
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+        f"COALESCE(MAX(id), 0) + 1, false) FROM {quote(table)}",
+        [table],
+    )
+
+
+def _add_definitions(cursor, table, constraints, indexes):
+    """Recreate the constraints and indexes of the rebuilt table."""
+    quote = cursor.db.ops.quote_name
+    for name, definition in constraints:
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}"
+        )
+    for definition in indexes:
+        # indexes of a partitioned table are defined ON ONLY the parent
+        cursor.execute(definition.replace(" ON ONLY ", " ON ", 1))
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# database serving the reads of the current request, None for the primary
+_read_database = ContextVar("read_database", default=None)
+
+
+def replica_configured():
+    """Return whether a replica database is configured."""
+    return settings.REPLICA_DATABASE in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    """Send the reads of the enclosed code to the replica database."""
+    token = _read_database.set(settings.REPLICA_DATABASE)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def iterate_on_replica(iterable):
+    """
+    Yield the items of an iterable, producing each of them with reads sent
+    to the replica, e.g. for the content of a streaming response.
+    """
+    iterator = iter(iterable)
+    while True:
+        with replica_reads():
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class ReplicaRouter:
+    """
+    Database router sending reads to the replica inside replica_reads() and
+    everything else, including all writes, to the primary.
+    """
+
+    def db_for_read(self, model, **hints):  # pylint: disable=unused-argument
+        """Read from the replica inside replica_reads(), else the primary."""
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):  # pylint: disable=unused-argument
+        """Always write to the primary, also objects read from the replica."""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint: disable=unused-argument
+        """Relate objects of the primary and the replica, they hold the same data."""
+        # pylint: disable=protected-access
+        databases = {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):  # pylint: disable=unused-argument
+        """
+        Migrate every database but the replica, which follows the primary,
+        e.g. the primary and the second database of the tests.
+        """
+        return db != settings.REPLICA_DATABASE
@@ -0,0 +1,188 @@
+import numpy as np
+from django.db import transaction
+
+from .models import Artist, ArtistSimilarity
+
+SIMILAR_ARTISTS = 10
+ROWS_PER_CHUNK = 500
+
+
+class GenreMatrix:
+    """
+    Sparse binary artist-by-genre matrix of one user's library.
+
+    The matrix is kept in two compressed forms: the genres of each artist
+    (rows) and the artists of each genre (columns), both as CSR-style
+    offset and index arrays over dense artist and genre positions.
+    """
+
+    def __init__(self, artist_ids, links):
+        """Build the matrix.
+
+        Args:
+            artist_ids (list): Database ids of all the user's artists.
+            links (list): (artist_id, genre_id) rows of the artist-genre table.
+        """
+        self.artist_ids = np.array(sorted(artist_ids), dtype=np.int64)
+        link_artists = np.fromiter(
+            (row[0] for row in links), dtype=np.int64, count=len(links)
+        )
+        link_genres = np.fromiter(
+            (row[1] for row in links), dtype=np.int64, count=len(links)
+        )
+        rows = np.searchsorted(self.artist_ids, link_artists)
+        _, cols = np.unique(link_genres, return_inverse=True)
+        n_genres = int(cols.max()) + 1 if cols.size else 0
+
+        by_row = np.lexsort((cols, rows))
+        self.row_genres = cols[by_row]
+        self.row_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(rows, minlength=self.artist_ids.size)))
+        )
+        by_col = np.lexsort((rows, cols))
+        self.col_artists = rows[by_col]
+        self.col_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(cols, minlength=n_genres)))
+        )
+        self.degrees = np.diff(self.row_offsets)
+
+    @classmethod
+    def load(cls, user):
+        """Load the matrix of the user's library with two bulk queries."""
+        return cls(
+            artist_ids=list(Artist.objects.for_user(user).values_list("id", flat=True)),
+            links=list(
+                Artist.genres.through.objects.filter(
+                    artist__memberships__user=user
+                ).values_list("artist_id", "genre_id")
+            ),
+        )
+
+    def positions(self, artist_ids):
+        """Return the dense positions of the given artist ids in the matrix."""
+        ids = np.array(sorted(artist_ids), dtype=np.int64)
+        positions = np.searchsorted(self.artist_ids, ids)
+        inside = positions < self.artist_ids.size
+        positions, ids = positions[inside], ids[inside]
+        return positions[self.artist_ids[positions] == ids]
+
+    @staticmethod
+    def _expand(offsets, indices, keys):
+        """
+        For every key, list the entries of its compressed row.
+
+        Returns:
+            tuple: (owners, values) where values[i] is an entry of the row
+                of keys[owners[i]].
+        """
+        starts = offsets[keys]
+        lengths = offsets[keys + 1] - starts
+        owners = np.repeat(np.arange(keys.size), lengths)
+        steps = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        return owners, indices[np.repeat(starts, lengths) + steps]
+
+    def neighbours(self, rows):
+        """
+        Return the artists sharing at least one genre with any of the rows.
+
+        Args:
+            rows (np.ndarray): Dense artist positions.
+        Returns:
+            np.ndarray: Dense positions of the neighbouring artists.
+        """
+        _, genres = self._expand(self.row_offsets, self.row_genres, rows)
+        _, artists = self._expand(self.col_offsets, self.col_artists, np.unique(genres))
+        return np.unique(artists)
+
+    def top_k(self, rows, k=SIMILAR_ARTISTS):
+        """
+        Compute the k most similar artists of each given row.
+
+        The dot products of the rows with every other artist are found by
+        walking the shared genres, so only artists with a common genre are
+        ever compared.
+
+        Returns:
+            tuple: (rows, similar, scores) arrays of dense positions and
+                cosine similarities, best neighbours of each row first.
+        """
+        owners, genres = self._expand(self.row_offsets, self.row_genres, rows)
+        pair_owners, others = self._expand(self.col_offsets, self.col_artists, genres)
+        sources = rows[owners[pair_owners]]
+        keep = sources != others
+        pairs = sources[keep] * self.artist_ids.size + others[keep]
+
+        pairs, dots = np.unique(pairs, return_counts=True)
+        sources, others = np.divmod(pairs, self.artist_ids.size)
+        scores = dots / np.sqrt(self.degrees[sources] * self.degrees[others])
+
+        order = np.lexsort((others, -scores, sources))
+        sources, others, scores = sources[order], others[order], scores[order]
+        first = np.searchsorted(sources, sources)
+        best = np.arange(sources.size) - first < k
+        return sources[best], others[best], scores[best]
+
+
+def unindexed_artists(user):
+    """
+    Return the ids of the user's artists without neighbours stored for the
+    user, e.g. catalog artists new to the library whose genres didn't change.
+    """
+    return set(
+        Artist.objects.for_user(user)
+        .exclude(similarities__user=user)
+        .values_list("id", flat=True)
+    )
+
+
+def rebuild_similarity_index(user, artist_ids=None, k=SIMILAR_ARTISTS):
+    """
+    Recompute the stored nearest neighbours of the user's artists.
+
+    Args:
+        user (User): The user whose library to index.
+        artist_ids (iterable, optional): Ids of artists whose genres changed.
+            Only the neighbour lists these changes can affect are rebuilt:
+            the changed artists themselves, the artists sharing a genre with
+            them and the artists currently listing them as neighbours.
+            If None, the whole index of the user is rebuilt.
+        k (int): Number of neighbours stored per artist.
+    Returns:
+        int: Number of artists whose neighbours were recomputed.
+    """
+    matrix = GenreMatrix.load(user)
+    if artist_ids is None:
+        rows = np.arange(matrix.artist_ids.size)
+    else:
+        artist_ids = set(artist_ids)
+        if not artist_ids:
+            return 0
+        listed_by = ArtistSimilarity.objects.filter(
+            user=user, similar_id__in=artist_ids
+        ).values_list("artist_id", flat=True)
+        changed = matrix.positions(artist_ids)
+        rows = np.union1d(
+            np.union1d(changed, matrix.neighbours(changed)),
+            matrix.positions(listed_by),
+        )
+
+    with transaction.atomic():
+        ArtistSimilarity.objects.filter(
+            user=user, artist_id__in=matrix.artist_ids[rows].tolist()
+        ).delete()
+        for start in range(0, rows.size, ROWS_PER_CHUNK):
+            sources, others, scores = matrix.top_k(
+                rows[start : start + ROWS_PER_CHUNK], k=k
+            )
+            ArtistSimilarity.objects.bulk_create(
+                ArtistSimilarity(
+                    user=user,
+                    artist_id=int(matrix.artist_ids[source]),
+                    similar_id=int(matrix.artist_ids[other]),
+                    score=float(score),
+                )
+                for source, other, score in zip(sources, others, scores)
+            )
+    return int(rows.size)
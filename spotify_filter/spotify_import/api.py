@@ -1,18 +1,24 @@
 import logging
 import os
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 from itertools import count
 from math import ceil, inf
 
 import requests
 import spotipy
-from dotenv import load_dotenv
-from spotipy.oauth2 import SpotifyOAuth
+from dateutil import parser
+from spotipy.oauth2 import SpotifyOAuth, SpotifyOauthError
 
+from ..metrics import observe_spotify_call
 from ..models import SpotifyToken
 
 logger = logging.getLogger(__name__)
 
+# threads fetching the track pages of different albums at once
+TRACK_FETCH_WORKERS = 4
+
 
 def get_spotify_oauth():
     """Create and return a SpotifyOAuth instance with app credentials"""
@@ -25,7 +31,51 @@ def get_spotify_oauth():
     )
 
 
-class SpotifyImporter:
+def backoff_delay(attempt, base_delay, retry_after=None):
+    """
+    Return the seconds to wait before retrying a failed request: the
+    Retry-After time if the API sent one, otherwise exponential backoff
+    with full jitter, so concurrent retries don't fire at the same time.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting at 1.
+        base_delay (float): Maximum delay after the first attempt.
+        retry_after (str or float, optional): Retry-After header value.
+    """
+    if retry_after is not None:
+        return float(retry_after)
+    return random.uniform(0, base_delay * 2 ** (attempt - 1))
+
+
+# errors of a token refresh that are recorded on the token
+REFRESH_ERRORS = (SpotifyOauthError, requests.exceptions.RequestException)
+
+
+def refresh_spotify_token(spotify_token, sp_oauth=None):
+    """Refresh the user's access token and store it.
+
+    Args:
+        spotify_token (SpotifyToken): The token to refresh.
+        sp_oauth (SpotifyOAuth, optional): OAuth manager used for the refresh.
+    Raises:
+        REFRESH_ERRORS: The refresh failed. The failure is recorded on the
+            token before the error is re-raised.
+    """
+    if sp_oauth is None:
+        sp_oauth = get_spotify_oauth()
+    try:
+        token_info = sp_oauth.refresh_access_token(spotify_token.refresh_token)
+    except REFRESH_ERRORS as e:
+        logger.error(
+            "Failed to refresh the token of user %s: %s", spotify_token.user_id, e
+        )
+        spotify_token.record_refresh_failure(e)
+        raise
+    spotify_token.record_refresh(token_info)
+    return spotify_token
+
+
+class SpotifyImporter:  # pylint: disable=too-many-instance-attributes
     """Class to import data from Spotify API."""
 
     def __init__(self, user, sp=None, scopes=None, max_retries=3, retry_delay=2):
@@ -39,27 +89,26 @@ class SpotifyImporter:
             max_retries (int): Maximum number of retries for API calls.
             retry_delay (int): Delay between retries in seconds.
         """
-        load_dotenv()
         self.user = user
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # API traffic, read by ImportTimer for the per-phase import stats
+        self.api_calls = 0
+        self.bytes_received = 0
+        # saved-album pages that failed, making the retrieved library partial
+        self.failed_album_pages = 0
+        # album track pages that failed, leaving their albums incomplete
+        self.failed_track_pages = 0
         if sp is not None:
             self.sp = sp
         elif user is not None:
             try:
                 spotify_token = SpotifyToken.objects.get(user=user)
 
-                # Refresh token if expired
+                # Tokens are normally refreshed ahead of expiry by the
+                # refresh_expiring_tokens_task beat job, this is the fallback
                 if spotify_token.is_expired():
-                    sp_oauth = get_spotify_oauth()
-                    token_info = sp_oauth.refresh_access_token(
-                        spotify_token.refresh_token
-                    )
-                    spotify_token.access_token = token_info["access_token"]
-                    spotify_token.expires_at = spotify_token.compute_expiration(
-                        token_info["expires_in"]
-                    )
-                    spotify_token.save()
+                    refresh_spotify_token(spotify_token)
 
                 # Create Spotify client with user's token
                 self.sp = spotipy.Spotify(auth=spotify_token.access_token)
@@ -75,8 +124,17 @@ class SpotifyImporter:
             except spotipy.exceptions.SpotifyException as e:
                 logger.error("Authentication failed: %s", e)
                 raise
+        session = getattr(self.sp, "_session", None)
+        if isinstance(session, requests.Session):
+            session.hooks["response"].append(self._count_response)
+
+    def _count_response(self, response, *_args, **_kwargs):
+        """Response hook of the spotipy session counting received bytes."""
+        self.bytes_received += len(response.content)
 
-    def retrieve_albums(self, max_len=inf, offset=0, limit=50):
+    def retrieve_albums(  # pylint: disable=too-many-arguments
+        self, max_len=inf, offset=0, limit=50, added_after=None, *, project=None
+    ):
         """
         Retrieve saved albums from the user's Spotify library.
 
@@ -84,6 +142,12 @@ class SpotifyImporter:
             max_len (int): Maximum number of albums to retrieve.
             offset (int): The index of the first album to retrieve.
             limit (int): Number of albums to retrieve per API call.
+            added_after (datetime, optional): Only retrieve the albums saved
+                after this time. Spotify returns the most recently saved
+                albums first, so reading stops at the first older album.
+            project (callable, optional): Applied to every saved-album
+                entry as its page arrives, e.g. SavedAlbum to keep
+                only what the import needs.
         Returns:
             list: A list of album objects.
         """
@@ -105,12 +169,25 @@ class SpotifyImporter:
                     limit=batch_limit,
                     offset=batch_offset,
                 )
-                albums += queue_response["items"]
+                items = queue_response["items"]
+                if added_after is not None:
+                    items = [
+                        item
+                        for item in items
+                        if parser.parse(item["added_at"]) > added_after
+                    ]
+                    if len(items) < len(queue_response["items"]):
+                        reading = False
+                albums += items if project is None else map(project, items)
             except (
                 spotipy.exceptions.SpotifyException,
                 requests.exceptions.Timeout,
             ) as e:
                 logger.error("Failed to fetch albums in batch %s: %s", batch_num, e)
+                self.failed_album_pages += 1
+                if batch_num == 0:
+                    # without the first page, whether there are others is unknown
+                    break
             if queue_response["next"] is None or len(albums) >= max_len:
                 reading = False
         return albums
@@ -123,47 +200,88 @@ class SpotifyImporter:
             ids (list): List of Spotify artist IDs.
             limit (int): Number of artists to retrieve per API call.
         Returns:
-            list: A list of artist objects.
+            list: The artist objects in the order of `ids`, with None for
+                the artists of batches that failed.
         """
         artists = []
         nbatches = ceil(len(ids) / limit)
         logger.info("Reading artists ... ")
         for i in range(nbatches):
             logger.info(i)
+            batch = ids[i * limit : (i + 1) * limit]
             try:
-                queue_response = self._fetch_batch_with_retries(
-                    self.sp.artists, ids[i * limit : (i + 1) * limit]
-                )
+                queue_response = self._fetch_batch_with_retries(self.sp.artists, batch)
                 artists += queue_response["artists"]
             except (
                 spotipy.exceptions.SpotifyException,
                 requests.exceptions.Timeout,
             ) as e:
                 logger.error("Failed to fetch artists in batch %s: %s", i, e)
+                # keep the results aligned with the ids
+                artists += [None] * len(batch)
         return artists
 
+    def retrieve_album_tracks(self, pages, limit=50):
+        """
+        Retrieve pages of album track listings, several albums at a time.
+
+        Args:
+            pages (list): (album id, offset) pairs of the pages to retrieve.
+            limit (int): Number of tracks per page.
+        Returns:
+            list: The track lists of the pages in the order of `pages`,
+                None for the pages that failed.
+        """
+
+        def fetch(page):
+            album_id, offset = page
+            try:
+                return self._fetch_batch_with_retries(
+                    self.sp.album_tracks, album_id, limit=limit, offset=offset
+                )["items"]
+            except (
+                spotipy.exceptions.SpotifyException,
+                requests.exceptions.Timeout,
+            ) as e:
+                logger.error(
+                    "Failed to fetch tracks of album %s at %s: %s", album_id, offset, e
+                )
+                return None
+
+        with ThreadPoolExecutor(max_workers=TRACK_FETCH_WORKERS) as executor:
+            track_lists = list(executor.map(fetch, pages))
+        self.failed_track_pages += track_lists.count(None)
+        return track_lists
+
     def _fetch_batch_with_retries(self, func, *args, **kwargs):
         """Fetch a batch of data with retries on failure."""
+        endpoint = getattr(func, "__name__", "unknown")
         for attempt in range(1, self.max_retries + 1):
+            self.api_calls += 1
+            started = time.perf_counter()
             try:
-                return func(*args, **kwargs)
+                result = func(*args, **kwargs)
             except spotipy.exceptions.SpotifyException as e:
+                observe_spotify_call(endpoint, e.http_status, started)
                 logger.error("Spotify API error: %s", e)
                 raise
             except requests.exceptions.Timeout as e:
-                logger.warning(
-                    (
-                        "Timeout on attempt %s/%s: %s. Retrying in %s ...",
-                        attempt,
-                        self.max_retries,
-                        e,
-                        self.retry_delay,
-                    )
-                )
+                observe_spotify_call(endpoint, "timeout", started)
                 if attempt == self.max_retries:
-                    logger.error("Max retries reached. Giving up.")
+                    logger.error("Timeout on attempt %s: %s. Giving up.", attempt, e)
                     raise
-                time.sleep(self.retry_delay)
+                delay = backoff_delay(attempt, self.retry_delay)
+                logger.warning(
+                    "Timeout on attempt %s/%s: %s. Retrying in %.1f s ...",
+                    attempt,
+                    self.max_retries,
+                    e,
+                    delay,
+                )
+                time.sleep(delay)
+            else:
+                observe_spotify_call(endpoint, 200, started)
+                return result
         return None  # return to make pylint happy
 
 
@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import time
+from math import inf
+
+import httpx
+from dateutil import parser
+
+from ..metrics import observe_spotify_call
+from ..models import SpotifyToken
+from .api import backoff_delay, refresh_spotify_token
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.spotify.com/v1/"
+# rate limiting and transient server errors, worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _endpoint_name(path):
+    """Return the spotipy name of an API path, to label the API metrics."""
+    if path.startswith("albums/"):
+        return "album_tracks"
+    return {"me/albums": "current_user_saved_albums"}.get(path, path)
+
+
+def _saved_after(items, added_after):
+    """Return the saved-album entries saved after `added_after`, if given."""
+    if added_after is None:
+        return items
+    return [item for item in items if parser.parse(item["added_at"]) > added_after]
+
+
+class AsyncSpotifyImporter:  # pylint: disable=too-many-instance-attributes
+    """
+    Importer calling the Spotify Web API with an asyncio HTTP client instead
+    of spotipy. It offers the retrieve_albums/retrieve_artists_by_id/
+    retrieve_album_tracks contract of SpotifyImporter, but keeps up to
+    `max_concurrency` requests in flight over one pooled connection, so a
+    single worker drives many page and artist fetches at once.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        user,
+        access_token=None,
+        *,
+        max_concurrency=8,
+        max_retries=3,
+        retry_delay=2,
+        transport=None,
+    ):
+        """Initialize the AsyncSpotifyImporter.
+        Args:
+            user (User): The user for whom to import data.
+            access_token (str, optional): Spotify access token. If None, the
+                user's stored token is used, refreshed first if expired.
+            max_concurrency (int): Maximum number of requests in flight.
+            max_retries (int): Maximum number of attempts per request.
+            retry_delay (float): Base delay of the exponential backoff.
+            transport (httpx.AsyncBaseTransport, optional): Transport of the
+                HTTP client, e.g. a mock transport in tests.
+        """
+        self.user = user
+        if access_token is None:
+            spotify_token = SpotifyToken.objects.get(user=user)
+            if spotify_token.is_expired():
+                refresh_spotify_token(spotify_token)
+            access_token = spotify_token.access_token
+        self.access_token = access_token
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.transport = transport
+        # API traffic, read by ImportTimer for the per-phase import stats
+        self.api_calls = 0
+        self.bytes_received = 0
+        # saved-album pages that failed, making the retrieved library partial
+        self.failed_album_pages = 0
+        # album track pages that failed, leaving their albums incomplete
+        self.failed_track_pages = 0
+        # monotonic time until which a rate limit pauses every request
+        self._paused_until = 0.0
+
+    def retrieve_albums(  # pylint: disable=too-many-arguments
+        self, max_len=inf, offset=0, limit=50, added_after=None, *, project=None
+    ):
+        """Synchronous wrapper of fetch_albums, see SpotifyImporter."""
+        return asyncio.run(
+            self.fetch_albums(max_len, offset, limit, added_after, project=project)
+        )
+
+    def retrieve_artists_by_id(self, ids, limit=50):
+        """Synchronous wrapper of fetch_artists, see SpotifyImporter."""
+        return asyncio.run(self.fetch_artists(ids, limit))
+
+    async def fetch_albums(  # pylint: disable=too-many-arguments,too-many-locals
+        self, max_len=inf, offset=0, limit=50, added_after=None, *, project=None
+    ):
+        """
+        Retrieve saved albums from the user's Spotify library.
+
+        The first page tells the library size, the other pages are then
+        fetched concurrently. With `added_after`, pages are fetched in waves
+        of max_concurrency pages and reading stops after the first wave
+        reaching an album saved before that time.
+
+        Args:
+            max_len (int): Maximum number of albums to retrieve.
+            offset (int): The index of the first album to retrieve.
+            limit (int): Number of albums to retrieve per API call.
+            added_after (datetime, optional): Only retrieve the albums saved
+                after this time.
+            project (callable, optional): Applied to every saved-album
+                entry as its page arrives, see SpotifyImporter.
+        Returns:
+            list: A list of saved-album entries, most recently saved first.
+        """
+        assert limit > 0
+        assert max_len > 0
+        assert offset >= 0
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as client:
+            first = await self._get(
+                client, semaphore, "me/albums", limit=min(limit, max_len), offset=offset
+            )
+            if first is None:
+                self.failed_album_pages += 1
+                return []
+            albums = _saved_after(first["items"], added_after)
+            reached_older = len(albums) < len(first["items"])
+            if project is not None:
+                albums = list(map(project, albums))
+            max_len = min(max_len, first["total"] - offset)
+            offsets = list(range(offset + limit, offset + max_len, limit))
+            wave_size = len(offsets) if added_after is None else self.max_concurrency
+            while offsets and not reached_older:
+                pages = await asyncio.gather(
+                    *(
+                        self._get(
+                            client,
+                            semaphore,
+                            "me/albums",
+                            limit=min(limit, offset + max_len - page_offset),
+                            offset=page_offset,
+                        )
+                        for page_offset in offsets[:wave_size]
+                    )
+                )
+                offsets = offsets[wave_size:]
+                self.failed_album_pages += pages.count(None)
+                for page in filter(None, pages):
+                    items = _saved_after(page["items"], added_after)
+                    reached_older |= len(items) < len(page["items"])
+                    albums += items if project is None else map(project, items)
+        return albums
+
+    async def fetch_artists(self, ids, limit=50):
+        """
+        Retrieve artist information by their Spotify IDs, fetching all
+        batches concurrently.
+
+        Args:
+            ids (list): List of Spotify artist IDs.
+            limit (int): Number of artists to retrieve per API call.
+        Returns:
+            list: The artist objects in the order of `ids`, with None for
+                the artists of batches that failed.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batches = [ids[i : i + limit] for i in range(0, len(ids), limit)]
+        async with self._client() as client:
+            responses = await asyncio.gather(
+                *(
+                    self._get(client, semaphore, "artists", ids=",".join(batch))
+                    for batch in batches
+                )
+            )
+        artists = []
+        for batch, response in zip(batches, responses):
+            artists += response["artists"] if response else [None] * len(batch)
+        return artists
+
+    def retrieve_album_tracks(self, pages, limit=50):
+        """Synchronous wrapper of fetch_album_tracks, see SpotifyImporter."""
+        return asyncio.run(self.fetch_album_tracks(pages, limit))
+
+    async def fetch_album_tracks(self, pages, limit=50):
+        """
+        Retrieve pages of album track listings, fetching all pages
+        concurrently.
+
+        Args:
+            pages (list): (album id, offset) pairs of the pages to retrieve.
+            limit (int): Number of tracks per page.
+        Returns:
+            list: The track lists of the pages in the order of `pages`,
+                None for the pages that failed.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as client:
+            responses = await asyncio.gather(
+                *(
+                    self._get(
+                        client,
+                        semaphore,
+                        f"albums/{album_id}/tracks",
+                        limit=limit,
+                        offset=offset,
+                    )
+                    for album_id, offset in pages
+                )
+            )
+        self.failed_track_pages += responses.count(None)
+        return [response["items"] if response else None for response in responses]
+
+    def _client(self):
+        """Return an HTTP client pooling up to max_concurrency connections."""
+        return httpx.AsyncClient(
+            base_url=API_URL,
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            timeout=httpx.Timeout(10.0),
+            transport=self.transport,
+        )
+
+    async def _get(self, client, semaphore, path, **params):
+        """
+        GET an API endpoint with retries, returning the decoded JSON or None
+        if the request failed for good.
+
+        Rate limiting (429) pauses every request of the importer for the
+        Retry-After time, other transient errors back off exponentially.
+        """
+        endpoint = _endpoint_name(path)
+        for attempt in range(1, self.max_retries + 1):
+            retry_after = None
+            async with semaphore:
+                await self._wait_for_rate_limit()
+                self.api_calls += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params)
+                except httpx.TransportError as e:
+                    observe_spotify_call(endpoint, type(e).__name__, started)
+                    error = e
+                else:
+                    observe_spotify_call(endpoint, response.status_code, started)
+                    self.bytes_received += len(response.content)
+                    if response.status_code not in RETRY_STATUSES:
+                        try:
+                            response.raise_for_status()
+                        except httpx.HTTPStatusError as e:
+                            logger.error("Spotify API error on %s: %s", path, e)
+                            return None
+                        return response.json()
+                    error = f"HTTP {response.status_code}"
+                    if response.status_code == 429:
+                        retry_after = response.headers.get("Retry-After", "1")
+            delay = backoff_delay(attempt, self.retry_delay, retry_after)
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            if attempt == self.max_retries:
+                logger.error("%s on %s. Giving up.", error, path)
+                return None
+            logger.warning(
+                "%s on %s, attempt %s/%s. Retrying in %.1f s ...",
+                error,
+                path,
+                attempt,
+                self.max_retries,
+                delay,
+            )
+            await asyncio.sleep(delay)
+        return None  # return to make pylint happy
+
+    async def _wait_for_rate_limit(self):
+        """Sleep while a rate limit reported by the API is in effect."""
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
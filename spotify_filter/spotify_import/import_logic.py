@@ -1,147 +1,566 @@
 import logging
+from collections import defaultdict
+from itertools import islice
 
 from dateutil import parser
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
 
-from spotify_filter.models import Album, AlbumTrack, Artist, Genre, Track
+from spotify_filter.models import (
+    Album,
+    Artist,
+    ArtistSimilarity,
+    CatalogState,
+    Genre,
+    ImportRun,
+    LibraryAlbum,
+    LibraryArtist,
+    LibraryState,
+    LibraryStats,
+    Track,
+)
+from spotify_filter.similarity import rebuild_similarity_index, unindexed_artists
 
 from .api import SpotifyImporter
+from .async_api import AsyncSpotifyImporter
+from .loaders import get_loader
+from .records import SavedAlbum, TrackRecord, require
+from .timing import ImportTimer
 
 logger = logging.getLogger(__name__)
 
+# maximum number of tracks per album tracks page of the Spotify API
+TRACK_PAGE_SIZE = 50
+# rows per statement when writing the artists and their genres
+ARTIST_BATCH_SIZE = 1000
 
-def import_from_spotify(user=None, importer=None):
+
+def get_importer(user, name=None):
+    """
+    Return the importer reading the user's library from the Spotify API.
+
+    Args:
+        user (User): The user for whom to import data.
+        name (str, optional): "spotipy" (SpotifyImporter) or "async"
+            (AsyncSpotifyImporter). Defaults to the SPOTIFY_IMPORTER setting.
+    """
+    name = name or getattr(settings, "SPOTIFY_IMPORTER", "spotipy")
+    if name == "spotipy":
+        return SpotifyImporter(user=user)
+    if name == "async":
+        return AsyncSpotifyImporter(
+            user, max_concurrency=getattr(settings, "SPOTIFY_IMPORT_CONCURRENCY", 8)
+        )
+    raise ValueError(f"Unknown importer {name!r}")
+
+
+def _new_stats():
+    """Return the zeroed statistics of an import."""
+    return {
+        "albums_processed": 0,
+        "albums_failed": 0,
+        "artists_processed": 0,
+        "artists_updated": 0,
+        "artists_failed": 0,
+        "tracks_processed": 0,
+        "tracks_failed": 0,
+        "albums_removed": 0,
+        "artists_removed": 0,
+        "album_pages_failed": 0,
+        "track_pages_failed": 0,
+    }
+
+
+def import_from_spotify(  # pylint: disable=too-many-arguments
+    user=None, importer=None, *, batch_size=None, loader=None, since=None, enrich=True
+):
     """Import data from Spotify into the local database.
     Args:
         user (User, optional): The user for whom to import data.
          If None, the importer must have a user set.
         importer (SpotifyImporter, optional): An instance of SpotifyImporter.
-            If None, a new instance will be created.
+            If None, one is created with get_importer().
+        batch_size (int, optional): Number of albums written to the database
+            at once. Defaults to the batch size of the loader.
+        loader (optional): Loader backend writing the albums, see
+            spotify_import.loaders. Defaults to get_loader().
+        since (datetime, optional): Delta sync, only import the albums saved
+            after this time and refresh the artists of those albums. Without
+            it, the albums no longer saved are removed from the library.
+        enrich (bool): Also update the artists and the similarity index.
+            Without it, enrich_from_spotify has to run afterwards.
     Returns:
-        dict: A dictionary containing statistics about the import process.
+        dict: A dictionary containing statistics about the import process,
+            with the per-phase timing breakdown under "timing". Imports of
+            a user are also recorded as an ImportRun.
     """
 
     # user is required if no importer is provided for sake of testing
     if importer is None:
-        importer = SpotifyImporter(user=user)
+        importer = get_importer(user)
     if user is not None:
         importer.user = user
 
-    stats = {
-        "albums_processed": 0,
-        "albums_failed": 0,
-        "artists_processed": 0,
-        "artists_updated": 0,
-        "artists_failed": 0,
-        "tracks_processed": 0,
-        "tracks_failed": 0,
-    }
-    import_albums(importer, stats)
-    update_artists(importer, stats)
+    started_at = timezone.now()
+    stats = _new_stats()
+    with ImportTimer(importer) as timer:
+        seen_album_ids = import_albums(
+            importer,
+            stats,
+            batch_size=batch_size,
+            loader=loader,
+            since=since,
+            timer=timer,
+        )
+        if since is None and importer.user is not None:
+            with timer.phase("reconcile") as phase:
+                reconcile_library(importer, seen_album_ids, stats)
+            phase.rows += stats["albums_removed"] + stats["artists_removed"]
+        if enrich:
+            _enrich(importer, stats, since, timer)
+        if importer.user is not None:
+            with timer.phase("finalize"):
+                LibraryStats.refresh_for(importer.user)
+                LibraryState.record_sync(importer.user)
+                _touch_catalog(stats)
+    stats["timing"] = timer.as_stats()
+    if importer.user is not None:
+        kind = "full" if since is None else "delta"
+        ImportRun.record(importer.user, kind, importer, stats, started_at)
+    logger.info(str(stats))
+    return stats
+
+
+def _touch_catalog(stats):
+    """
+    Mark the shared catalog as modified if the run wrote albums or artists,
+    so that the library pages of every user sharing them are revalidated.
+    """
+    if stats["albums_processed"] or stats["artists_updated"]:
+        CatalogState.touch()
+
+
+def _enrich(importer, stats, since, timer):
+    """Run the enrichment phase of an import: artists and similarity index."""
+    updated = stats["artists_updated"]
+    with timer.phase("enrich") as phase:
+        changed_artists = update_artists(importer, stats, since=since)
+        if importer.user is not None:
+            # artists already in the catalog are new to the user's index
+            changed_artists |= unindexed_artists(importer.user)
+            rebuild_similarity_index(importer.user, changed_artists)
+    phase.rows += stats["artists_updated"] - updated
+
+
+def enrich_from_spotify(user=None, importer=None, since=None):
+    """Update the genres and images of the user's artists and the similarity
+    index, i.e. the enrichment phase of import_from_spotify on its own.
+    Args:
+        user (User, optional): The user whose artists to update.
+         If None, the importer must have a user set.
+        importer (SpotifyImporter, optional): An instance of SpotifyImporter.
+            If None, one is created with get_importer().
+        since (datetime, optional): Only update the artists of the albums
+            saved after this time.
+    Returns:
+        dict: A dictionary containing statistics about the update, with the
+            timing breakdown under "timing". The run is recorded as an
+            ImportRun.
+    """
+    if importer is None:
+        importer = get_importer(user)
+    if user is not None:
+        importer.user = user
+
+    started_at = timezone.now()
+    stats = _new_stats()
+    with ImportTimer(importer) as timer:
+        _enrich(importer, stats, since, timer)
+        with timer.phase("finalize"):
+            LibraryStats.refresh_for(importer.user)
+            LibraryState.touch(importer.user)
+            _touch_catalog(stats)
+    stats["timing"] = timer.as_stats()
+    ImportRun.record(importer.user, "enrich", importer, stats, started_at)
     logger.info(str(stats))
     return stats
 
 
-def import_albums(importer, stats):
-    """Import albums from Spotify into the local database."""
-    albums = importer.retrieve_albums()
-    for album_entry in albums:
-        album_data = album_entry["album"]
-        images = album_data.get("images", [])
+def _batched(iterable, size):
+    """Yield lists of up to `size` consecutive items of the iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _image_urls(urls):
+    """Return the large, medium and small image URLs, None for missing sizes."""
+    return [urls[i] if len(urls) > i else None for i in range(3)]
+
+
+def import_albums(  # pylint: disable=too-many-arguments
+    importer, stats, *, batch_size=None, loader=None, since=None, timer=None
+):
+    """Import albums from Spotify into the local database.
+
+    The albums are consumed lazily from the importer and written in batches,
+    so the number of queries depends on the number of batches rather than
+    on the number of albums, artists and tracks. With `since`, only the
+    albums saved after that time are retrieved. The importer projects the
+    entries into compact SavedAlbum records as they arrive, so the fields
+    the import doesn't read are not kept. The fetch, parse and write phases
+    are measured by `timer`, if given. Albums whose missing track pages
+    failed are counted as failed and not written, so they aren't stored as
+    complete.
+
+    Returns:
+        set: Spotify ids of all the retrieved albums, including those that
+            failed to parse.
+    """
+    loader = loader or get_loader()
+    timer = timer or ImportTimer(importer)
+    seen_album_ids = set()
+    with timer.phase("fetch"):
+        album_entries = importer.retrieve_albums(added_after=since, project=SavedAlbum)
+    for batch in _batched(
+        timer.iterate("fetch", album_entries), batch_size or loader.batch_size
+    ):
+        seen_album_ids.update(album.id for album in batch)
+        with timer.phase("fetch"):
+            incomplete = complete_album_tracks(importer, batch)
+        if incomplete:
+            stats["albums_failed"] += len(incomplete)
+            batch = [album for album in batch if album.id not in incomplete]
+        save_album_batch(importer.user, batch, stats, loader=loader, timer=timer)
+    seen_album_ids.discard(None)
+    # FileImporter has no page counters, its files are read whole
+    stats["album_pages_failed"] = getattr(importer, "failed_album_pages", 0)
+    stats["track_pages_failed"] = getattr(importer, "failed_track_pages", 0)
+    return seen_album_ids
+
+
+def reconcile_library(importer, seen_album_ids, stats):
+    """
+    Remove the albums the user no longer saves from the user's library after
+    a full import, and the artists left without any of the user's albums.
+
+    The memberships are removed with one set-based delete per table, the
+    shared catalog rows stay for the other libraries. Nothing is removed if
+    the importer failed to retrieve some pages of saved albums, as the seen
+    albums are then only part of the library.
+
+    Args:
+        importer: Importer of the full import, with its user set.
+        seen_album_ids (set): Spotify ids of all the albums retrieved.
+        stats (dict): Import statistics to update.
+    """
+    # the files of FileImporter are read whole, it has no failed pages
+    failed_pages = getattr(importer, "failed_album_pages", 0)
+    if failed_pages:
+        logger.warning(
+            "Not reconciling the library of %s: %d album pages failed",
+            importer.user,
+            failed_pages,
+        )
+        return
+    user = importer.user
+    stats["albums_removed"], _ = (
+        LibraryAlbum.objects.filter(user=user)
+        .exclude(album__spotify_id__in=seen_album_ids)
+        .delete()
+    )
+    orphans = list(
+        LibraryArtist.objects.filter(user=user)
+        .exclude(artist__albums__memberships__user=user)
+        .values_list("artist_id", flat=True)
+    )
+    if not orphans:
+        return
+    stats["artists_removed"], _ = LibraryArtist.objects.filter(
+        user=user, artist_id__in=orphans
+    ).delete()
+    # the remaining artists listing a removed artist get new neighbours
+    listing = set(
+        ArtistSimilarity.objects.filter(user=user, similar_id__in=orphans)
+        .exclude(artist_id__in=orphans)
+        .values_list("artist_id", flat=True)
+    )
+    ArtistSimilarity.objects.filter(user=user, artist_id__in=orphans).delete()
+    if listing:
+        rebuild_similarity_index(user, listing)
+
+
+def complete_album_tracks(importer, albums):
+    """
+    Fetch the missing tracks of albums with more tracks than the first page
+    embedded in the saved-album entries, e.g. box sets and compilations.
+
+    The missing pages of all albums of the batch are requested at once, so
+    the importer can fetch them in parallel, and appended to the tracks of
+    the SavedAlbum records in place.
+
+    Returns:
+        set: Spotify ids of the albums with pages that failed, whose track
+            listings are still incomplete.
+    """
+    pages = []
+    truncated = {}
+    for album in albums:
+        if album.tracks is None or len(album.tracks) >= album.tracks_total:
+            continue
+        truncated[album.id] = album.tracks
+        pages += [
+            (album.id, offset)
+            for offset in range(len(album.tracks), album.tracks_total, TRACK_PAGE_SIZE)
+        ]
+    if not pages:
+        return set()
+    incomplete = set()
+    for (album_id, _), items in zip(pages, importer.retrieve_album_tracks(pages)):
+        if items is None:
+            incomplete.add(album_id)
+        else:
+            truncated[album_id].extend(TrackRecord(item) for item in items)
+    for album_id in incomplete:
+        logger.error("Failed to fetch all tracks of album %s", album_id)
+    return incomplete
+
+
+class AlbumBatch:
+    """
+    Batch of parsed saved-album entries, deduplicated by Spotify id and
+    ready to be written to the database in bulk.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.albums = {}
+        # album spotify id -> LibraryAlbum of the user, without album_id yet
+        self.memberships = {}
+        self.artists = {}
+        self.tracks = {}
+        self.album_artists = set()
+        # (album spotify id, track spotify id) -> (track number, disc number)
+        self.album_tracks = {}
+
+    def add(self, saved, stats):
+        """Parse the SavedAlbum record of a saved-album entry into the batch."""
         try:
-            album_obj, album_created = Album.objects.get_or_create(
-                user=importer.user,
-                spotify_id=album_data["id"],
-                defaults={
-                    "title": album_data["name"],
-                    "total_tracks": int(album_data["total_tracks"]),
-                    "release_date": parser.parse(album_data["release_date"]),
-                    "added_at": parser.parse(album_entry["added_at"]),
-                    "popularity": int(album_data["popularity"]),
-                    # images are sorted from largest to smallest
-                    "album_cover_large": images[0]["url"] if len(images) > 0 else None,
-                    "album_cover_medium": images[1]["url"] if len(images) > 1 else None,
-                    "album_cover_small": images[2]["url"] if len(images) > 2 else None,
-                },
+            require(
+                saved, "id", "name", "total_tracks", "popularity", "artists", "tracks"
             )
-            if not album_created:
-                album_obj.added_at = parser.parse(album_entry["added_at"])
-                album_obj.popularity = int(album_data["popularity"])
-                album_obj.save()
-
-            # create each artist if they don't exist and link to album
-            for artist_data in album_data["artists"]:
-                try:
-                    artist_obj, _ = Artist.objects.get_or_create(
-                        user=importer.user,
-                        spotify_id=artist_data["id"],
-                        defaults={
-                            "name": artist_data["name"],
-                        },
-                    )
-                    album_obj.artists.add(artist_obj)
-                    stats["artists_processed"] += 1
-                except KeyError as e:
-                    logger.error(
-                        "Failed to process artist %s for album %s: %s",
-                        artist_data["id"],
-                        album_data["id"],
-                        e,
-                    )
-                    stats["artists_failed"] += 1
-                    continue
-
-            album_obj.save()
-
-            for track_data in album_data["tracks"]["items"]:
-                try:
-                    track_obj, _ = Track.objects.get_or_create(
-                        spotify_id=track_data["id"],
-                        defaults={
-                            "title": track_data["name"],
-                            "duration_ms": int(track_data["duration_ms"]),
-                        },
-                    )
-                    # create link between album and track with track and disc number
-                    AlbumTrack.objects.get_or_create(
-                        album=album_obj,
-                        track=track_obj,
-                        defaults={
-                            "track_number": int(track_data["track_number"]),
-                            "disc_number": int(track_data["disc_number"]),
-                        },
-                    )
-                    stats["tracks_processed"] += 1
-                except KeyError as e:
-                    logger.error("Failed to process track %s: %s", track_data["id"], e)
-                    stats["tracks_failed"] += 1
-                    continue
-            stats["albums_processed"] += 1
-        except KeyError as e:
-            logger.error("Failed to process album %s: %s", album_data["id"], e)
+            cover_large, cover_medium, cover_small = _image_urls(saved.image_urls)
+            album = Album(
+                spotify_id=saved.id,
+                title=saved.name,
+                total_tracks=int(saved.total_tracks),
+                popularity=int(saved.popularity),
+                album_cover_large=cover_large,
+                album_cover_medium=cover_medium,
+                album_cover_small=cover_small,
+                # unknown release dates (e.g. in offline exports) stay None
+                # for the loaders, which insert them with the model default
+                release_date=None,
+            )
+            membership = LibraryAlbum(user=self.user)
+            # unknown added_at dates fall back to the default
+            if saved.release_date is not None:
+                album.release_date = parser.parse(saved.release_date).date()
+            if saved.added_at is not None:
+                membership.added_at = parser.parse(saved.added_at)
+        except (KeyError, ValueError) as e:
+            logger.error("Failed to process album %s: %s", saved.id, e)
             stats["albums_failed"] += 1
-            continue
+            return
+        self.albums[album.spotify_id] = album
+        self.memberships[album.spotify_id] = membership
+
+        # create each artist if they don't exist and link to album
+        for artist in saved.artists:
+            try:
+                require(artist, "id", "name")
+                self.artists.setdefault(
+                    artist.id,
+                    Artist(spotify_id=artist.id, name=artist.name),
+                )
+                self.album_artists.add((album.spotify_id, artist.id))
+                stats["artists_processed"] += 1
+            except KeyError as e:
+                logger.error(
+                    "Failed to process artist %s for album %s: %s",
+                    artist.id,
+                    album.spotify_id,
+                    e,
+                )
+                stats["artists_failed"] += 1
 
+        for track in saved.tracks:
+            try:
+                require(
+                    track, "id", "name", "duration_ms", "track_number", "disc_number"
+                )
+                self.tracks.setdefault(
+                    track.id,
+                    Track(
+                        spotify_id=track.id,
+                        title=track.name,
+                        duration_ms=int(track.duration_ms),
+                    ),
+                )
+                # link between album and track with track and disc number
+                self.album_tracks.setdefault(
+                    (album.spotify_id, track.id),
+                    (int(track.track_number), int(track.disc_number)),
+                )
+                stats["tracks_processed"] += 1
+            except KeyError as e:
+                logger.error("Failed to process track %s: %s", track.id, e)
+                stats["tracks_failed"] += 1
+        stats["albums_processed"] += 1
 
-def update_artists(importer, stats):
-    """Update artist information such as genres and images."""
-    artist_ids = list(
-        Artist.objects.values_list("spotify_id", flat=True)
-    )  # filter only the user specific artists?
+
+def save_album_batch(user, albums, stats, loader=None, timer=None):
+    """Parse and upsert saved albums with their artists and tracks.
+    Args:
+        user (User): The owner of the albums.
+        albums (list): SavedAlbum records of saved-album entries.
+        stats (dict): Import statistics to update.
+        loader (optional): Loader backend writing the batch.
+            Defaults to get_loader().
+        timer (ImportTimer, optional): Timer measuring the parse and write
+            phases.
+    """
+    timer = timer or ImportTimer()
+    batch = AlbumBatch(user)
+    with timer.phase("parse", rows=len(albums)):
+        for saved in albums:
+            batch.add(saved, stats)
+    with timer.phase("write", rows=len(batch.albums)):
+        (loader or get_loader()).write(batch)
+
+
+class GenreCache:
+    """
+    Process-local map of genre names to ids for the duration of an
+    enrichment run. Unknown names are resolved with one query, and the
+    genres missing from the database are created with one bulk insert.
+    """
+
+    def __init__(self):
+        self.ids = {}
+
+    def resolve(self, names):
+        """Return {name: id} of the genre names, creating the missing genres."""
+        unknown = set(names) - self.ids.keys()
+        if unknown:
+            self.ids.update(
+                Genre.objects.filter(name__in=unknown).values_list("name", "id")
+            )
+            new = unknown - self.ids.keys()
+            if new:
+                # other imports may create the same genres meanwhile
+                Genre.objects.bulk_create(
+                    [Genre(name=name) for name in new], ignore_conflicts=True
+                )
+                self.ids.update(
+                    Genre.objects.filter(name__in=new).values_list("name", "id")
+                )
+        return {name: self.ids[name] for name in names}
+
+
+def update_artists(importer, stats, since=None):
+    """Update artist information such as genres and images.
+
+    The genres are synchronised with the source: the current genres of the
+    artists are loaded in bulk, and only the artist-genre rows added or
+    removed by the source are written. The number of queries doesn't
+    depend on the number of artists.
+
+    Args:
+        importer: Importer retrieving the artists.
+        stats (dict): Import statistics to update.
+        since (datetime, optional): Only update the artists of the albums
+            saved after this time.
+    Returns:
+        set: Ids of the artists whose genres changed.
+    """
+    artists = Artist.objects.for_user(importer.user)
+    if since is not None:
+        artists = artists.filter(
+            albums__memberships__user=importer.user,
+            albums__memberships__added_at__gt=since,
+        )
+    artists_by_id = {artist.spotify_id: artist for artist in artists.distinct()}
+    artist_ids = list(artists_by_id)
+    current_genres = defaultdict(set)
+    for artist_id, genre_id in Artist.genres.through.objects.filter(
+        artist__in=artists_by_id.values()
+    ).values_list("artist_id", "genre_id"):
+        current_genres[artist_id].add(genre_id)
+
+    updated = []
     for sp_id, artist_data in zip(
         artist_ids, importer.retrieve_artists_by_id(artist_ids)
     ):
+        if artist_data is None or artist_data.get("id", sp_id) != sp_id:
+            # unknown to the source, e.g. missing from an offline export or
+            # in a failed batch, or not the artist requested
+            continue
         try:
-            artist_obj = Artist.objects.get(spotify_id=sp_id, user=importer.user)
-            images = artist_data.get("images", [])
-            artist_obj.image_large = images[0]["url"] if len(images) > 0 else None
-            artist_obj.image_medium = images[1]["url"] if len(images) > 1 else None
-            artist_obj.image_small = images[2]["url"] if len(images) > 2 else None
-            artist_obj.save()
-            for genre_name in artist_data["genres"]:
-                genre_obj, _ = Genre.objects.get_or_create(name=genre_name)
-                artist_obj.genres.add(genre_obj)
-            stats["artists_updated"] += 1
+            genre_names = set(artist_data["genres"])
         except KeyError as e:
             logger.error("Failed to update artist %s: %s", sp_id, e)
             stats["artists_failed"] += 1
             continue
+        artist_obj = artists_by_id[sp_id]
+        _set_images(artist_obj, artist_data.get("images", []))
+        updated.append((artist_obj, genre_names))
+        stats["artists_updated"] += 1
+
+    Artist.objects.bulk_update(
+        [artist_obj for artist_obj, _ in updated],
+        ["image_large", "image_medium", "image_small"],
+        batch_size=ARTIST_BATCH_SIZE,
+    )
+    return _sync_genres(updated, current_genres)
+
+
+def _set_images(artist_obj, images):
+    """Set the image URLs of the artist, largest first."""
+    artist_obj.image_large = images[0]["url"] if len(images) > 0 else None
+    artist_obj.image_medium = images[1]["url"] if len(images) > 1 else None
+    artist_obj.image_small = images[2]["url"] if len(images) > 2 else None
+
+
+def _sync_genres(updated, current_genres):
+    """
+    Write the artist-genre rows added and removed by the source.
+
+    Args:
+        updated (list): (artist, genre names) pairs from the source.
+        current_genres (dict): Genre ids of the artists by artist id.
+    Returns:
+        set: Ids of the artists whose genres changed.
+    """
+    through = Artist.genres.through
+    genre_ids = GenreCache().resolve(
+        {name for _, genre_names in updated for name in genre_names}
+    )
+    added, removed = [], Q()
+    changed_artists = set()
+    for artist_obj, genre_names in updated:
+        genres = {genre_ids[name] for name in genre_names}
+        new = genres - current_genres[artist_obj.id]
+        dropped = current_genres[artist_obj.id] - genres
+        added += [through(artist_id=artist_obj.id, genre_id=g) for g in new]
+        if dropped:
+            removed |= Q(artist_id=artist_obj.id, genre_id__in=dropped)
+        if new or dropped:
+            changed_artists.add(artist_obj.id)
+    if removed:
+        through.objects.filter(removed).delete()
+    through.objects.bulk_create(
+        added, batch_size=ARTIST_BATCH_SIZE, ignore_conflicts=True
+    )
+    return changed_artists
@@ -0,0 +1,459 @@
+import io
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from spotify_filter.models import (
+    Album,
+    AlbumTrack,
+    Artist,
+    LibraryAlbum,
+    LibraryArtist,
+    Track,
+)
+
+from .offline import LOCAL_ID_PREFIX
+
+ORM_BATCH_SIZE = 200
+COPY_BATCH_SIZE = 5000
+# shared catalog fields of albums refreshed by every import that knows them
+CATALOG_FIELDS = [
+    "total_tracks",
+    "release_date",
+    "popularity",
+    "album_cover_large",
+    "album_cover_medium",
+    "album_cover_small",
+]
+
+
+def _refresh_album(album, source):
+    """
+    Copy the catalog fields the source knows onto a stored album and return
+    whether any changed. Placeholders, i.e. 0 and None as sent by offline
+    exports, never overwrite stored values.
+    """
+    changed = False
+    for field in CATALOG_FIELDS:
+        value = getattr(source, field)
+        if value not in (None, 0) and value != getattr(album, field):
+            setattr(album, field, value)
+            changed = True
+    return changed
+
+
+class OrmLoader:
+    """
+    Write album batches with bulk_create. Works on every database backend
+    at the cost of one multi-row INSERT per table and batch.
+    """
+
+    batch_size = ORM_BATCH_SIZE
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    def write(self, batch):
+        """Upsert an AlbumBatch with a fixed number of bulk queries.
+
+        Existing catalog albums get the CATALOG_FIELDS values the batch
+        knows and existing library memberships their added_at updated.
+        Album links to placeholder artists are replaced by the real artists,
+        other existing artists, tracks and links are left untouched.
+        """
+        albums = Album.objects.using(self.using)
+        artists = Artist.objects.using(self.using)
+        tracks = Track.objects.using(self.using)
+        release_date = Album._meta.get_field("release_date")
+        with transaction.atomic(using=self.using):
+            stored = albums.in_bulk(list(batch.albums), field_name="spotify_id")
+            new_albums = []
+            for spotify_id, album in batch.albums.items():
+                if spotify_id in stored:
+                    continue
+                if album.release_date is None:
+                    album.release_date = _as_date(release_date.get_default())
+                new_albums.append(album)
+            albums.bulk_create(new_albums, ignore_conflicts=True)
+            albums.bulk_update(
+                [
+                    album
+                    for spotify_id, album in stored.items()
+                    if _refresh_album(album, batch.albums[spotify_id])
+                ],
+                CATALOG_FIELDS,
+            )
+            artists.bulk_create(batch.artists.values(), ignore_conflicts=True)
+            tracks.bulk_create(batch.tracks.values(), ignore_conflicts=True)
+
+            album_ids = dict(
+                albums.filter(spotify_id__in=batch.albums).values_list(
+                    "spotify_id", "id"
+                )
+            )
+            artist_ids = dict(
+                artists.filter(spotify_id__in=batch.artists).values_list(
+                    "spotify_id", "id"
+                )
+            )
+            track_ids = dict(
+                tracks.filter(spotify_id__in=batch.tracks).values_list(
+                    "spotify_id", "id"
+                )
+            )
+            Album.artists.through.objects.using(self.using).bulk_create(
+                (
+                    Album.artists.through(
+                        album_id=album_ids[album_id], artist_id=artist_ids[artist_id]
+                    )
+                    for album_id, artist_id in batch.album_artists
+                ),
+                ignore_conflicts=True,
+            )
+            album_artists = Album.artists.through.objects.using(self.using)
+            # placeholder artists only stand in for albums without real ones
+            album_artists.filter(
+                album_id__in=album_artists.filter(album_id__in=album_ids.values())
+                .exclude(artist__spotify_id__startswith=LOCAL_ID_PREFIX)
+                .values("album_id"),
+                artist__spotify_id__startswith=LOCAL_ID_PREFIX,
+            ).delete()
+            AlbumTrack.objects.using(self.using).bulk_create(
+                (
+                    AlbumTrack(
+                        album_id=album_ids[album_id],
+                        track_id=track_ids[track_id],
+                        track_number=track_number,
+                        disc_number=disc_number,
+                    )
+                    for (album_id, track_id), (track_number, disc_number) in (
+                        batch.album_tracks.items()
+                    )
+                ),
+                ignore_conflicts=True,
+            )
+            for spotify_id, membership in batch.memberships.items():
+                membership.album_id = album_ids[spotify_id]
+            LibraryAlbum.objects.using(self.using).bulk_create(
+                batch.memberships.values(),
+                update_conflicts=True,
+                unique_fields=["user", "album"],
+                update_fields=["added_at"],
+            )
+            LibraryArtist.objects.using(self.using).bulk_create(
+                (
+                    LibraryArtist(user=batch.user, artist_id=artist_id)
+                    for artist_id in artist_ids.values()
+                ),
+                ignore_conflicts=True,
+            )
+
+
+def _copy_value(value):
+    """Format a value for the text format of PostgreSQL COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _as_date(value):
+    """Return the date of a datetime, e.g. of the release_date model default."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+class PostgresCopyLoader:
+    """
+    Write album batches through temporary staging tables.
+
+    The rows of a batch are streamed into session-local staging tables with
+    COPY FROM STDIN and merged into the real tables with one INSERT ... SELECT
+    ... ON CONFLICT statement per table. Database ids are resolved by joins
+    inside PostgreSQL, so no rows travel back to Python and the number of
+    statements per batch does not depend on its size.
+    """
+
+    batch_size = COPY_BATCH_SIZE
+
+    # staging table -> (column, type) pairs
+    STAGING_TABLES = {
+        "stage_album": (
+            ("spotify_id", "text"),
+            ("title", "text"),
+            ("total_tracks", "integer"),
+            ("release_date", "date"),
+            ("added_at", "timestamp with time zone"),
+            ("popularity", "integer"),
+            ("album_cover_large", "text"),
+            ("album_cover_medium", "text"),
+            ("album_cover_small", "text"),
+        ),
+        "stage_artist": (
+            ("spotify_id", "text"),
+            ("name", "text"),
+        ),
+        "stage_track": (
+            ("spotify_id", "text"),
+            ("title", "text"),
+            ("duration_ms", "integer"),
+        ),
+        "stage_album_artist": (
+            ("album_spotify_id", "text"),
+            ("artist_spotify_id", "text"),
+        ),
+        "stage_album_track": (
+            ("album_spotify_id", "text"),
+            ("track_spotify_id", "text"),
+            ("track_number", "integer"),
+            ("disc_number", "integer"),
+        ),
+    }
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    def _copy(self, cursor, table, rows):
+        """Stream rows into a staging table with COPY FROM STDIN."""
+        data = io.StringIO()
+        for row in rows:
+            data.write("\t".join(_copy_value(value) for value in row))
+            data.write("\n")
+        data.seek(0)
+        columns = ", ".join(name for name, _ in self.STAGING_TABLES[table])
+        sql = f"COPY {table} ({columns}) FROM STDIN"
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, data)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(data.getvalue())
+
+    def _create_staging_tables(self, cursor):
+        """Create the staging tables of this session and empty them."""
+        for table, columns in self.STAGING_TABLES.items():
+            definition = ", ".join(f"{name} {kind}" for name, kind in columns)
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {table} ({definition})"
+            )
+        cursor.execute(f"TRUNCATE {', '.join(self.STAGING_TABLES)}")
+
+    def _stage(self, cursor, batch):
+        """Copy the rows of the batch into the staging tables."""
+        self._copy(
+            cursor,
+            "stage_album",
+            (
+                (
+                    album.spotify_id,
+                    album.title,
+                    album.total_tracks,
+                    _as_date(album.release_date),
+                    batch.memberships[album.spotify_id].added_at,
+                    album.popularity,
+                    album.album_cover_large,
+                    album.album_cover_medium,
+                    album.album_cover_small,
+                )
+                for album in batch.albums.values()
+            ),
+        )
+        self._copy(
+            cursor,
+            "stage_artist",
+            ((artist.spotify_id, artist.name) for artist in batch.artists.values()),
+        )
+        self._copy(
+            cursor,
+            "stage_track",
+            (
+                (track.spotify_id, track.title, track.duration_ms)
+                for track in batch.tracks.values()
+            ),
+        )
+        self._copy(
+            cursor,
+            "stage_album_artist",
+            batch.album_artists,
+        )
+        self._copy(
+            cursor,
+            "stage_album_track",
+            (
+                (album_id, track_id, track_number, disc_number)
+                for (album_id, track_id), (track_number, disc_number) in (
+                    batch.album_tracks.items()
+                )
+            ),
+        )
+
+    @staticmethod
+    def _merge(cursor, user_id):
+        """Upsert the staged rows into the catalog and the user's library."""
+        album = Album._meta.db_table
+        artist = Artist._meta.db_table
+        track = Track._meta.db_table
+        album_artists = Album.artists.through._meta.db_table
+        album_track = AlbumTrack._meta.db_table
+        library_album = LibraryAlbum._meta.db_table
+        library_artist = LibraryArtist._meta.db_table
+        cursor.execute(
+            f"""
+            INSERT INTO {album} (
+                spotify_id, title, total_tracks, release_date, popularity,
+                album_cover_large, album_cover_medium, album_cover_small
+            )
+            SELECT
+                spotify_id, title, total_tracks,
+                COALESCE(release_date, CURRENT_DATE), popularity,
+                album_cover_large, album_cover_medium, album_cover_small
+            FROM stage_album
+            ON CONFLICT (spotify_id) DO NOTHING
+            """
+        )
+        # the placeholders of offline exports, 0 and NULL, never overwrite
+        cursor.execute(
+            f"""
+            UPDATE {album} al SET
+                total_tracks = COALESCE(NULLIF(s.total_tracks, 0), al.total_tracks),
+                release_date = COALESCE(s.release_date, al.release_date),
+                popularity = COALESCE(NULLIF(s.popularity, 0), al.popularity),
+                album_cover_large = COALESCE(
+                    s.album_cover_large, al.album_cover_large
+                ),
+                album_cover_medium = COALESCE(
+                    s.album_cover_medium, al.album_cover_medium
+                ),
+                album_cover_small = COALESCE(
+                    s.album_cover_small, al.album_cover_small
+                )
+            FROM stage_album s
+            WHERE al.spotify_id = s.spotify_id AND (
+                NULLIF(s.total_tracks, 0) <> al.total_tracks
+                OR s.release_date <> al.release_date
+                OR NULLIF(s.popularity, 0) <> al.popularity
+                OR s.album_cover_large IS DISTINCT FROM al.album_cover_large
+                OR s.album_cover_medium IS DISTINCT FROM al.album_cover_medium
+                OR s.album_cover_small IS DISTINCT FROM al.album_cover_small
+            )
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {artist} (spotify_id, name)
+            SELECT spotify_id, name FROM stage_artist
+            ON CONFLICT (spotify_id) DO NOTHING
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {track} (spotify_id, title, duration_ms)
+            SELECT spotify_id, title, duration_ms FROM stage_track
+            ON CONFLICT (spotify_id) DO NOTHING
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {album_artists} (album_id, artist_id)
+            SELECT al.id, ar.id
+            FROM stage_album_artist s
+            JOIN {album} al ON al.spotify_id = s.album_spotify_id
+            JOIN {artist} ar ON ar.spotify_id = s.artist_spotify_id
+            ON CONFLICT (album_id, artist_id) DO NOTHING
+            """
+        )
+        # placeholder artists only stand in for albums without real ones
+        cursor.execute(
+            f"""
+            DELETE FROM {album_artists} aa
+            USING {artist} ar
+            WHERE ar.id = aa.artist_id AND ar.spotify_id LIKE %s
+            AND aa.album_id IN (
+                SELECT real.album_id
+                FROM stage_album s
+                JOIN {album} al ON al.spotify_id = s.spotify_id
+                JOIN {album_artists} real ON real.album_id = al.id
+                JOIN {artist} real_ar ON real_ar.id = real.artist_id
+                WHERE real_ar.spotify_id NOT LIKE %s
+            )
+            """,
+            [LOCAL_ID_PREFIX + "%", LOCAL_ID_PREFIX + "%"],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {album_track} (album_id, track_id, track_number, disc_number)
+            SELECT al.id, t.id, s.track_number, s.disc_number
+            FROM stage_album_track s
+            JOIN {album} al ON al.spotify_id = s.album_spotify_id
+            JOIN {track} t ON t.spotify_id = s.track_spotify_id
+            ON CONFLICT (album_id, track_id) DO NOTHING
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {library_album} (user_id, album_id, added_at)
+            SELECT %s, al.id, s.added_at
+            FROM stage_album s
+            JOIN {album} al ON al.spotify_id = s.spotify_id
+            ON CONFLICT (user_id, album_id) DO UPDATE SET added_at = EXCLUDED.added_at
+            """,
+            [user_id],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {library_artist} (user_id, artist_id)
+            SELECT %s, ar.id
+            FROM stage_artist s
+            JOIN {artist} ar ON ar.spotify_id = s.spotify_id
+            ON CONFLICT (user_id, artist_id) DO NOTHING
+            """,
+            [user_id],
+        )
+
+    def write(self, batch):
+        """Upsert an AlbumBatch with COPY and set-based merges.
+
+        Same semantics as OrmLoader.write: existing albums get the known
+        catalog values and memberships their added_at updated, placeholder
+        artist links are replaced, everything else is only inserted.
+        """
+        with (
+            transaction.atomic(using=self.using),
+            connections[self.using].cursor() as cursor,
+        ):
+            self._create_staging_tables(cursor)
+            self._stage(cursor, batch)
+            self._merge(cursor, batch.user.pk)
+
+
+LOADERS = {
+    "orm": OrmLoader,
+    "copy": PostgresCopyLoader,
+}
+
+
+def get_loader(name=None, using="default"):
+    """
+    Return the loader backend used to write imported albums.
+
+    Args:
+        name (str, optional): "orm", "copy" or "auto". Defaults to the
+            SPOTIFY_IMPORT_LOADER setting. "auto" picks the COPY loader on
+            PostgreSQL and the ORM loader on every other database.
+        using (str): Alias of the database to write to.
+    """
+    name = name or getattr(settings, "SPOTIFY_IMPORT_LOADER", "auto")
+    if name == "auto":
+        name = "copy" if connections[using].vendor == "postgresql" else "orm"
+    try:
+        loader_class = LOADERS[name]
+    except KeyError as e:
+        raise ValueError(f"Unknown import loader {name!r}") from e
+    return loader_class(using=using)
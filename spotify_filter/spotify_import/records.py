@@ -0,0 +1,89 @@
+"""
+Compact records of the saved-album entries of the Spotify API.
+
+A saved-album entry carries much more than an import reads: the available
+markets of the album and of every track, copyrights, external URLs, the
+image sizes and so on. The importers project each entry into these
+records as its page arrives, keeping only the fields import_albums needs,
+so a retrieved library takes a fraction of the memory of the raw payload.
+
+The projection never fails: missing fields are None, and AlbumBatch
+reports the albums, artists and tracks lacking a required field as
+failed, as it does for the raw entries.
+"""
+
+
+class ArtistRecord:
+    """Artist credited on a saved album."""
+
+    __slots__ = ("id", "name")
+
+    def __init__(self, artist_data):
+        self.id = artist_data.get("id")
+        self.name = artist_data.get("name")
+
+
+class TrackRecord:
+    """Track of a saved album, with its position on the album."""
+
+    __slots__ = ("id", "name", "duration_ms", "track_number", "disc_number")
+
+    def __init__(self, track_data):
+        self.id = track_data.get("id")
+        self.name = track_data.get("name")
+        self.duration_ms = track_data.get("duration_ms")
+        self.track_number = track_data.get("track_number")
+        self.disc_number = track_data.get("disc_number")
+
+
+class SavedAlbum:  # pylint: disable=too-many-instance-attributes
+    """
+    Saved album of a user's library with its artists and the tracks
+    embedded in the entry, see complete_album_tracks for the others.
+    """
+
+    __slots__ = (
+        "added_at",
+        "id",
+        "name",
+        "total_tracks",
+        "popularity",
+        "release_date",
+        "image_urls",
+        "artists",
+        "tracks",
+        "tracks_total",
+    )
+
+    def __init__(self, entry):
+        album_data = entry.get("album", {})
+        self.added_at = entry.get("added_at")
+        self.id = album_data.get("id")
+        self.name = album_data.get("name")
+        self.total_tracks = album_data.get("total_tracks")
+        self.popularity = album_data.get("popularity")
+        self.release_date = album_data.get("release_date")
+        # large, medium and small URLs, as the images are sorted largest first
+        self.image_urls = tuple(
+            image.get("url") for image in album_data.get("images", [])[:3]
+        )
+        artists = album_data.get("artists")
+        self.artists = None
+        if artists is not None:
+            self.artists = [ArtistRecord(artist) for artist in artists]
+        tracks = album_data.get("tracks")
+        self.tracks = None
+        self.tracks_total = 0
+        if tracks is not None:
+            self.tracks = [TrackRecord(track) for track in tracks.get("items", [])]
+            self.tracks_total = tracks.get("total", 0)
+
+
+def require(record, *fields):
+    """
+    Raise KeyError for the first of the record's fields that is missing,
+    like reading the field of the raw entry would.
+    """
+    for field in fields:
+        if getattr(record, field) is None:
+            raise KeyError(field)
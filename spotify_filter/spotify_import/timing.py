@@ -0,0 +1,136 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from spotify_filter.metrics import all_connections_wrapped
+
+# phases of an import, in the order they first run
+PHASES = ["fetch", "parse", "write", "reconcile", "enrich", "finalize"]
+
+
+class PhaseStats:
+    """
+    Wall time, API traffic, failed API pages, database queries and rows of
+    one import phase.
+    """
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.api_calls = 0
+        self.bytes_received = 0
+        self.failed_pages = 0
+        self.queries = 0
+        self.rows = 0
+
+    def as_dict(self):
+        """Return the figures with the phase throughput in rows per second."""
+        return {
+            "wall_time": round(self.wall_time, 6),
+            "api_calls": self.api_calls,
+            "bytes_received": self.bytes_received,
+            "failed_pages": self.failed_pages,
+            "queries": self.queries,
+            "rows": self.rows,
+            "rows_per_second": (
+                round(self.rows / self.wall_time, 1) if self.wall_time else None
+            ),
+        }
+
+
+class ImportTimer:
+    """
+    Break the cost of an import down into phases.
+
+    Wall time is measured around each phase, database queries are counted
+    with an execute wrapper while the timer is active, and the API calls,
+    bytes received and failed pages are read from the importer's
+    `api_calls`, `bytes_received`, `failed_album_pages` and
+    `failed_track_pages` counters, if it has them.
+    """
+
+    def __init__(self, importer=None):
+        self.importer = importer
+        self.phases = {}
+        self.wall_time = 0.0
+        self._current = None
+        self._started = None
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._stack.enter_context(all_connections_wrapped(self._count_query))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self.wall_time += time.perf_counter() - self._started
+
+    def _count_query(self, execute, *args):
+        """Execute wrapper attributing every query to the current phase."""
+        if self._current is not None:
+            self._current.queries += 1
+        return execute(*args)
+
+    def _api_counters(self):
+        """Return the importer's API call, received bytes and failed pages."""
+        return (
+            getattr(self.importer, "api_calls", 0),
+            getattr(self.importer, "bytes_received", 0),
+            getattr(self.importer, "failed_album_pages", 0)
+            + getattr(self.importer, "failed_track_pages", 0),
+        )
+
+    @contextmanager
+    def phase(self, name, rows=0):
+        """
+        Measure the enclosed code as part of the named phase.
+
+        Args:
+            name (str): Phase name, see PHASES.
+            rows (int): Number of rows the code processes.
+        Yields:
+            PhaseStats: The stats of the phase, e.g. to add rows counted
+                inside the block.
+        """
+        stats = self.phases.setdefault(name, PhaseStats())
+        previous, self._current = self._current, stats
+        api_calls, bytes_received, failed_pages = self._api_counters()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.wall_time += time.perf_counter() - start
+            stats.rows += rows
+            end_calls, end_bytes, end_failed = self._api_counters()
+            stats.api_calls += end_calls - api_calls
+            stats.bytes_received += end_bytes - bytes_received
+            stats.failed_pages += end_failed - failed_pages
+            self._current = previous
+
+    def iterate(self, name, iterable):
+        """
+        Yield the items of an iterable, measuring the time spent producing
+        them (e.g. by a lazy importer) and counting them as rows of the
+        named phase.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name) as stats:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stats.rows += 1
+            yield item
+
+    def as_stats(self):
+        """Return the timing figures to merge into the import statistics."""
+        ordered = sorted(
+            self.phases.items(),
+            key=lambda item: (
+                PHASES.index(item[0]) if item[0] in PHASES else len(PHASES)
+            ),
+        )
+        return {
+            "wall_time": round(self.wall_time, 6),
+            "phases": {name: stats.as_dict() for name, stats in ordered},
+        }
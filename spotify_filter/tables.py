@@ -66,6 +66,8 @@ class AlbumTable(tables.Table):
 
     album_cover_small = tables.Column(verbose_name="Cover")
     artists = tables.Column(verbose_name="Artists")
+    # annotated by Album.objects.for_user from the library membership
+    added_at = tables.DateTimeColumn(verbose_name="Added at")
 
     class Meta:
         """Meta class for AlbumTable."""
@@ -1,15 +1,226 @@
+# The Spotify client and the import stack are imported by the tasks that
+# use them, so that web processes importing this module to queue tasks
+# don't load spotipy, requests and httpx.
+# pylint: disable=import-outside-toplevel
+import io
+import random
+from datetime import datetime
+
 from celery import shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, DateTimeField, ExpressionWrapper, Max, Q, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+
+from .models import LibraryAlbum, LibraryState, LibraryUpload, SpotifyToken
 
-from .spotify_import.import_logic import import_from_spotify
+# task result rows deleted per statement by prune_task_results_task
+PRUNE_BATCH_SIZE = 5000
 
 
 @shared_task()
 def import_spotify_data_task(user_id):
-    """Celery task to import data from Spotify."""
+    """
+    Celery task to import data from Spotify. The artists are enriched by a
+    separate task, so the albums show up as soon as they are imported.
+    """
+    from .spotify_import.import_logic import import_from_spotify
+
     try:
         user = get_user_model().objects.get(id=user_id)
-        import_from_spotify(user)
+        import_from_spotify(user, enrich=False)
+        enrich_library_task.delay(user_id)
         return {"status": "success"}
     except Exception as e:
         raise e
+
+
+@shared_task()
+def enrich_library_task(user_id, since=None):
+    """
+    Celery task updating the user's artists and similarity index after an
+    import, only for the albums saved after `since` (ISO format) if given.
+    """
+    from .spotify_import.import_logic import enrich_from_spotify
+
+    user = get_user_model().objects.get(id=user_id)
+    if since is not None:
+        since = datetime.fromisoformat(since)
+    enrich_from_spotify(user, since=since)
+    return {"status": "success"}
+
+
+@shared_task()
+def import_library_file_task(user_id, upload_id):
+    """Celery task to import an uploaded Spotify library export file."""
+    from .spotify_import.import_logic import import_from_spotify
+    from .spotify_import.offline import FileImporter
+
+    upload = LibraryUpload.objects.get(id=upload_id, user_id=user_id)
+    try:
+        library_file = io.BytesIO(upload.data)
+        import_from_spotify(
+            upload.user, importer=FileImporter(upload.user, [library_file])
+        )
+        return {"status": "success"}
+    finally:
+        upload.delete()
+
+
+@shared_task()
+def refresh_expiring_tokens_task():
+    """
+    Periodic task queueing refreshes of the Spotify tokens close to expiry.
+
+    The refreshes of a run are spread randomly over the jitter window so
+    they don't hit the Spotify auth endpoint at once, and tokens whose last
+    refresh failed are retried after a delay.
+    """
+    now = timezone.now()
+    token_ids = list(
+        SpotifyToken.objects.filter(
+            expires_at__lte=now + settings.SPOTIFY_TOKEN_REFRESH_MARGIN
+        )
+        .exclude(refresh_failed_at__gt=now - settings.SPOTIFY_TOKEN_RETRY_DELAY)
+        .order_by("expires_at")
+        .values_list("id", flat=True)[: settings.SPOTIFY_TOKEN_REFRESH_BATCH_SIZE]
+    )
+    jitter = settings.SPOTIFY_TOKEN_REFRESH_JITTER.total_seconds()
+    for token_id in token_ids:
+        refresh_spotify_token_task.apply_async(
+            (token_id,), countdown=random.uniform(0, jitter)
+        )
+    return {"queued": len(token_ids)}
+
+
+@shared_task()
+def refresh_spotify_token_task(token_id):
+    """
+    Celery task to refresh one Spotify token unless it was refreshed meanwhile.
+
+    The token is claimed with a single update, so that no row lock is held
+    while waiting for Spotify, and concurrent tasks skip it until the result
+    is stored or the claim times out.
+    """
+    from .spotify_import.api import REFRESH_ERRORS, refresh_spotify_token
+
+    now = timezone.now()
+    claimed = (
+        SpotifyToken.objects.filter(
+            id=token_id, expires_at__lte=now + settings.SPOTIFY_TOKEN_REFRESH_MARGIN
+        )
+        .exclude(refreshing_at__gt=now - settings.SPOTIFY_TOKEN_REFRESH_TIMEOUT)
+        .update(refreshing_at=now)
+    )
+    if not claimed:
+        return {"status": "skipped"}
+    token = SpotifyToken.objects.get(id=token_id)
+    try:
+        # stores the new token, or the failure, and releases the claim
+        refresh_spotify_token(token)
+    except REFRESH_ERRORS:
+        return {"status": "failed"}
+    return {"status": "success"}
+
+
+def _due_libraries(now):
+    """
+    Return the libraries of connected users that are due for a sync, most
+    overdue first. Libraries of active users are due sooner.
+    """
+    active = Q(user__last_login__gte=now - settings.SPOTIFY_SYNC_ACTIVE_WINDOW)
+    synced_at = Coalesce("synced_at", "last_modified")
+    due_at = Case(
+        When(
+            active,
+            then=ExpressionWrapper(
+                synced_at + settings.SPOTIFY_SYNC_INTERVAL,
+                output_field=DateTimeField(),
+            ),
+        ),
+        default=ExpressionWrapper(
+            synced_at + settings.SPOTIFY_SYNC_INACTIVE_INTERVAL,
+            output_field=DateTimeField(),
+        ),
+    )
+    return (
+        LibraryState.objects.filter(
+            user__spotifytoken__isnull=False,
+            user__spotifytoken__refresh_failed_at__isnull=True,
+        )
+        .exclude(sync_queued_at__gt=now - settings.SPOTIFY_SYNC_TIMEOUT)
+        .annotate(due_at=due_at)
+        .filter(due_at__lte=now)
+        .order_by("due_at")
+    )
+
+
+@shared_task()
+def schedule_library_syncs_task():
+    """
+    Periodic task queueing delta syncs of the libraries due for one.
+
+    At most SPOTIFY_SYNC_MAX_CONCURRENT syncs are queued or running at once,
+    and the start times of a run are spread over the schedule interval, so
+    the import load stays even instead of arriving in bursts.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        in_flight = LibraryState.objects.filter(
+            sync_queued_at__gt=now - settings.SPOTIFY_SYNC_TIMEOUT
+        ).count()
+        slots = max(settings.SPOTIFY_SYNC_MAX_CONCURRENT - in_flight, 0)
+        states = list(
+            _due_libraries(now)
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("id", "user_id")[:slots]
+        )
+        LibraryState.objects.filter(id__in=[pk for pk, _ in states]).update(
+            sync_queued_at=now
+        )
+    spread = settings.SPOTIFY_SYNC_SCHEDULE_INTERVAL.total_seconds() / max(
+        len(states), 1
+    )
+    for i, (_, user_id) in enumerate(states):
+        sync_library_task.apply_async(
+            (user_id,), countdown=(i + random.random()) * spread
+        )
+    return {"queued": len(states)}
+
+
+@shared_task()
+def sync_library_task(user_id):
+    """
+    Celery task importing the albums saved since the user's latest import.
+
+    A failed sync keeps its queue mark until SPOTIFY_SYNC_TIMEOUT, which
+    delays the next attempt.
+    """
+    from .spotify_import.import_logic import import_from_spotify
+
+    user = get_user_model().objects.get(id=user_id)
+    albums = LibraryAlbum.objects.filter(user=user)
+    since = albums.aggregate(Max("added_at"))["added_at__max"]
+    stats = import_from_spotify(user, since=since, enrich=False)
+    enrich_library_task.delay(user_id, since=since.isoformat() if since else None)
+    return {"status": "success", "albums_processed": stats["albums_processed"]}
+
+
+@shared_task()
+def prune_task_results_task():
+    """
+    Periodic task deleting task result rows older than CELERY_RESULT_EXPIRES.
+
+    Task results are kept in an expiring cache, so the rows are leftovers of
+    the former django-db result backend. They are deleted in batches to
+    keep every statement short.
+    """
+    cutoff = timezone.now() - settings.CELERY_RESULT_EXPIRES
+    expired = TaskResult.objects.filter(date_done__lt=cutoff)
+    deleted = 0
+    while ids := list(expired.values_list("id", flat=True)[:PRUNE_BATCH_SIZE]):
+        deleted += TaskResult.objects.filter(id__in=ids).delete()[0]
+    return {"deleted": deleted}
@@ -0,0 +1,30 @@
+from unittest.mock import MagicMock
+
+from spotify_filter.spotify_import.records import SavedAlbum
+
+
+def mock_importer(**attributes):
+    """
+    Return a mock importer with the counters of the real importers. Its
+    retrieve_albums serves retrieve_albums.return_value, passed through the
+    `project` argument like the real importers do.
+    """
+    importer = MagicMock(
+        api_calls=0,
+        bytes_received=0,
+        failed_album_pages=0,
+        failed_track_pages=0,
+        **attributes,
+    )
+
+    def retrieve_albums(*_args, project=None, **_kwargs):
+        entries = importer.retrieve_albums.return_value
+        return list(entries) if project is None else [project(e) for e in entries]
+
+    importer.retrieve_albums.side_effect = retrieve_albums
+    return importer
+
+
+def saved_albums(entries):
+    """Return the SavedAlbum records of saved-album entries."""
+    return [SavedAlbum(entry) for entry in entries]
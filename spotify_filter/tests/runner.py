@@ -0,0 +1,22 @@
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+# alias of the second database the replica tests configure as the replica
+TEST_REPLICA = "test_replica"
+
+
+class ReplicaTestRunner(DiscoverRunner):
+    """
+    Test runner adding a second database with its own test database and
+    connection, so that the replica tests see which database served a query
+    on every backend.
+    """
+
+    def setup_databases(self, **kwargs):
+        default = connections.settings["default"]
+        connections.settings[TEST_REPLICA] = {
+            **default,
+            "NAME": f"{default['NAME']}_replica",
+            "TEST": {**default["TEST"], "NAME": None},
+        }
+        return super().setup_databases(**kwargs)
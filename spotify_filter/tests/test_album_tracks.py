@@ -0,0 +1,107 @@
+import copy
+import json
+from unittest.mock import MagicMock
+
+import spotipy
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from spotify_filter.models import Album, AlbumTrack
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.spotify_import.import_logic import (
+    TRACK_PAGE_SIZE,
+    complete_album_tracks,
+    import_from_spotify,
+)
+from spotify_filter.spotify_import.records import SavedAlbum
+from spotify_filter.tests.helpers import mock_importer
+
+
+class CompleteAlbumTracksTests(TestCase):
+    """Tests for fetching the track pages missing from saved-album entries."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            cls.two_albums = json.load(f)
+
+    def setUp(self):
+        self.albums = copy.deepcopy(self.two_albums)
+        self.tracks = self.albums[0]["album"]["tracks"]["items"]
+        # pretend the first album has more tracks than one page holds
+        self.albums[0]["album"]["tracks"]["items"] = self.tracks[:5]
+        self.album_id = self.albums[0]["album"]["id"]
+
+    def fake_pages(self, pages):
+        """Serve album track pages out of the complete listing."""
+        return [self.tracks[offset : offset + TRACK_PAGE_SIZE] for _, offset in pages]
+
+    def test_missing_pages_are_fetched_and_appended(self):
+        """Test that only truncated albums have their missing pages fetched."""
+        importer = mock_importer()
+        importer.retrieve_album_tracks.side_effect = self.fake_pages
+        albums = [SavedAlbum(entry) for entry in self.albums]
+        complete_album_tracks(importer, albums)
+        importer.retrieve_album_tracks.assert_called_once_with([(self.album_id, 5)])
+        self.assertEqual(
+            [track.id for track in albums[0].tracks],
+            [track["id"] for track in self.tracks],
+        )
+
+    def test_albums_with_failed_pages_are_not_imported(self):
+        """Test that an album missing track pages is not stored as complete."""
+        user = get_user_model().objects.create_user(username="testuser")
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.albums
+        importer.retrieve_artists_by_id.return_value = []
+
+        def failing_pages(pages):
+            importer.failed_track_pages = len(pages)
+            return [None for _ in pages]
+
+        importer.retrieve_album_tracks.side_effect = failing_pages
+        stats = import_from_spotify(user, importer=importer)
+        self.assertEqual(stats["albums_processed"], 1)
+        self.assertEqual(stats["albums_failed"], 1)
+        self.assertEqual(stats["track_pages_failed"], 1)
+        self.assertEqual(stats["timing"]["phases"]["fetch"]["failed_pages"], 1)
+        self.assertFalse(Album.objects.filter(spotify_id=self.album_id).exists())
+
+    def test_complete_albums_are_left_alone(self):
+        """Test that no request is made when every listing is complete."""
+        importer = mock_importer()
+        complete_album_tracks(importer, [SavedAlbum(a) for a in self.two_albums])
+        importer.retrieve_album_tracks.assert_not_called()
+
+    def test_import_writes_all_tracks(self):
+        """Test that the fetched tracks go through the normal track pipeline."""
+        user = get_user_model().objects.create_user(username="testuser")
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.albums
+        importer.retrieve_artists_by_id.return_value = []
+        importer.retrieve_album_tracks.side_effect = self.fake_pages
+        stats = import_from_spotify(user, importer=importer)
+        album = Album.objects.get(spotify_id=self.album_id)
+        self.assertEqual(stats["tracks_processed"], 25)
+        self.assertEqual(
+            AlbumTrack.objects.filter(album=album).count(), album.total_tracks
+        )
+
+    def test_spotify_importer_fetches_pages_in_order(self):
+        """Test that the spotipy importer keeps the order of the pages."""
+
+        def album_tracks(album_id, **kwargs):
+            if album_id == "broken":
+                raise spotipy.exceptions.SpotifyException(404, -1, "not found")
+            return {"items": [f"{album_id}-{kwargs['offset']}"]}
+
+        sp = MagicMock()
+        sp.album_tracks.side_effect = album_tracks
+        importer = SpotifyImporter(None, sp=sp)
+        pages = [("a", 50), ("broken", 50), ("a", 100), ("b", 50)]
+        self.assertEqual(
+            importer.retrieve_album_tracks(pages),
+            [["a-50"], None, ["a-100"], ["b-50"]],
+        )
+        self.assertEqual(importer.failed_track_pages, 1)
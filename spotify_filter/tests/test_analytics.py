@@ -0,0 +1,161 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from spotify_filter.analytics import LibraryAnalytics
+from spotify_filter.models import Album, AlbumTrack, Artist, Genre, Track
+
+
+class LibraryAnalyticsTests(TestCase):
+    """Tests for the vectorized library analytics."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+        other = get_user_model().objects.create_user(username="other")
+        rock = Genre.objects.create(name="rock")
+        indie = Genre.objects.create(name="indie")
+        jazz = Genre.objects.create(name="jazz")
+
+        self.artist1 = Artist.objects.create(user=self.user, spotify_id="a1", name="A1")
+        self.artist1.genres.add(rock, indie)
+        self.artist2 = Artist.objects.create(user=self.user, spotify_id="a2", name="A2")
+        self.artist2.genres.add(rock, indie, jazz)
+        self.artist3 = Artist.objects.create(user=self.user, spotify_id="a3", name="A3")
+        Artist.objects.create(user=other, spotify_id="o1", name="O1").genres.add(jazz)
+
+        album1 = Album.objects.create(
+            user=self.user,
+            spotify_id="al1",
+            title="One",
+            release_date="1994-05-01",
+            added_at=datetime(2024, 1, 15, tzinfo=timezone.utc),
+        )
+        album1.artists.add(self.artist1)
+        album2 = Album.objects.create(
+            user=self.user,
+            spotify_id="al2",
+            title="Two",
+            release_date="1996-01-01",
+            added_at=datetime(2024, 3, 2, tzinfo=timezone.utc),
+        )
+        album2.artists.add(self.artist1, self.artist2)
+        Album.objects.create(
+            user=other, spotify_id="al3", title="Three", release_date="1950-01-01"
+        )
+        for album, durations in [(album1, [1000, 2000]), (album2, [5000])]:
+            for i, duration in enumerate(durations):
+                track = Track.objects.create(
+                    spotify_id=f"{album.spotify_id}-t{i}",
+                    title=f"T{i}",
+                    duration_ms=duration,
+                )
+                AlbumTrack.objects.create(album=album, track=track, track_number=i)
+
+    def test_load_uses_bulk_queries(self):
+        """Test that loading the library doesn't depend on its size."""
+        with self.assertNumQueries(6):
+            analytics = LibraryAnalytics.load(self.user)
+        self.assertEqual(analytics.album_ids.size, 2)
+        self.assertEqual(analytics.artist_ids.size, 3)
+        self.assertEqual(analytics.track_duration_ms.size, 3)
+
+    def test_release_year_histogram(self):
+        """Test that release years are counted including empty years."""
+        years, counts = LibraryAnalytics.load(self.user).release_year_histogram()
+        self.assertEqual(years.tolist(), [1994, 1995, 1996])
+        self.assertEqual(counts.tolist(), [1, 0, 1])
+
+    def test_added_at_series(self):
+        """Test that saved albums are counted per month including empty months."""
+        months, counts = LibraryAnalytics.load(self.user).added_at_series(unit="M")
+        self.assertEqual([str(m) for m in months], ["2024-01", "2024-02", "2024-03"])
+        self.assertEqual(counts.tolist(), [1, 0, 1])
+
+    def test_artist_duration_totals(self):
+        """Test that each artist gets the duration of all their albums."""
+        analytics = LibraryAnalytics.load(self.user)
+        totals = dict(
+            zip(analytics.artist_ids.tolist(), analytics.artist_duration_totals())
+        )
+        self.assertEqual(totals[self.artist1.id], 8000)
+        self.assertEqual(totals[self.artist2.id], 5000)
+        self.assertEqual(totals[self.artist3.id], 0)
+        self.assertEqual(
+            analytics.top_artists_by_duration(), [("A1", 8000), ("A2", 5000)]
+        )
+
+    def test_genre_cooccurrence(self):
+        """Test that genre pairs are counted per artist."""
+        names, matrix = LibraryAnalytics.load(self.user).genre_cooccurrence()
+        index = {name: i for i, name in enumerate(names)}
+        self.assertEqual(matrix[index["rock"], index["indie"]], 2)
+        self.assertEqual(matrix[index["rock"], index["jazz"]], 1)
+        self.assertEqual(matrix[index["jazz"], index["jazz"]], 1)
+        np.testing.assert_array_equal(matrix, matrix.T)
+
+    def test_genre_cooccurrence_limits_genres(self):
+        """Test that only the most common genres are kept."""
+        names, matrix = LibraryAnalytics.load(self.user).genre_cooccurrence(
+            max_genres=2
+        )
+        self.assertEqual(sorted(names), ["indie", "rock"])
+        self.assertEqual(matrix.shape, (2, 2))
+
+    def test_top_genre_pairs(self):
+        """Test that the most shared genre pairs come first."""
+        pairs = LibraryAnalytics.load(self.user).top_genre_pairs()
+        self.assertEqual(sorted(pairs[0][:2]), ["indie", "rock"])
+        self.assertEqual(pairs[0][2], 2)
+        self.assertEqual(len(pairs), 3)
+
+    def test_links_to_missing_rows_are_dropped(self):
+        """Test that links to ids outside the snapshot are left out."""
+        added_at = datetime(2024, 1, 15, tzinfo=timezone.utc)
+        analytics = LibraryAnalytics(
+            albums=[(10, "1994-05-01", added_at), (20, "1996-01-01", added_at)],
+            artists=[(1, "A1"), (3, "A3")],
+            genres=[(5, "rock")],
+            # albums 5, 15 and 25 sort before, between and after the library
+            album_tracks=[(10, 1000), (5, 2000), (15, 3000), (20, 4000), (25, 8000)],
+            album_artists=[(10, 1), (20, 2), (25, 3), (20, 3)],
+            genre_links=[(1, 5), (1, 6), (4, 5)],
+        )
+        self.assertEqual(analytics.track_album.tolist(), [0, 1])
+        self.assertEqual(analytics.track_duration_ms.tolist(), [1000, 4000])
+        self.assertEqual(analytics.album_artist_album.tolist(), [0, 1])
+        self.assertEqual(analytics.album_artist_artist.tolist(), [0, 1])
+        self.assertEqual(analytics.artist_genre_artist.tolist(), [0])
+        self.assertEqual(analytics.artist_genre_genre.tolist(), [0])
+        self.assertEqual(
+            analytics.top_artists_by_duration(), [("A3", 4000), ("A1", 1000)]
+        )
+
+    def test_empty_library(self):
+        """Test that an empty library produces empty results."""
+        user = get_user_model().objects.create_user(username="empty")
+        analytics = LibraryAnalytics.load(user)
+        self.assertEqual(analytics.release_year_histogram()[1].size, 0)
+        self.assertEqual(analytics.added_at_series()[1].size, 0)
+        self.assertEqual(analytics.top_artists_by_duration(), [])
+        self.assertEqual(analytics.top_genre_pairs(), [])
+
+    def test_stats_view(self):
+        """Test that the statistics page renders the computed figures."""
+        self.client.login(username="testuser", password="testpass")
+        response = self.client.get(reverse("spotify_filter:stats"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "spotify_filter/stats.html")
+        self.assertEqual(
+            [year["count"] for year in response.context["release_years"]], [1, 0, 1]
+        )
+        self.assertContains(response, "A1: 0 min")
+
+    def test_stats_view_requires_login(self):
+        """Test that the statistics page requires authentication."""
+        response = self.client.get(reverse("spotify_filter:stats"))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,180 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import httpx
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from spotify_filter.models import Album, Artist, SpotifyToken
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.spotify_import.async_api import AsyncSpotifyImporter
+from spotify_filter.spotify_import.import_logic import (
+    get_importer,
+    import_from_spotify,
+)
+
+NEWEST = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def saved_album(i):
+    """Return a saved-album entry, saved one day before the previous one."""
+    added_at = NEWEST - timedelta(days=i)
+    return {
+        "added_at": added_at.isoformat().replace("+00:00", "Z"),
+        "album": {"id": f"album{i}"},
+    }
+
+
+class FakeSpotifyApi:
+    """Mock transport handler serving a library of saved albums and artists."""
+
+    def __init__(self, albums=(), artists=(), failures=None):
+        self.albums = list(albums)
+        self.artists = {artist["id"]: artist for artist in artists}
+        # path -> list of status codes returned before the real response
+        self.failures = failures or {}
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            failures = self.failures.get(request.url.path)
+            if failures:
+                return httpx.Response(failures.pop(0), headers={"Retry-After": "0"})
+            if request.url.path == "/v1/me/albums":
+                offset = int(request.url.params["offset"])
+                limit = int(request.url.params["limit"])
+                return httpx.Response(
+                    200,
+                    json={
+                        "items": self.albums[offset : offset + limit],
+                        "total": len(self.albums),
+                    },
+                )
+            if request.url.path.startswith("/v1/albums/"):
+                album_id = request.url.path.split("/")[3]
+                offset = int(request.url.params["offset"])
+                return httpx.Response(200, json={"items": [f"{album_id}-{offset}"]})
+            ids = request.url.params["ids"].split(",")
+            return httpx.Response(
+                200, json={"artists": [self.artists.get(i) for i in ids]}
+            )
+        finally:
+            self.in_flight -= 1
+
+    def importer(self, **kwargs):
+        """Return an importer reading from this fake API."""
+        kwargs.setdefault("retry_delay", 0)
+        return AsyncSpotifyImporter(
+            None, access_token="token", transport=httpx.MockTransport(self), **kwargs
+        )
+
+
+class AsyncSpotifyImporterTests(TestCase):
+    """Tests for the asyncio Spotify importer."""
+
+    def test_retrieve_albums_fetches_pages_concurrently(self):
+        """Test that all pages are read, in order, with bounded concurrency."""
+        api = FakeSpotifyApi(albums=[saved_album(i) for i in range(230)])
+        albums = api.importer(max_concurrency=3).retrieve_albums(limit=20)
+        self.assertEqual(albums, api.albums)
+        self.assertEqual(len(api.requests), 12)
+        self.assertEqual(api.max_in_flight, 3)
+        self.assertEqual(api.requests[0].headers["Authorization"], "Bearer token")
+
+    def test_retrieve_albums_respects_max_len_and_offset(self):
+        """Test that max_len and offset select a slice of the library."""
+        api = FakeSpotifyApi(albums=[saved_album(i) for i in range(100)])
+        albums = api.importer().retrieve_albums(max_len=45, offset=10, limit=20)
+        self.assertEqual(albums, api.albums[10:55])
+
+    def test_retrieve_albums_stops_at_older_albums(self):
+        """Test that a delta read stops after the wave reaching older albums."""
+        api = FakeSpotifyApi(albums=[saved_album(i) for i in range(1000)])
+        albums = api.importer(max_concurrency=4).retrieve_albums(
+            limit=10, added_after=NEWEST - timedelta(days=25, hours=12)
+        )
+        self.assertEqual(albums, api.albums[:26])
+        self.assertEqual(len(api.requests), 5)
+
+    def test_retrieve_artists_keeps_order_and_marks_failures(self):
+        """Test that artists come back in order, with None for failed batches."""
+        artists = [{"id": f"artist{i}", "genres": []} for i in range(5)]
+        api = FakeSpotifyApi(artists=artists, failures={"/v1/artists": [404]})
+        importer = api.importer(max_concurrency=1)
+        result = importer.retrieve_artists_by_id([a["id"] for a in artists], limit=2)
+        self.assertEqual(result, [None, None] + artists[2:])
+
+    def test_retrieve_album_tracks_fetches_pages_concurrently(self):
+        """Test that album track pages are fetched at once and kept in order."""
+        api = FakeSpotifyApi(failures={"/v1/albums/broken/tracks": [404]})
+        pages = [("a", 50), ("broken", 50), ("a", 100), ("b", 50)]
+        importer = api.importer()
+        self.assertEqual(
+            importer.retrieve_album_tracks(pages),
+            [["a-50"], None, ["a-100"], ["b-50"]],
+        )
+        self.assertEqual(importer.failed_track_pages, 1)
+        self.assertEqual(api.max_in_flight, 4)
+
+    def test_rate_limits_and_server_errors_are_retried(self):
+        """Test that 429 and 5xx responses are retried until they succeed."""
+        api = FakeSpotifyApi(
+            albums=[saved_album(i) for i in range(5)],
+            failures={"/v1/me/albums": [429, 503]},
+        )
+        self.assertEqual(api.importer().retrieve_albums(), api.albums)
+        self.assertEqual(len(api.requests), 3)
+
+    def test_pages_are_skipped_after_max_retries(self):
+        """Test that a request failing on every attempt is given up."""
+        api = FakeSpotifyApi(
+            albums=[saved_album(i) for i in range(5)],
+            failures={"/v1/me/albums": [500, 500]},
+        )
+        self.assertEqual(api.importer(max_retries=2).retrieve_albums(), [])
+
+
+class AsyncImportTests(TestCase):
+    """Tests for importing a library with the asyncio importer."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+
+    def test_import_from_spotify_with_async_importer(self):
+        """Test that the async importer plugs into the import pipeline."""
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            albums = json.load(f)
+        with open(
+            "spotify_filter/tests/data/artists2.json", "r", encoding="utf-8"
+        ) as f:
+            artists = json.load(f)
+        importer = FakeSpotifyApi(albums=albums, artists=artists).importer()
+        stats = import_from_spotify(self.user, importer=importer)
+        self.assertEqual(stats["albums_processed"], 2)
+        self.assertEqual(stats["artists_updated"], 2)
+        self.assertEqual(Album.objects.for_user(self.user).count(), 2)
+        self.assertTrue(Artist.objects.filter(genres__isnull=False).exists())
+
+    def test_get_importer(self):
+        """Test that the setting selects the importer."""
+        SpotifyToken.objects.create(
+            user=self.user,
+            access_token="stored",
+            refresh_token="refresh",
+            expires_at=SpotifyToken.compute_expiration(3600),
+        )
+        with override_settings(SPOTIFY_IMPORTER="async"):
+            importer = get_importer(self.user)
+        self.assertIsInstance(importer, AsyncSpotifyImporter)
+        self.assertEqual(importer.access_token, "stored")
+        self.assertIsInstance(get_importer(self.user, "spotipy"), SpotifyImporter)
+        with self.assertRaises(ValueError):
+            get_importer(self.user, "grpc")
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE = [("spotify_filter", "0014_library_membership")]
+AFTER = [("spotify_filter", "0016_shared_catalog")]
+
+# historical models are named like the classes they stand for
+# pylint: disable=invalid-name,too-many-locals
+
+
+class MergeCatalogMigrationTests(TransactionTestCase):
+    """Tests for merging per-user albums and artists into the shared catalog."""
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(BEFORE)
+        apps = executor.loader.project_state(BEFORE).apps
+        User = apps.get_model("auth", "User")
+        Album = apps.get_model("spotify_filter", "Album")
+        Artist = apps.get_model("spotify_filter", "Artist")
+        Genre = apps.get_model("spotify_filter", "Genre")
+        Track = apps.get_model("spotify_filter", "Track")
+        AlbumTrack = apps.get_model("spotify_filter", "AlbumTrack")
+        ArtistSimilarity = apps.get_model("spotify_filter", "ArtistSimilarity")
+
+        self.user1 = User.objects.create(username="user1")
+        self.user2 = User.objects.create(username="user2")
+        rock = Genre.objects.create(name="rock")
+        jazz = Genre.objects.create(name="jazz")
+        track = Track.objects.create(spotify_id="t1", title="T1")
+        for user, added_at in [(self.user1, 2024), (self.user2, 2025)]:
+            artist = Artist.objects.create(user=user, spotify_id="ar1", name="A")
+            other = Artist.objects.create(user=user, spotify_id="ar2", name="B")
+            artist.genres.add(rock)
+            other.genres.add(rock)
+            album = Album.objects.create(
+                user=user,
+                spotify_id="al1",
+                title="Album",
+                added_at=datetime(added_at, 1, 1, tzinfo=timezone.utc),
+            )
+            album.artists.add(artist)
+            AlbumTrack.objects.create(album=album, track=track, track_number=1)
+            ArtistSimilarity.objects.create(artist=artist, similar=other, score=1.0)
+        Artist.objects.get(user=self.user2, spotify_id="ar1").genres.add(jazz)
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(
+            MigrationExecutor(connection).loader.graph.leaf_nodes()
+        )
+
+    def test_duplicates_are_merged_into_memberships(self):
+        """Test that every user keeps their library on one catalog entry."""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(AFTER)
+        apps = executor.loader.project_state(AFTER).apps
+        Album = apps.get_model("spotify_filter", "Album")
+        Artist = apps.get_model("spotify_filter", "Artist")
+        AlbumTrack = apps.get_model("spotify_filter", "AlbumTrack")
+        ArtistSimilarity = apps.get_model("spotify_filter", "ArtistSimilarity")
+        LibraryAlbum = apps.get_model("spotify_filter", "LibraryAlbum")
+        LibraryArtist = apps.get_model("spotify_filter", "LibraryArtist")
+
+        album = Album.objects.get()
+        artist = Artist.objects.get(spotify_id="ar1")
+        self.assertEqual(Artist.objects.count(), 2)
+        self.assertEqual(
+            sorted(LibraryAlbum.objects.values_list("user_id", "album_id", "added_at")),
+            [
+                (self.user1.pk, album.pk, datetime(2024, 1, 1, tzinfo=timezone.utc)),
+                (self.user2.pk, album.pk, datetime(2025, 1, 1, tzinfo=timezone.utc)),
+            ],
+        )
+        self.assertEqual(LibraryArtist.objects.filter(artist=artist).count(), 2)
+        self.assertEqual(list(album.artists.all()), [artist])
+        self.assertEqual(AlbumTrack.objects.get().album_id, album.pk)
+        self.assertEqual(
+            sorted(artist.genres.values_list("name", flat=True)), ["jazz", "rock"]
+        )
+        self.assertEqual(
+            sorted(
+                ArtistSimilarity.objects.values_list(
+                    "user_id", "artist__spotify_id", "similar__spotify_id"
+                )
+            ),
+            [(self.user1.pk, "ar1", "ar2"), (self.user2.pk, "ar1", "ar2")],
+        )
@@ -0,0 +1,154 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from spotify_filter.models import Album, Artist, CatalogState, LibraryState
+from spotify_filter.spotify_import.import_logic import import_from_spotify
+from spotify_filter.tests.helpers import mock_importer
+
+
+class LibraryStateModelTests(TestCase):
+    """Tests for the LibraryState model."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+
+    def test_last_modified_is_none_before_import(self):
+        """Test that a user who never imported has no last-modified time."""
+        self.assertIsNone(LibraryState.last_modified_for(self.user))
+
+    def test_touch_updates_last_modified(self):
+        """Test that touch() creates and then moves the last-modified time."""
+        first = LibraryState.touch(self.user).last_modified
+        second = LibraryState.touch(self.user).last_modified
+        self.assertGreaterEqual(second, first)
+        self.assertEqual(LibraryState.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(LibraryState.last_modified_for(self.user), second)
+
+    def test_import_touches_library_state(self):
+        """Test that import_from_spotify marks the library as modified."""
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = []
+        importer.retrieve_artists_by_id.return_value = []
+        import_from_spotify(self.user, importer=importer)
+        self.assertIsNotNone(LibraryState.last_modified_for(self.user))
+
+
+class ConditionalGetTests(TestCase):
+    """Tests for ETag/Last-Modified handling on the library pages."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+        self.client.login(username="testuser", password="testpass")
+        self.artist = Artist.objects.create(
+            user=self.user, spotify_id="a1", name="Artist One"
+        )
+        self.album = Album.objects.create(
+            user=self.user, spotify_id="al1", title="Album One"
+        )
+        self.urls = [
+            reverse("spotify_filter:dashboard"),
+            reverse("spotify_filter:dashboard") + "?view=albums",
+            reverse("spotify_filter:artist_detail", args=(self.artist.id,)),
+            reverse("spotify_filter:album_detail", args=(self.album.id,)),
+        ]
+
+    def test_no_validators_before_first_import(self):
+        """Test that pages render without validators if nothing was imported."""
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header("ETag"))
+
+    def test_validators_are_set(self):
+        """Test that ETag, Last-Modified and private caching are set."""
+        state = LibraryState.touch(self.user)
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header("ETag"))
+            self.assertEqual(
+                response["Last-Modified"],
+                http_date(state.last_modified.timestamp()),
+            )
+            self.assertIn("private", response["Cache-Control"])
+
+    def test_matching_etag_returns_not_modified(self):
+        """Test that a matching If-None-Match gets a 304 without rendering."""
+        LibraryState.touch(self.user)
+        # the first page view hands out the CSRF cookie that is part of the ETag
+        self.client.get(self.urls[0])
+        for url in self.urls:
+            etag = self.client.get(url)["ETag"]
+            # session, user, library and catalog state - no ORM work for the
+            # page itself
+            with self.assertNumQueries(3):
+                response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+
+    def test_if_modified_since_returns_not_modified(self):
+        """Test that an up-to-date If-Modified-Since gets a 304."""
+        LibraryState.touch(self.user)
+        for url in self.urls:
+            last_modified = self.client.get(url)["Last-Modified"]
+            response = self.client.get(
+                url, headers={"if-modified-since": last_modified}
+            )
+            self.assertEqual(response.status_code, 304)
+
+    def test_import_invalidates_etag(self):
+        """Test that touching the library after an import changes the ETag."""
+        LibraryState.objects.create(
+            user=self.user, last_modified=timezone.now() - timedelta(hours=1)
+        )
+        url = self.urls[0]
+        etag = self.client.get(url)["ETag"]
+        LibraryState.touch(self.user)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_other_users_import_invalidates_etag(self):
+        """Test that catalog changes by another user's import change the ETag."""
+        LibraryState.objects.create(
+            user=self.user, last_modified=timezone.now() - timedelta(hours=1)
+        )
+        url = self.urls[0]
+        etag = self.client.get(url)["ETag"]
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            albums = json.load(f)
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = albums
+        importer.retrieve_artists_by_id.return_value = []
+        other = get_user_model().objects.create_user(username="other")
+        import_from_spotify(other, importer=importer, enrich=False)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(
+            response["Last-Modified"],
+            http_date(CatalogState.objects.get().last_modified.timestamp()),
+        )
+
+    def test_etag_differs_between_users(self):
+        """Test that users with the same library version get different ETags."""
+        other = get_user_model().objects.create_user(
+            username="other", password="otherpass"
+        )
+        now = timezone.now()
+        LibraryState.objects.create(user=self.user, last_modified=now)
+        LibraryState.objects.create(user=other, last_modified=now)
+        url = reverse("spotify_filter:dashboard")
+        etag = self.client.get(url)["ETag"]
+
+        self.client.login(username="other", password="otherpass")
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from spotify_filter.models import Album, AlbumTrack, Artist, Track
+
+
+class ExportLibraryTests(TestCase):
+    """Tests for the streaming library export."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+        self.client.login(username="testuser", password="testpass")
+        artist = Artist.objects.create(user=self.user, spotify_id="a1", name="Artist")
+        for i in range(5):
+            album = Album.objects.create(
+                user=self.user,
+                spotify_id=f"al{i}",
+                title=f"Album {i}",
+                release_date="2020-01-01",
+                total_tracks=2,
+            )
+            album.artists.add(artist)
+            for j in range(2):
+                track = Track.objects.create(
+                    spotify_id=f"t{i}-{j}", title=f"Track {j}", duration_ms=1000
+                )
+                AlbumTrack.objects.create(album=album, track=track, track_number=j + 1)
+        other = get_user_model().objects.create_user(username="other")
+        Album.objects.create(user=other, spotify_id="x", title="Not Mine")
+
+    def get_content(self, export_format):
+        """Request the export and return the response and its decoded body."""
+        response = self.client.get(
+            reverse("spotify_filter:export", args=[export_format])
+        )
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """Test that the CSV export has a header and one row per album."""
+        response, content = self.get_content("csv")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("spotify_library.csv", response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["title"], "Album 0")
+        self.assertEqual(rows[0]["artists"], "Artist")
+        self.assertNotIn("Not Mine", content)
+
+    def test_ndjson_export(self):
+        """Test that the NDJSON export has one album object with tracks per line."""
+        response, content = self.get_content("ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(
+            records[0]["artists"], [{"spotify_id": "a1", "name": "Artist"}]
+        )
+        self.assertEqual(
+            [track["title"] for track in records[0]["tracks"]], ["Track 0", "Track 1"]
+        )
+
+    def test_queries_grow_with_chunks_not_albums(self):
+        """Test that related objects are loaded once per chunk."""
+        url = reverse("spotify_filter:export", args=["ndjson"])
+        with patch("spotify_filter.views.EXPORT_CHUNK_SIZE", 2):
+            # session, user, albums cursor, then artists and tracks per chunk
+            with self.assertNumQueries(3 + 2 * 3):
+                response = self.client.get(url)
+                lines = list(response.streaming_content)
+        self.assertEqual(len(lines), 5)
+
+    def test_unknown_format(self):
+        """Test that unknown export formats return 404."""
+        response = self.client.get(reverse("spotify_filter:export", args=["xml"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_requires_login(self):
+        """Test that the export requires authentication."""
+        self.client.logout()
+        response = self.client.get(reverse("spotify_filter:export", args=["csv"]))
+        self.assertEqual(response.status_code, 302)
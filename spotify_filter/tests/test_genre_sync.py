@@ -0,0 +1,118 @@
+from unittest.mock import MagicMock
+
+import spotipy
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from spotify_filter.models import Artist, Genre, LibraryArtist
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.spotify_import.import_logic import (
+    GenreCache,
+    _new_stats,
+    update_artists,
+)
+from spotify_filter.tests.helpers import mock_importer
+
+
+class GenreSyncTests(TestCase):
+    """Tests for synchronising the artist genres with the source."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+
+    def create_artists(self, count):
+        """Create artists in the user's library."""
+        artists = [
+            Artist.objects.create(spotify_id=f"artist{i}", name=f"Artist {i}")
+            for i in range(count)
+        ]
+        for artist in artists:
+            LibraryArtist.objects.create(user=self.user, artist=artist)
+        return artists
+
+    def update(self, genres_by_artist):
+        """Update the artists from source data with the given genres."""
+        importer = mock_importer(user=self.user)
+        importer.retrieve_artists_by_id.side_effect = lambda ids: [
+            {"id": sp_id, "genres": genres_by_artist[sp_id], "images": []}
+            for sp_id in ids
+        ]
+        stats = _new_stats()
+        return update_artists(importer, stats), stats
+
+    def genres(self, artist):
+        """Return the genre names of the artist."""
+        return set(artist.genres.values_list("name", flat=True))
+
+    def test_genres_follow_the_source(self):
+        """Test that added genres are linked and dropped genres unlinked."""
+        kept, dropped, unchanged = self.create_artists(3)
+        kept.genres.add(Genre.objects.create(name="rock"))
+        dropped.genres.add(Genre.objects.get(name="rock"))
+        unchanged.genres.add(Genre.objects.create(name="jazz"))
+        changed, stats = self.update(
+            {"artist0": ["rock", "shoegaze"], "artist1": [], "artist2": ["jazz"]}
+        )
+        self.assertEqual(self.genres(kept), {"rock", "shoegaze"})
+        self.assertEqual(self.genres(dropped), set())
+        self.assertEqual(self.genres(unchanged), {"jazz"})
+        self.assertEqual(changed, {kept.id, dropped.id})
+        self.assertEqual(stats["artists_updated"], 3)
+
+    def test_queries_do_not_grow_with_artists(self):
+        """Test that the number of queries doesn't depend on the artists."""
+
+        def queries(count):
+            Artist.objects.all().delete()
+            genres = {
+                artist.spotify_id: [f"genre {artist.id}", "shared"]
+                for artist in self.create_artists(count)
+            }
+            with CaptureQueriesContext(connection) as context:
+                self.update(genres)
+            return len(context)
+
+        self.assertEqual(queries(2), queries(20))
+
+    def test_genre_cache_creates_missing_genres(self):
+        """Test that the cache creates the unknown genres and remembers ids."""
+        rock = Genre.objects.create(name="rock")
+        cache = GenreCache()
+        with self.assertNumQueries(3):
+            ids = cache.resolve({"rock", "jazz", "folk"})
+        self.assertEqual(ids["rock"], rock.id)
+        self.assertEqual(Genre.objects.get(name="jazz").id, ids["jazz"])
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.resolve({"folk"}), {"folk": ids["folk"]})
+
+    def test_failed_batch_leaves_its_artists_alone(self):
+        """Test that the artists after a failed batch keep getting their data."""
+        artists = self.create_artists(150)
+        for artist in artists:
+            artist.genres.add(Genre.objects.get_or_create(name=artist.spotify_id)[0])
+
+        failed = []
+
+        def fetch_artists(ids):
+            if not failed and len(ids) == 50 and "artist0" not in ids:
+                failed.extend(ids)
+                raise spotipy.exceptions.SpotifyException(500, -1, "server error")
+            return {
+                "artists": [
+                    {"id": sp_id, "genres": [sp_id, "new"], "images": []}
+                    for sp_id in ids
+                ]
+            }
+
+        sp = MagicMock()
+        sp.artists.side_effect = fetch_artists
+        stats = _new_stats()
+        update_artists(SpotifyImporter(self.user, sp=sp), stats)
+        self.assertEqual(stats["artists_updated"], 100)
+        for artist in artists:
+            expected = {artist.spotify_id}
+            if artist.spotify_id not in failed:
+                expected.add("new")
+            self.assertEqual(self.genres(artist), expected)
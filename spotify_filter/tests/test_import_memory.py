@@ -0,0 +1,61 @@
+import json
+import re
+from io import StringIO
+from unittest.mock import MagicMock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.spotify_import.records import SavedAlbum, TrackRecord
+
+
+class SavedAlbumRecordTests(SimpleTestCase):
+    """Tests for the compact records of saved-album entries."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            cls.two_albums = json.load(f)
+
+    def test_projection_keeps_the_imported_fields(self):
+        """Test that the record holds what the import reads and no more."""
+        entry = self.two_albums[0]
+        album = SavedAlbum(entry)
+        self.assertEqual(album.id, entry["album"]["id"])
+        self.assertEqual(album.added_at, entry["added_at"])
+        self.assertEqual(album.image_urls[0], entry["album"]["images"][0]["url"])
+        self.assertEqual(album.artists[0].name, entry["album"]["artists"][0]["name"])
+        self.assertEqual(len(album.tracks), len(entry["album"]["tracks"]["items"]))
+        self.assertFalse(hasattr(album, "__dict__"))
+        self.assertFalse(hasattr(album.tracks[0], "available_markets"))
+
+    def test_missing_fields_are_none(self):
+        """Test that malformed entries are projected without failing."""
+        album = SavedAlbum({"album": {"id": "123"}})
+        self.assertIsNone(album.name)
+        self.assertIsNone(album.tracks)
+        self.assertIsNone(TrackRecord({}).id)
+
+    def test_spotify_importer_projects_pages(self):
+        """Test that the importer projects the entries of every page."""
+        sp = MagicMock()
+        sp.current_user_saved_albums.return_value = {
+            "items": self.two_albums,
+            "next": None,
+        }
+        importer = SpotifyImporter(None, sp=sp)
+        albums = importer.retrieve_albums(project=SavedAlbum)
+        self.assertEqual(
+            [album.id for album in albums],
+            [entry["album"]["id"] for entry in self.two_albums],
+        )
+        self.assertIsInstance(albums[0], SavedAlbum)
+
+    def test_benchmark_shows_reduction(self):
+        """Test that the records take an order of magnitude less memory."""
+        out = StringIO()
+        call_command("benchmark_import_memory", "--albums", "50", stdout=out)
+        reduction = re.search(r"reduction: ([\d.]+)x", out.getvalue())
+        self.assertGreater(float(reduction.group(1)), 10)
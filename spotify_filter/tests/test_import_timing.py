@@ -0,0 +1,94 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from spotify_filter.models import ImportRun
+from spotify_filter.spotify_import.import_logic import (
+    enrich_from_spotify,
+    import_from_spotify,
+)
+from spotify_filter.spotify_import.timing import PHASES, ImportTimer
+from spotify_filter.tests.helpers import mock_importer
+from spotify_filter.tests.test_async_importer import FakeSpotifyApi
+
+
+class ImportTimingTests(TestCase):
+    """Tests for the per-phase timing breakdown of imports."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            cls.two_albums = json.load(f)
+        with open(
+            "spotify_filter/tests/data/artists2.json", "r", encoding="utf-8"
+        ) as f:
+            cls.two_artists = json.load(f)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+
+    def test_phases_are_measured(self):
+        """Test that every phase reports its rows and queries."""
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.two_albums
+        importer.retrieve_artists_by_id.return_value = self.two_artists
+        stats = import_from_spotify(self.user, importer=importer)
+        phases = stats["timing"]["phases"]
+        self.assertEqual(list(phases), PHASES)
+        self.assertEqual(phases["fetch"]["rows"], 2)
+        self.assertEqual(phases["parse"]["rows"], 2)
+        self.assertEqual(phases["write"]["rows"], 2)
+        self.assertEqual(phases["enrich"]["rows"], 2)
+        self.assertEqual(phases["fetch"]["queries"], 0)
+        self.assertGreater(phases["write"]["queries"], 0)
+        self.assertGreater(phases["finalize"]["queries"], 0)
+        self.assertGreaterEqual(
+            stats["timing"]["wall_time"],
+            sum(phase["wall_time"] for phase in phases.values()) - 1e-3,
+        )
+
+    def test_import_run_is_recorded(self):
+        """Test that imports and enrichments are kept in the run history."""
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.two_albums
+        importer.retrieve_artists_by_id.return_value = self.two_artists
+        stats = import_from_spotify(self.user, importer=importer, enrich=False)
+        enrich_from_spotify(self.user, importer=importer)
+        enrichment, full = self.user.import_runs.all()
+        self.assertEqual(full.kind, "full")
+        self.assertEqual(full.albums_processed, 2)
+        self.assertEqual(full.wall_time, stats["timing"]["wall_time"])
+        self.assertEqual(full.stats, stats)
+        self.assertEqual(enrichment.kind, "enrich")
+        self.assertEqual(list(enrichment.stats["timing"]["phases"]), PHASES[4:])
+
+    def test_imports_without_user_are_not_recorded(self):
+        """Test that anonymous imports, e.g. in tests, keep no history."""
+        importer = mock_importer()
+        importer.user = None
+        importer.retrieve_albums.return_value = []
+        import_from_spotify(importer=importer)
+        self.assertFalse(ImportRun.objects.exists())
+
+    def test_api_traffic_is_attributed_to_phases(self):
+        """Test that the importer's API counters end up in their phase."""
+        api = FakeSpotifyApi(albums=self.two_albums, artists=self.two_artists)
+        stats = import_from_spotify(self.user, importer=api.importer())
+        phases = stats["timing"]["phases"]
+        self.assertEqual(phases["fetch"]["api_calls"], 1)
+        self.assertEqual(phases["enrich"]["api_calls"], 1)
+        self.assertEqual(phases["write"]["api_calls"], 0)
+        self.assertGreater(phases["fetch"]["bytes_received"], 0)
+        self.assertEqual(
+            sum(phase["api_calls"] for phase in phases.values()), len(api.requests)
+        )
+
+    def test_iterate_times_lazy_sources(self):
+        """Test that producing the items of a generator counts as its phase."""
+        timer = ImportTimer()
+        with timer:
+            items = list(timer.iterate("fetch", iter(range(3))))
+        self.assertEqual(items, [0, 1, 2])
+        self.assertEqual(timer.as_stats()["phases"]["fetch"]["rows"], 3)
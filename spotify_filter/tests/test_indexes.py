@@ -0,0 +1,67 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from spotify_filter.models import Album, LibraryAlbum
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN ANALYZE requires PostgreSQL")
+class DashboardBenchmarkTests(TestCase):
+    """Tests for the dashboard index benchmark."""
+
+    def test_benchmark_reports_plans_and_rolls_back(self):
+        """Test that every sort is measured twice and no data is left behind."""
+        out = StringIO()
+        call_command(
+            "benchmark_dashboard",
+            "--albums",
+            "200",
+            "--repeat",
+            "1",
+            "--yes",
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn("albums by -added_at", output)
+        self.assertIn("artists by name", output)
+        self.assertIn("full library (200 albums)", output)
+        self.assertIn("partial library (20 albums)", output)
+        self.assertEqual(output.count("albums by title"), 2)
+        self.assertEqual(output.count("indexed plan:"), output.count("plain plan:"))
+        self.assertFalse(Album.objects.exists())
+        self.assertFalse(LibraryAlbum.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_benchmark_rejects_invalid_share(self):
+        """Test that the slices must be a fraction of the catalog."""
+        with self.assertRaisesMessage(CommandError, "--share"):
+            call_command(
+                "benchmark_dashboard", "--share", "0", "--yes", stdout=StringIO()
+            )
+
+    def test_benchmark_needs_confirmation(self):
+        """Test that the benchmark refuses to touch a database unconfirmed."""
+        with self.assertRaisesMessage(CommandError, "scratch database"):
+            call_command("benchmark_dashboard", "--albums", "10", stdout=StringIO())
+        self.assertFalse(Album.objects.exists())
+
+    def test_indexes_survive_the_benchmark(self):
+        """Test that the dropped indexes come back with the rollback."""
+        call_command(
+            "benchmark_dashboard",
+            "--albums",
+            "10",
+            "--repeat",
+            "1",
+            "--yes",
+            stdout=StringIO(),
+        )
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Album._meta.db_table
+            )
+        self.assertIn("album_title_idx", constraints)
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from unittest.mock import MagicMock
+
+import spotipy
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.test import TestCase
+
+from spotify_filter.models import (
+    Album,
+    Artist,
+    ArtistSimilarity,
+    LibraryAlbum,
+    LibraryArtist,
+)
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.spotify_import.import_logic import import_from_spotify
+from spotify_filter.tests.helpers import mock_importer
+
+
+def load_json(name):
+    """Return the content of a JSON file of the test data."""
+    with open(f"spotify_filter/tests/data/{name}", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class LibraryReconciliationTests(TestCase):
+    """Tests for removing the albums no longer saved after a full import."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+        self.albums = load_json("albums2.json")
+        self.artists = load_json("artists2.json")
+        self.import_albums(self.albums)
+        self.kept, self.removed = [entry["album"] for entry in self.albums]
+
+    def import_albums(self, albums, **kwargs):
+        """Import the saved albums for the user and return the statistics."""
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = albums
+        importer.retrieve_artists_by_id.side_effect = lambda ids: [
+            artist for artist in self.artists if artist["id"] in ids
+        ]
+        for name, value in kwargs.items():
+            setattr(importer, name, value)
+        return import_from_spotify(self.user, importer=importer)
+
+    def library(self):
+        """Return the Spotify ids of the user's albums and artists."""
+        return (
+            set(Album.objects.for_user(self.user).values_list("spotify_id", flat=True)),
+            set(
+                Artist.objects.for_user(self.user).values_list("spotify_id", flat=True)
+            ),
+        )
+
+    def test_full_import_removes_unsaved_albums(self):
+        """Test that albums and artists no longer saved leave the library."""
+        removed_artist = Artist.objects.get(spotify_id=self.removed["artists"][0]["id"])
+        stats = self.import_albums(self.albums[:1])
+        self.assertEqual(stats["albums_removed"], 1)
+        self.assertEqual(stats["artists_removed"], 1)
+        self.assertEqual(
+            self.library(), ({self.kept["id"]}, {self.kept["artists"][0]["id"]})
+        )
+        self.assertGreater(stats["timing"]["phases"]["reconcile"]["queries"], 0)
+        self.assertFalse(
+            ArtistSimilarity.objects.filter(
+                Q(artist=removed_artist) | Q(similar=removed_artist)
+            ).exists()
+        )
+        # the shared catalog keeps the album for other libraries
+        self.assertTrue(Album.objects.filter(spotify_id=self.removed["id"]).exists())
+
+    def test_other_libraries_are_untouched(self):
+        """Test that reconciling a library keeps the other users' albums."""
+        other = get_user_model().objects.create_user(username="other")
+        for membership in LibraryAlbum.objects.filter(user=self.user):
+            LibraryAlbum.objects.create(user=other, album_id=membership.album_id)
+        self.import_albums([])
+        self.assertEqual(self.library(), (set(), set()))
+        self.assertEqual(LibraryAlbum.objects.filter(user=other).count(), 2)
+        self.assertFalse(LibraryArtist.objects.filter(user=self.user).exists())
+
+    def test_partial_imports_remove_nothing(self):
+        """Test that delta syncs and imports with failed pages keep albums."""
+        before = self.library()
+        self.import_albums([], failed_album_pages=1)
+        self.assertEqual(self.library(), before)
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = []
+        stats = import_from_spotify(
+            self.user,
+            importer=importer,
+            since=datetime(2025, 12, 1, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(self.library(), before)
+        self.assertNotIn("reconcile", stats["timing"]["phases"])
+
+    def test_failed_first_page_removes_nothing(self):
+        """Test that an import whose first page fails keeps the library."""
+        before = self.library()
+        sp = MagicMock()
+        sp.current_user_saved_albums.side_effect = spotipy.exceptions.SpotifyException(
+            500, -1, "server error"
+        )
+        importer = SpotifyImporter(self.user, sp=sp)
+        stats = import_from_spotify(self.user, importer=importer, enrich=False)
+        self.assertEqual(importer.failed_album_pages, 1)
+        self.assertEqual(stats["albums_removed"], 0)
+        self.assertEqual(self.library(), before)
@@ -0,0 +1,128 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from spotify_filter.models import (
+    Album,
+    AlbumTrack,
+    Artist,
+    Genre,
+    LibraryStats,
+    Track,
+)
+from spotify_filter.spotify_import.import_logic import import_from_spotify
+from spotify_filter.tests.helpers import mock_importer
+
+
+class LibraryStatsModelTests(TestCase):
+    """Tests for the LibraryStats model."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+
+    def test_refresh_for_empty_library(self):
+        """Test that an empty library produces zeroed statistics."""
+        stats = LibraryStats.refresh_for(self.user)
+        self.assertEqual(stats.album_count, 0)
+        self.assertEqual(stats.artist_count, 0)
+        self.assertEqual(stats.track_count, 0)
+        self.assertEqual(stats.total_duration_ms, 0)
+        self.assertEqual(stats.albums_per_decade, [])
+        self.assertEqual(stats.top_genres, [])
+
+    def test_refresh_for_counts_only_users_library(self):
+        """Test the figures computed for a small library."""
+        other = get_user_model().objects.create_user(username="other")
+        rock = Genre.objects.create(name="rock")
+        jazz = Genre.objects.create(name="jazz")
+        artist1 = Artist.objects.create(user=self.user, spotify_id="a1", name="A1")
+        artist1.genres.add(rock, jazz)
+        artist2 = Artist.objects.create(user=self.user, spotify_id="a2", name="A2")
+        artist2.genres.add(rock)
+        Artist.objects.create(user=other, spotify_id="o1", name="O1").genres.add(jazz)
+
+        album1 = Album.objects.create(
+            user=self.user, spotify_id="al1", title="One", release_date="1994-05-01"
+        )
+        album2 = Album.objects.create(
+            user=self.user, spotify_id="al2", title="Two", release_date="1999-01-01"
+        )
+        album3 = Album.objects.create(
+            user=self.user, spotify_id="al3", title="Three", release_date="2021-01-01"
+        )
+        other_album = Album.objects.create(
+            user=other, spotify_id="o-al1", title="One", release_date="1994-05-01"
+        )
+        for i, album in enumerate([album1, album2, album3, other_album]):
+            track = Track.objects.create(
+                spotify_id=f"t{i}", title=f"T{i}", duration_ms=90 * 60000
+            )
+            AlbumTrack.objects.create(album=album, track=track, track_number=1)
+
+        stats = LibraryStats.refresh_for(self.user)
+
+        self.assertEqual(stats.album_count, 3)
+        self.assertEqual(stats.artist_count, 2)
+        self.assertEqual(stats.track_count, 3)
+        self.assertEqual(stats.total_duration_ms, 3 * 90 * 60000)
+        self.assertEqual(stats.listening_time, "4 h 30 min")
+        self.assertEqual(stats.albums_per_decade, [[1990, 2], [2020, 1]])
+        self.assertEqual(stats.top_genres, [["rock", 2], ["jazz", 1]])
+
+    def test_import_refreshes_stats(self):
+        """Test that import_from_spotify stores up-to-date statistics."""
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            two_albums = json.load(f)
+        with open(
+            "spotify_filter/tests/data/artists2.json", "r", encoding="utf-8"
+        ) as f:
+            two_artists = json.load(f)
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = two_albums
+        importer.retrieve_artists_by_id.return_value = two_artists
+
+        import_from_spotify(self.user, importer=importer)
+
+        stats = LibraryStats.objects.get(user=self.user)
+        self.assertEqual(stats.album_count, 2)
+        self.assertEqual(stats.artist_count, 2)
+        self.assertEqual(stats.track_count, 25)
+        self.assertEqual(stats.total_duration_ms, 4433984 + 2287116)
+        self.assertEqual(stats.albums_per_decade, [[2020, 2]])
+        self.assertEqual(
+            stats.top_genres, [["art rock", 1], ["bedroom pop", 1], ["latin indie", 1]]
+        )
+
+
+class DashboardLibraryStatsTests(TestCase):
+    """Tests for the statistics shown on the dashboard."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+        self.client.login(username="testuser", password="testpass")
+
+    def test_dashboard_without_stats(self):
+        """Test that the dashboard renders before the first import."""
+        response = self.client.get(reverse("spotify_filter:dashboard"))
+        self.assertIsNone(response.context["library_stats"])
+
+    def test_dashboard_shows_stats(self):
+        """Test that the dashboard shows the stored statistics."""
+        LibraryStats.objects.create(
+            user=self.user,
+            album_count=12,
+            artist_count=7,
+            track_count=140,
+            total_duration_ms=125 * 60000,
+            albums_per_decade=[[1980, 4], [2010, 8]],
+            top_genres=[["shoegaze", 5]],
+        )
+        response = self.client.get(reverse("spotify_filter:dashboard"))
+        self.assertContains(response, "<strong>12</strong> albums")
+        self.assertContains(response, "2 h 5 min")
+        self.assertContains(response, "1980s: 4")
+        self.assertContains(response, "shoegaze (5)")
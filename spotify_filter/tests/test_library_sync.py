@@ -0,0 +1,183 @@
+import json
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from spotify_filter.models import LibraryState, SpotifyToken
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.spotify_import.import_logic import import_from_spotify
+from spotify_filter.spotify_import.records import SavedAlbum
+from spotify_filter.tasks import schedule_library_syncs_task, sync_library_task
+from spotify_filter.tests.helpers import mock_importer
+
+# albums2.json holds one album saved in January and one saved in October 2025
+BETWEEN_SAVES = datetime(2025, 6, 1, tzinfo=dt_timezone.utc)
+
+
+def load_json(name):
+    """Return the content of a JSON file of the test data."""
+    with open(f"spotify_filter/tests/data/{name}", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ScheduleLibrarySyncsTests(TestCase):
+    """Tests for the scheduler queueing delta syncs."""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.users = {}
+        for name, last_login, synced_hours_ago in [
+            ("active_stale", 1, 7),
+            ("active_fresh", 1, 2),
+            ("inactive_stale", 30, 30),
+            ("inactive_fresh", 30, 7),
+            ("active_stalest", 1, 48),
+        ]:
+            self.users[name] = self.create_user(
+                name, last_login=self.now - timedelta(days=last_login)
+            )
+            LibraryState.objects.create(
+                user=self.users[name],
+                synced_at=self.now - timedelta(hours=synced_hours_ago),
+            )
+
+    def create_user(self, name, last_login=None):
+        """Create a user connected to Spotify."""
+        user = get_user_model().objects.create_user(
+            username=name, last_login=last_login
+        )
+        SpotifyToken.objects.create(
+            user=user,
+            access_token="access",
+            refresh_token="refresh",
+            expires_at=self.now + timedelta(hours=1),
+        )
+        return user
+
+    def queued_users(self, mock_apply):
+        """Return the user ids queued for a sync, in queueing order."""
+        return [call.args[0][0] for call in mock_apply.call_args_list]
+
+    @patch("spotify_filter.tasks.sync_library_task.apply_async")
+    def test_due_libraries_are_queued_most_overdue_first(self, mock_apply):
+        """Test that active users are due sooner and the stalest go first."""
+        result = schedule_library_syncs_task()
+        self.assertEqual(result, {"queued": 3})
+        self.assertEqual(
+            self.queued_users(mock_apply),
+            [
+                self.users["active_stalest"].id,
+                self.users["inactive_stale"].id,
+                self.users["active_stale"].id,
+            ],
+        )
+
+    @patch("spotify_filter.tasks.sync_library_task.apply_async")
+    def test_start_times_are_spread_over_the_interval(self, mock_apply):
+        """Test that every queued sync starts in its own slot of the interval."""
+        schedule_library_syncs_task()
+        countdowns = [call.kwargs["countdown"] for call in mock_apply.call_args_list]
+        slot = timedelta(minutes=10).total_seconds() / 3
+        for i, countdown in enumerate(countdowns):
+            self.assertTrue(i * slot <= countdown <= (i + 1) * slot)
+
+    @override_settings(SPOTIFY_SYNC_MAX_CONCURRENT=2)
+    @patch("spotify_filter.tasks.sync_library_task.apply_async")
+    def test_queued_syncs_count_against_the_cap(self, mock_apply):
+        """Test that a run never exceeds the concurrency cap."""
+        self.assertEqual(schedule_library_syncs_task(), {"queued": 2})
+        self.assertEqual(schedule_library_syncs_task(), {"queued": 0})
+        LibraryState.record_sync(self.users["active_stalest"])
+        self.assertEqual(schedule_library_syncs_task(), {"queued": 1})
+        self.assertEqual(len(set(self.queued_users(mock_apply))), 3)
+
+    @patch("spotify_filter.tasks.sync_library_task.apply_async")
+    def test_lost_syncs_are_requeued_after_the_timeout(self, mock_apply):
+        """Test that a queue mark older than the timeout is ignored."""
+        LibraryState.objects.update(sync_queued_at=self.now - timedelta(hours=2))
+        self.assertEqual(schedule_library_syncs_task(), {"queued": 3})
+        mock_apply.reset_mock()
+        self.assertEqual(schedule_library_syncs_task(), {"queued": 0})
+
+    @patch("spotify_filter.tasks.sync_library_task.apply_async")
+    def test_unconnected_and_failing_users_are_skipped(self, mock_apply):
+        """Test that only users with a working Spotify token are synced."""
+        SpotifyToken.objects.filter(user=self.users["active_stale"]).delete()
+        SpotifyToken.objects.filter(user=self.users["inactive_stale"]).update(
+            refresh_failed_at=self.now
+        )
+        schedule_library_syncs_task()
+        self.assertEqual(
+            self.queued_users(mock_apply), [self.users["active_stalest"].id]
+        )
+
+    @patch("spotify_filter.tasks.enrich_library_task")
+    @patch("spotify_filter.spotify_import.import_logic.import_from_spotify")
+    def test_sync_imports_albums_saved_since_the_latest_one(
+        self, mock_import, mock_enrich
+    ):
+        """Test that the sync task starts at the user's latest saved album."""
+        user = self.users["active_stale"]
+        mock_import.return_value = {"albums_processed": 0}
+        sync_library_task(user.id)
+        mock_import.assert_called_once_with(user, since=None, enrich=False)
+        mock_enrich.delay.assert_called_once_with(user.id, since=None)
+
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = load_json("albums2.json")
+        importer.retrieve_artists_by_id.return_value = load_json("artists2.json")
+        import_from_spotify(user, importer=importer)
+        mock_import.reset_mock()
+        sync_library_task(user.id)
+        latest = datetime(2025, 10, 12, 20, 41, 21, tzinfo=dt_timezone.utc)
+        mock_import.assert_called_once_with(user, since=latest, enrich=False)
+        mock_enrich.delay.assert_called_with(user.id, since=latest.isoformat())
+
+
+class DeltaImportTests(TestCase):
+    """Tests for importing only the albums saved since a given time."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+        self.albums = load_json("albums2.json")
+        self.artists = load_json("artists2.json")
+
+    def test_import_records_sync(self):
+        """Test that an import marks the library as synced and dequeued."""
+        LibraryState.objects.create(user=self.user, sync_queued_at=timezone.now())
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = []
+        importer.retrieve_artists_by_id.return_value = []
+        import_from_spotify(self.user, importer=importer)
+        state = LibraryState.objects.get(user=self.user)
+        self.assertIsNotNone(state.synced_at)
+        self.assertIsNone(state.sync_queued_at)
+
+    def test_delta_import_updates_only_new_artists(self):
+        """Test that a delta import only refreshes the new albums' artists."""
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.albums
+        importer.retrieve_artists_by_id.return_value = [self.artists[0]]
+        import_from_spotify(self.user, importer=importer, since=BETWEEN_SAVES)
+        importer.retrieve_albums.assert_called_once_with(
+            added_after=BETWEEN_SAVES, project=SavedAlbum
+        )
+        importer.retrieve_artists_by_id.assert_called_once_with(
+            [self.albums[0]["album"]["artists"][0]["id"]]
+        )
+
+    def test_retrieve_albums_stops_at_older_albums(self):
+        """Test that paging stops at the first album saved before the cutoff."""
+        sp = MagicMock()
+        sp.current_user_saved_albums.return_value = {
+            "items": self.albums,
+            "next": "https://api.spotify.com/v1/me/albums?offset=2",
+        }
+        importer = SpotifyImporter(self.user, sp=sp)
+        albums = importer.retrieve_albums(limit=2, added_after=BETWEEN_SAVES)
+        self.assertEqual(albums, self.albums[:1])
+        sp.current_user_saved_albums.assert_called_once()
@@ -0,0 +1,256 @@
+import copy
+import json
+from unittest import skipUnless
+from unittest.mock import MagicMock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from spotify_filter.models import Album, AlbumTrack, Artist, LibraryArtist, Track
+from spotify_filter.spotify_import.import_logic import save_album_batch
+from spotify_filter.spotify_import.loaders import (
+    OrmLoader,
+    PostgresCopyLoader,
+    _copy_value,
+    get_loader,
+)
+from spotify_filter.spotify_import.offline import library_album_to_entry
+from spotify_filter.tests.helpers import saved_albums
+
+ALBUMS_FILE = "spotify_filter/tests/data/albums2.json"
+
+
+def _stats():
+    stats = MagicMock()
+    stats.__getitem__.return_value = 0
+    return stats
+
+
+def _library(user):
+    """Return a comparable snapshot of the user's library."""
+    return {
+        "albums": sorted(
+            Album.objects.for_user(user).values_list(
+                "spotify_id",
+                "title",
+                "total_tracks",
+                "release_date",
+                "added_at",
+                "popularity",
+                "album_cover_large",
+                "album_cover_small",
+            )
+        ),
+        "artists": sorted(
+            Artist.objects.for_user(user).values_list("spotify_id", "name")
+        ),
+        "album_artists": sorted(
+            Album.artists.through.objects.filter(
+                album__memberships__user=user
+            ).values_list("album__spotify_id", "artist__spotify_id")
+        ),
+        "album_tracks": sorted(
+            AlbumTrack.objects.filter(album__memberships__user=user).values_list(
+                "album__spotify_id",
+                "track__spotify_id",
+                "track__title",
+                "track__duration_ms",
+                "track_number",
+                "disc_number",
+            )
+        ),
+    }
+
+
+class OrmLoaderTests(TestCase):
+    """Tests for the bulk_create loader, inherited by the other loaders."""
+
+    loader_class = OrmLoader
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+        self.loader = self.loader_class()
+        with open(ALBUMS_FILE, "r", encoding="utf-8") as f:
+            self.entries = json.load(f)
+
+    def test_import(self):
+        """Test that albums, artists, tracks and their links are written."""
+        save_album_batch(
+            self.user, saved_albums(self.entries), _stats(), loader=self.loader
+        )
+        library = _library(self.user)
+        self.assertEqual(len(library["albums"]), 2)
+        self.assertEqual(len(library["album_tracks"]), 25)
+        self.assertEqual(
+            {row[0] for row in library["album_artists"]},
+            {entry["album"]["id"] for entry in self.entries},
+        )
+
+    def test_reimport_updates_albums(self):
+        """Test that re-imports update albums without duplicating rows."""
+        save_album_batch(
+            self.user, saved_albums(self.entries), _stats(), loader=self.loader
+        )
+        entries = copy.deepcopy(self.entries)
+        entries[0]["added_at"] = "2026-01-01T10:00:00Z"
+        entries[0]["album"]["popularity"] = 1
+        entries[0]["album"]["name"] = "Renamed"
+        save_album_batch(self.user, saved_albums(entries), _stats(), loader=self.loader)
+
+        album = Album.objects.for_user(self.user).get(
+            spotify_id=entries[0]["album"]["id"]
+        )
+        self.assertEqual(album.added_at.year, 2026)
+        self.assertEqual(album.popularity, 1)
+        # only added_at and popularity are refreshed
+        self.assertEqual(album.title, self.entries[0]["album"]["name"])
+        self.assertEqual(Album.objects.count(), 2)
+        self.assertEqual(AlbumTrack.objects.count(), 25)
+
+    def test_catalog_is_shared_between_users(self):
+        """Test that a second user's import only adds library memberships."""
+        other = get_user_model().objects.create_user(username="other", password="x")
+        save_album_batch(
+            self.user, saved_albums(self.entries), _stats(), loader=self.loader
+        )
+        save_album_batch(
+            other, saved_albums(self.entries), _stats(), loader=self.loader
+        )
+        self.assertEqual(Album.objects.count(), 2)
+        self.assertEqual(Track.objects.count(), 25)
+        self.assertEqual(AlbumTrack.objects.count(), 25)
+        self.assertEqual(Artist.objects.count(), len(_library(other)["artists"]))
+        self.assertEqual(Album.objects.for_user(other).count(), 2)
+        self.assertEqual(
+            LibraryArtist.objects.filter(user=other).count(), Artist.objects.count()
+        )
+
+    def test_file_and_api_imports_of_a_shared_album(self):
+        """Test that placeholders of file imports never overwrite API data."""
+        entry = self.entries[0]
+        export = library_album_to_entry(
+            {
+                "album": entry["album"]["name"],
+                "artist": entry["album"]["artists"][0]["name"],
+                "uri": f"spotify:album:{entry['album']['id']}",
+            }
+        )
+        other = get_user_model().objects.create_user(username="other", password="x")
+
+        def catalog_album():
+            album = Album.objects.get(spotify_id=entry["album"]["id"])
+            return (
+                album.total_tracks,
+                album.release_date.isoformat(),
+                album.popularity,
+                album.album_cover_large,
+                list(album.artists.values_list("spotify_id", flat=True)),
+            )
+
+        expected = (
+            entry["album"]["total_tracks"],
+            entry["album"]["release_date"],
+            entry["album"]["popularity"],
+            entry["album"]["images"][0]["url"],
+            [entry["album"]["artists"][0]["id"]],
+        )
+        # the file import creates the album, the API import completes it
+        save_album_batch(other, saved_albums([export]), _stats(), loader=self.loader)
+        save_album_batch(self.user, saved_albums([entry]), _stats(), loader=self.loader)
+        self.assertEqual(catalog_album(), expected)
+        save_album_batch(other, saved_albums([export]), _stats(), loader=self.loader)
+        self.assertEqual(catalog_album(), expected)
+
+    def test_special_characters_and_defaults(self):
+        """Test that escaping, missing covers and default dates survive."""
+        entry = {
+            "added_at": None,
+            "album": {
+                "id": "odd",
+                "name": "Tab\there\\N back\\slash\nnew line é漢",
+                "total_tracks": 1,
+                "popularity": 0,
+                "release_date": None,
+                "images": [],
+                "artists": [{"id": "a1", "name": "\\N"}],
+                "tracks": {
+                    "items": [
+                        {
+                            "id": "t1",
+                            "name": "",
+                            "duration_ms": 1000,
+                            "track_number": 1,
+                            "disc_number": 1,
+                        }
+                    ]
+                },
+            },
+        }
+        save_album_batch(self.user, saved_albums([entry]), _stats(), loader=self.loader)
+        album = Album.objects.get(spotify_id="odd")
+        self.assertEqual(album.title, entry["album"]["name"])
+        self.assertIsNone(album.album_cover_large)
+        self.assertIsNotNone(album.release_date)
+        self.assertEqual(Artist.objects.get(spotify_id="a1").name, "\\N")
+        self.assertEqual(Track.objects.get(spotify_id="t1").title, "")
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY requires PostgreSQL")
+class PostgresCopyLoaderTests(OrmLoaderTests):
+    """Tests for the COPY loader."""
+
+    loader_class = PostgresCopyLoader
+
+    def test_same_result_as_orm_loader(self):
+        """Test that both loaders write identical libraries."""
+        other = get_user_model().objects.create_user(username="other", password="x")
+        save_album_batch(
+            self.user, saved_albums(self.entries), _stats(), loader=OrmLoader()
+        )
+        save_album_batch(
+            other, saved_albums(self.entries), _stats(), loader=self.loader
+        )
+        self.assertEqual(_library(self.user), _library(other))
+
+    def test_staging_tables_are_emptied_between_batches(self):
+        """Test that a batch doesn't re-merge the rows of the previous one."""
+        save_album_batch(
+            self.user, saved_albums(self.entries[:1]), _stats(), loader=self.loader
+        )
+        save_album_batch(
+            self.user, saved_albums(self.entries[1:]), _stats(), loader=self.loader
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT spotify_id FROM stage_album")
+            staged = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(staged, [self.entries[1]["album"]["id"]])
+
+
+class GetLoaderTests(TestCase):
+    """Tests for the loader selection."""
+
+    def test_auto_follows_database_vendor(self):
+        """Test that COPY is only picked on PostgreSQL."""
+        expected = (
+            PostgresCopyLoader if connection.vendor == "postgresql" else OrmLoader
+        )
+        self.assertIsInstance(get_loader("auto"), expected)
+
+    @override_settings(SPOTIFY_IMPORT_LOADER="orm")
+    def test_setting(self):
+        """Test that the setting selects the default loader."""
+        self.assertIsInstance(get_loader(), OrmLoader)
+
+    def test_unknown_loader(self):
+        """Test that unknown loader names are rejected."""
+        with self.assertRaises(ValueError):
+            get_loader("fast")
+
+    def test_copy_value(self):
+        """Test the escaping of values for COPY."""
+        self.assertEqual(_copy_value(None), "\\N")
+        self.assertEqual(_copy_value("a\tb\\c\nd\re"), "a\\tb\\\\c\\nd\\re")
+        self.assertEqual(_copy_value(5), "5")
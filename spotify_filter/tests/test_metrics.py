@@ -0,0 +1,173 @@
+from unittest.mock import MagicMock
+
+import requests
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from analytics_site.celery import app
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.tests.runner import TEST_REPLICA
+from spotify_filter.tests.test_async_importer import FakeSpotifyApi, saved_album
+
+
+def sample(name, **labels):
+    """Return the current value of a metric sample, 0 if not recorded yet."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@app.task
+def failing_task():
+    """Task raising an error, for the failure counter."""
+    raise ValueError("broken")
+
+
+class RequestMetricsTests(TestCase):
+    """Tests for the metrics of web requests."""
+
+    databases = {DEFAULT_DB_ALIAS, TEST_REPLICA}
+
+    def test_requests_are_labelled_with_url_name(self):
+        """Test that latency and queries are recorded per URL name."""
+        user = get_user_model().objects.create_user(username="testuser")
+        self.client.force_login(user)
+        labels = {"view": "spotify_filter:dashboard", "method": "GET", "status": "200"}
+        count = sample("http_request_duration_seconds_count", **labels)
+        queries = sample("http_request_db_queries_sum", view="spotify_filter:dashboard")
+        self.client.get(reverse("spotify_filter:dashboard"))
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels), count + 1
+        )
+        self.assertGreater(
+            sample("http_request_db_queries_sum", view="spotify_filter:dashboard"),
+            queries,
+        )
+
+    @override_settings(REPLICA_DATABASE=TEST_REPLICA)
+    def test_replica_queries_are_counted(self):
+        """Test that the queries routed to the replica are recorded too."""
+        user = get_user_model().objects.create_user(username="testuser")
+        self.client.force_login(user)
+        view = "spotify_filter:dashboard"
+        queries = sample("http_request_db_queries_sum", view=view)
+        with (
+            CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary,
+            CaptureQueriesContext(connections[TEST_REPLICA]) as replica,
+        ):
+            self.client.get(reverse(view))
+        self.assertTrue(replica.captured_queries)
+        self.assertEqual(
+            sample("http_request_db_queries_sum", view=view),
+            queries + len(primary) + len(replica),
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint(self):
+        """Test that the metrics are served in the Prometheus text format."""
+        response = self.client.get(
+            reverse("metrics"), headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_request_duration_seconds", response.content)
+        self.assertIn(b"celery_task_duration_seconds", response.content)
+
+    def test_metrics_endpoint_requires_token(self):
+        """Test that the metrics are only served with the bearer token."""
+        with override_settings(METRICS_TOKEN="secret"):
+            for headers in [{}, {"Authorization": "Bearer wrong"}]:
+                response = self.client.get(reverse("metrics"), headers=headers)
+                self.assertEqual(response.status_code, 401)
+        with override_settings(METRICS_TOKEN=None):
+            response = self.client.get(
+                reverse("metrics"), headers={"Authorization": "Bearer "}
+            )
+            self.assertEqual(response.status_code, 404)
+
+
+class TaskMetricsTests(TestCase):
+    """Tests for the metrics of Celery tasks."""
+
+    def test_task_failures_are_counted(self):
+        """Test that a failing task records its duration and its failure."""
+        name = failing_task.name
+        failures = sample(
+            "celery_task_failures_total", task=name, exception="ValueError"
+        )
+        runs = sample("celery_task_duration_seconds_count", task=name, state="FAILURE")
+        failing_task.apply()
+        self.assertEqual(
+            sample("celery_task_failures_total", task=name, exception="ValueError"),
+            failures + 1,
+        )
+        self.assertEqual(
+            sample("celery_task_duration_seconds_count", task=name, state="FAILURE"),
+            runs + 1,
+        )
+
+
+class SpotifyApiMetricsTests(TestCase):
+    """Tests for the metrics of Spotify API calls."""
+
+    def test_spotipy_calls_are_recorded_by_status(self):
+        """Test that successes and timeouts of spotipy calls are recorded."""
+        sp = MagicMock()
+        sp.artists.__name__ = "artists"
+        sp.artists.side_effect = [requests.exceptions.Timeout(), {"artists": []}]
+        importer = SpotifyImporter(None, sp=sp, retry_delay=0)
+        ok = sample(
+            "spotify_api_request_duration_seconds_count",
+            endpoint="artists",
+            status="200",
+        )
+        timeouts = sample(
+            "spotify_api_request_duration_seconds_count",
+            endpoint="artists",
+            status="timeout",
+        )
+        importer.retrieve_artists_by_id(["a"])
+        self.assertEqual(
+            sample(
+                "spotify_api_request_duration_seconds_count",
+                endpoint="artists",
+                status="200",
+            ),
+            ok + 1,
+        )
+        self.assertEqual(
+            sample(
+                "spotify_api_request_duration_seconds_count",
+                endpoint="artists",
+                status="timeout",
+            ),
+            timeouts + 1,
+        )
+
+    def test_async_calls_are_recorded_by_status(self):
+        """Test that the async importer labels calls like spotipy does."""
+        labels = {"endpoint": "current_user_saved_albums"}
+        ok = sample(
+            "spotify_api_request_duration_seconds_count", status="200", **labels
+        )
+        limited = sample(
+            "spotify_api_request_duration_seconds_count", status="429", **labels
+        )
+        api = FakeSpotifyApi(
+            albums=[saved_album(i) for i in range(5)],
+            failures={"/v1/me/albums": [429]},
+        )
+        api.importer().retrieve_albums()
+        self.assertEqual(
+            sample(
+                "spotify_api_request_duration_seconds_count", status="200", **labels
+            ),
+            ok + 1,
+        )
+        self.assertEqual(
+            sample(
+                "spotify_api_request_duration_seconds_count", status="429", **labels
+            ),
+            limited + 1,
+        )
@@ -0,0 +1,234 @@
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from spotify_filter.models import Album, AlbumTrack, Artist, Genre, LibraryUpload
+from spotify_filter.spotify_import.import_logic import (
+    import_from_spotify,
+    save_album_batch,
+)
+from spotify_filter.spotify_import.offline import (
+    FileImporter,
+    JsonStream,
+    iter_artists,
+    iter_saved_albums,
+    local_artist_id,
+)
+from spotify_filter.tasks import import_library_file_task
+from spotify_filter.tests.helpers import saved_albums
+
+ALBUMS_FILE = "spotify_filter/tests/data/albums2.json"
+ARTISTS_FILE = "spotify_filter/tests/data/artists2.json"
+
+YOUR_LIBRARY = {
+    "tracks": [
+        {
+            "artist": "Clairo",
+            "album": "Charm",
+            "track": "Nomad",
+            "uri": "spotify:track:1",
+        }
+    ]
+    * 50,
+    "albums": [
+        {"artist": "Clairo", "album": "Charm", "uri": "spotify:album:al1"},
+        {"artist": "Candelabro", "album": "Deseo", "uri": "spotify:album:al2"},
+    ],
+    "shows": [],
+    "artists": [{"name": "Clairo", "uri": "spotify:artist:3l0C"}],
+}
+
+
+class JsonStreamTests(TestCase):
+    """Tests for the incremental JSON reader."""
+
+    def test_items_across_chunk_boundaries(self):
+        """Test that values split between chunks are decoded correctly."""
+        data = [{"n": 123456789, "s": "a, b ]"}, [1, 2.5], "x", 10**12, None, True]
+        stream = JsonStream(io.StringIO(json.dumps(data, indent=2)), chunk_size=3)
+        self.assertEqual(list(stream.items()), data)
+
+    def test_keys_and_skip(self):
+        """Test that skipped values are consumed and the next key is found."""
+        data = {"skip": {"a": [1, {"b": "}"}]}, "empty": [], "want": [{"x": 1}]}
+        stream = JsonStream(io.StringIO(json.dumps(data)), chunk_size=4)
+        found = []
+        for key in stream.keys():
+            if key == "want":
+                found = list(stream.items())
+            else:
+                stream.skip()
+        self.assertEqual(found, [{"x": 1}])
+
+    def test_invalid_json(self):
+        """Test that malformed documents raise an error."""
+        with self.assertRaises(ValueError):
+            list(JsonStream(io.StringIO("[1, 2"), chunk_size=2).items())
+
+
+class OfflineParsingTests(TestCase):
+    """Tests for reading library files."""
+
+    def test_api_dump(self):
+        """Test that saved-album dumps are passed through unchanged."""
+        with open(ALBUMS_FILE, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        with open(ALBUMS_FILE, "r", encoding="utf-8") as f:
+            self.assertEqual(list(iter_saved_albums(f)), expected)
+
+    def test_api_page(self):
+        """Test that saved-albums API pages are supported."""
+        page = {"href": "x", "items": [{"added_at": None, "album": {"id": "1"}}]}
+        entries = list(iter_saved_albums(io.StringIO(json.dumps(page))))
+        self.assertEqual(entries, page["items"])
+
+    def test_account_export(self):
+        """Test that albums of YourLibrary.json are converted to API entries."""
+        entries = list(iter_saved_albums(io.StringIO(json.dumps(YOUR_LIBRARY))))
+        self.assertEqual(len(entries), 2)
+        album = entries[0]["album"]
+        self.assertEqual(album["id"], "al1")
+        self.assertEqual(album["name"], "Charm")
+        self.assertEqual(
+            album["artists"], [{"id": local_artist_id("Clairo"), "name": "Clairo"}]
+        )
+
+    def test_artists(self):
+        """Test that artist lists and artist API responses are supported."""
+        with open(ARTISTS_FILE, "r", encoding="utf-8") as f:
+            artists = json.load(f)
+        as_list = list(iter_artists(io.StringIO(json.dumps(artists))))
+        as_response = list(iter_artists(io.StringIO(json.dumps({"artists": artists}))))
+        self.assertEqual(as_list, artists)
+        self.assertEqual(as_response, artists)
+
+
+class OfflineImportTests(TestCase):
+    """Tests for importing libraries from files."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+
+    def test_file_import_matches_api_import(self):
+        """Test that files go through the same pipeline as the API import."""
+        importer = FileImporter(self.user, [ALBUMS_FILE], [ARTISTS_FILE])
+        stats = import_from_spotify(self.user, importer=importer, batch_size=1)
+        self.assertEqual(stats["albums_processed"], 2)
+        self.assertEqual(stats["artists_updated"], 2)
+        self.assertEqual(stats["tracks_processed"], 25)
+        self.assertEqual(Album.objects.for_user(self.user).count(), 2)
+        self.assertEqual(AlbumTrack.objects.count(), 25)
+        self.assertTrue(Genre.objects.filter(name="bedroom pop").exists())
+
+    def test_account_export_import(self):
+        """Test importing YourLibrary.json without artist data."""
+        source = io.BytesIO(json.dumps(YOUR_LIBRARY).encode())
+        stats = import_from_spotify(
+            self.user, importer=FileImporter(self.user, [source])
+        )
+        self.assertEqual(stats["albums_processed"], 2)
+        self.assertEqual(stats["artists_updated"], 0)
+        self.assertEqual(
+            sorted(Album.objects.values_list("title", flat=True)), ["Charm", "Deseo"]
+        )
+        artist = Artist.objects.get(name="Clairo")
+        self.assertEqual(artist.spotify_id, local_artist_id("Clairo"))
+        self.assertEqual(
+            list(artist.albums.values_list("spotify_id", flat=True)), ["al1"]
+        )
+
+    def test_batch_query_count_is_constant(self):
+        """Test that writing a batch doesn't issue queries per album or track."""
+        with open(ALBUMS_FILE, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+
+        def count_queries(album_entries):
+            stats = MagicMock()
+            stats.__getitem__.return_value = 0
+            with CaptureQueriesContext(connection) as ctx:
+                save_album_batch(self.user, saved_albums(album_entries), stats)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(entries[:1]), count_queries(entries))
+
+    def test_management_command(self):
+        """Test that the management command imports the given files."""
+        out = StringIO()
+        call_command(
+            "import_library_file",
+            "testuser",
+            ALBUMS_FILE,
+            "--artists",
+            ARTISTS_FILE,
+            stdout=out,
+        )
+        self.assertIn("'albums_processed': 2", out.getvalue())
+        self.assertEqual(Album.objects.for_user(self.user).count(), 2)
+
+
+class LibraryUploadTests(TestCase):
+    """Tests for uploading library files."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+
+    def test_upload_form(self):
+        """Test that the upload page renders for logged-in users."""
+        self.client.login(username="testuser", password="testpass")
+        response = self.client.get(reverse("spotify_filter:upload_library"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "spotify_filter/upload.html")
+
+    def test_upload_requires_login(self):
+        """Test that uploading requires authentication."""
+        response = self.client.get(reverse("spotify_filter:upload_library"))
+        self.assertEqual(response.status_code, 302)
+
+    @patch("spotify_filter.views.import_library_file_task")
+    def test_upload_queues_import(self, mock_task):
+        """Test that an upload is stored in the database and queued."""
+        mock_task.delay.return_value.id = "task-1"
+        self.client.login(username="testuser", password="testpass")
+        data = json.dumps(YOUR_LIBRARY).encode()
+        upload = SimpleUploadedFile("YourLibrary.json", data)
+        web_media_root = tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=web_media_root):
+            response = self.client.post(
+                reverse("spotify_filter:upload_library"), {"library_file": upload}
+            )
+        self.assertRedirects(
+            response, reverse("spotify_filter:importing", args=["task-1"])
+        )
+        user_id, upload_id = mock_task.delay.call_args.args
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual(bytes(LibraryUpload.objects.get(id=upload_id).data), data)
+        self.assertEqual(os.listdir(web_media_root), [])
+
+    def test_task_imports_and_removes_upload(self):
+        """Test that a worker imports an upload from its task arguments alone."""
+        upload = LibraryUpload.objects.create(
+            user=self.user, data=json.dumps(YOUR_LIBRARY).encode()
+        )
+        # the worker doesn't share the file system of the web process
+        with override_settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            result = import_library_file_task.apply(
+                args=(self.user.id, upload.id)
+            ).get()
+        self.assertEqual(result, {"status": "success"})
+        self.assertEqual(Album.objects.for_user(self.user).count(), 2)
+        self.assertFalse(LibraryUpload.objects.exists())
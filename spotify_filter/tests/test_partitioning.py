@@ -0,0 +1,93 @@
+import json
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from spotify_filter.models import Album, Artist, LibraryAlbum, LibraryArtist
+from spotify_filter.partitioning import (
+    is_partitioned,
+    partition_of,
+    partition_table,
+    partitions,
+)
+from spotify_filter.spotify_import.import_logic import _new_stats, save_album_batch
+from spotify_filter.tests.helpers import saved_albums
+
+
+@skipUnless(connection.vendor == "postgresql", "partitioning requires PostgreSQL")
+class PartitioningTests(TestCase):
+    """Tests for hash partitioning the library tables by user."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            cls.two_albums = json.load(f)
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(username=f"user{i}") for i in range(6)
+        ]
+        save_album_batch(self.users[0], saved_albums(self.two_albums), _new_stats())
+
+    def test_rows_and_queries_survive_partitioning(self):
+        """Test that the existing rows and the ORM work on partitioned tables."""
+        partition_table(LibraryAlbum, 4)
+        partition_table(LibraryArtist, 4)
+        self.assertTrue(is_partitioned(LibraryAlbum))
+        self.assertEqual(
+            partitions(LibraryAlbum),
+            [f"spotify_filter_libraryalbum_p{i}" for i in range(4)],
+        )
+        self.assertEqual(Album.objects.for_user(self.users[0]).count(), 2)
+        self.assertEqual(Artist.objects.for_user(self.users[0]).count(), 2)
+
+        # imports upsert into the partitioned tables
+        for user in self.users[1:]:
+            save_album_batch(user, saved_albums(self.two_albums), _new_stats())
+        save_album_batch(self.users[0], saved_albums(self.two_albums), _new_stats())
+        self.assertEqual(LibraryAlbum.objects.count(), 12)
+        self.assertEqual(len(set(LibraryAlbum.objects.values_list("id"))), 12)
+        album = Album.objects.first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LibraryAlbum.objects.create(user=self.users[0], album=album)
+
+        LibraryAlbum.objects.filter(user=self.users[1]).delete()
+        self.assertEqual(Album.objects.for_user(self.users[1]).count(), 0)
+        self.assertEqual(Album.objects.for_user(self.users[2]).count(), 2)
+
+    def test_user_rows_live_in_one_partition(self):
+        """Test that a user's memberships are all stored in one partition."""
+        partition_table(LibraryAlbum, 4)
+        partition = partition_of(LibraryAlbum, self.users[0])
+        self.assertIn(partition, partitions(LibraryAlbum))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {partition}")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertIsNone(partition_of(LibraryAlbum, self.users[1]))
+
+    def test_repartition_and_revert(self):
+        """Test that the tables can be repartitioned and made plain again."""
+        partition_table(LibraryAlbum, 4)
+        partition_table(LibraryAlbum, 2)
+        self.assertEqual(len(partitions(LibraryAlbum)), 2)
+        partition_table(LibraryAlbum, 0)
+        self.assertFalse(is_partitioned(LibraryAlbum))
+        self.assertEqual(LibraryAlbum.objects.count(), 2)
+        LibraryAlbum.objects.create(user=self.users[1], album=Album.objects.first())
+
+    def test_management_commands(self):
+        """Test that the commands partition the tables and report on them."""
+        out = StringIO()
+        call_command("partition_library", "3", stdout=out)
+        self.assertIn("spotify_filter_libraryalbum: 3 partitions", out.getvalue())
+        self.assertIn("spotify_filter_libraryartist: 3 partitions", out.getvalue())
+        out = StringIO()
+        call_command("library_partitions", "--user", "user0", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn(partition_of(LibraryAlbum, self.users[0]), lines[1])
@@ -0,0 +1,80 @@
+import marshal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from spotify_filter.models import RequestProfile
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Tests for on-demand profiling of requests by staff members."""
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username="staff", is_staff=True, is_superuser=True
+        )
+        self.dashboard = reverse("spotify_filter:dashboard")
+
+    def test_staff_request_is_profiled_with_header(self):
+        """Test that the header stores the profile and the SQL queries."""
+        self.client.force_login(self.staff)
+        response = self.client.get(self.dashboard, headers={"X-Profile": "1"})
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(profile.pk))
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.view_name, "spotify_filter:dashboard")
+        self.assertEqual(profile.status_code, 200)
+        self.assertGreater(profile.query_count, 0)
+        self.assertEqual(len(profile.queries), profile.query_count)
+        self.assertIn("SELECT", profile.queries[0]["sql"])
+        self.assertIn("cumulative", profile.summary)
+        self.assertTrue(marshal.loads(bytes(profile.profile)))
+
+    def test_query_flag_profiles_request(self):
+        """Test that the query parameter works like the header."""
+        self.client.force_login(self.staff)
+        self.client.get(self.dashboard, {"_profile": "1"})
+        self.assertEqual(
+            RequestProfile.objects.get().path, f"{self.dashboard}?_profile=1"
+        )
+
+    def test_other_requests_are_not_profiled(self):
+        """Test that plain requests and non-staff users are never profiled."""
+        user = get_user_model().objects.create_user(username="testuser")
+        self.client.force_login(user)
+        response = self.client.get(self.dashboard, headers={"X-Profile": "1"})
+        self.assertNotIn("X-Profile-Id", response)
+        self.client.force_login(self.staff)
+        self.client.get(self.dashboard)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_unflagged_requests_do_not_load_the_user(self):
+        """Test that logged-in task polls stay free of database queries."""
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("spotify_filter:task_status", args=["unknown"]))
+
+    def test_admin_download(self):
+        """Test that the profile can be downloaded from the admin."""
+        self.client.force_login(self.staff)
+        self.client.get(self.dashboard, headers={"X-Profile": "1"})
+        profile = RequestProfile.objects.get()
+        change = self.client.get(
+            reverse("admin:spotify_filter_requestprofile_change", args=[profile.pk])
+        )
+        download = reverse(
+            "admin:spotify_filter_requestprofile_download", args=[profile.pk]
+        )
+        self.assertContains(change, download)
+        response = self.client.get(download)
+        self.assertEqual(response.content, bytes(profile.profile))
+        self.assertIn(".prof", response["Content-Disposition"])
+
+    def test_debug_toolbar_is_development_only(self):
+        """Test that the debug toolbar is not installed without DEBUG."""
+        self.assertNotIn("debug_toolbar", settings.INSTALLED_APPS)
+        self.assertNotIn(
+            "debug_toolbar.middleware.DebugToolbarMiddleware", settings.MIDDLEWARE
+        )
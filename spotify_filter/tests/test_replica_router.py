@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.template.response import TemplateResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from spotify_filter.models import Album, LibraryState
+from spotify_filter.routers import ReplicaRouter, replica_reads
+from spotify_filter.tests.runner import TEST_REPLICA
+from spotify_filter.views import reads_from_replica
+
+router = ReplicaRouter()
+
+
+def read_database():
+    """Return the alias the router currently reads albums from."""
+    return router.db_for_read(Album)
+
+
+def served_by():
+    """Return the name of the album of the database serving album reads."""
+    return Album.objects.get().spotify_id
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """Tests for the routing decisions of the replica router."""
+
+    def test_reads_go_to_replica_only_inside_replica_reads(self):
+        """Test that reads default to the primary."""
+        self.assertIsNone(read_database())
+        with replica_reads():
+            self.assertEqual(read_database(), "replica")
+        self.assertIsNone(read_database())
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        """Test that writes go to the primary even inside replica_reads."""
+        with replica_reads():
+            self.assertEqual(router.db_for_write(Album), DEFAULT_DB_ALIAS)
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, "spotify_filter"))
+        self.assertFalse(router.allow_migrate("replica", "spotify_filter"))
+
+    def test_relations_across_primary_and_replica(self):
+        """Test that objects of the primary and the replica can be related."""
+        # pylint: disable=protected-access
+        album, other = Album(), Album()
+        album._state.db, other._state.db = DEFAULT_DB_ALIAS, "replica"
+        self.assertTrue(router.allow_relation(album, other))
+        other._state.db = "elsewhere"
+        self.assertIsNone(router.allow_relation(album, other))
+
+
+@override_settings(REPLICA_DATABASE=TEST_REPLICA)
+class ReadsFromReplicaTests(TestCase):
+    """Tests for the decorator sending the reads of a view to the replica."""
+
+    databases = {DEFAULT_DB_ALIAS, TEST_REPLICA}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+        self.factory = RequestFactory()
+        # each database holds only its own album
+        Album.objects.create(spotify_id="primary", title="Primary")
+        Album.objects.using(TEST_REPLICA).create(spotify_id="replica", title="Replica")
+
+    def get(self, view):
+        """Call a view with a request of the user."""
+        request = self.factory.get("/")
+        request.user = self.user
+        return reads_from_replica(view)(request)
+
+    def served_by(self):
+        """Return the database that served the reads of a view."""
+        served = []
+
+        def record(_request):
+            served.append(served_by())
+            return HttpResponse()
+
+        self.get(record)
+        return served[0]
+
+    def test_view_reads_from_replica(self):
+        """Test that a user without recent changes reads from the replica."""
+        LibraryState.objects.create(
+            user=self.user,
+            last_modified=timezone.now()
+            - settings.REPLICA_READ_YOUR_WRITES_WINDOW
+            - timedelta(seconds=1),
+        )
+        self.assertEqual(self.served_by(), "replica")
+        self.assertEqual(served_by(), "primary")
+
+    def test_new_library_reads_from_replica(self):
+        """Test that a user who never imported reads from the replica."""
+        self.assertEqual(self.served_by(), "replica")
+
+    def test_recent_import_reads_from_primary(self):
+        """Test that the user's reads stay on the primary after an import."""
+        LibraryState.record_sync(self.user)
+        self.assertEqual(self.served_by(), "primary")
+
+    @override_settings(REPLICA_DATABASE="replica")
+    def test_without_replica_reads_from_primary(self):
+        """Test that the decorator does nothing without a replica database."""
+        self.assertEqual(self.served_by(), "primary")
+
+    def test_template_responses_render_on_replica(self):
+        """Test that a template response is rendered inside the replica reads."""
+        template = engines["django"].from_string("{{ served_by }}")
+
+        def view(request):
+            return TemplateResponse(request, template, {"served_by": served_by})
+
+        self.assertEqual(self.get(view).content, b"replica")
+
+    def test_streaming_responses_stream_from_replica(self):
+        """Test that streamed content is produced with replica reads."""
+
+        def view(_request):
+            return StreamingHttpResponse(served_by() for _ in range(2))
+
+        response = self.get(view)
+        self.assertEqual(b"".join(response.streaming_content), b"replicareplica")
+
+    def test_dashboard_on_replica(self):
+        """Test that the dashboard serves its page through the replica."""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connections[TEST_REPLICA]) as replica_queries:
+            response = self.client.get(reverse("spotify_filter:dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica_queries.captured_queries)
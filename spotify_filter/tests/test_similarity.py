@@ -0,0 +1,166 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from spotify_filter.models import Artist, ArtistSimilarity, Genre, LibraryArtist
+from spotify_filter.similarity import GenreMatrix, rebuild_similarity_index
+from spotify_filter.spotify_import.import_logic import enrich_from_spotify
+from spotify_filter.tests.helpers import mock_importer
+
+
+def similar_names(artist, user=None):
+    """Return the names of the stored similar artists, best first."""
+    similarities = artist.similarities.select_related("similar")
+    if user is not None:
+        similarities = similarities.filter(user=user)
+    return [s.similar.name for s in similarities]
+
+
+class SimilarityIndexTests(TestCase):
+    """Tests for the artist similarity index."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="testuser", password="testpass"
+        )
+        self.genres = {
+            name: Genre.objects.create(name=name)
+            for name in ["rock", "indie", "jazz", "pop"]
+        }
+        self.artists = {}
+        for name, genres in [
+            ("A", ["rock", "indie"]),
+            ("B", ["rock", "indie", "jazz"]),
+            ("C", ["rock"]),
+            ("D", ["jazz"]),
+            ("E", ["pop"]),
+        ]:
+            artist = Artist.objects.create(
+                user=self.user, spotify_id=name.lower(), name=name
+            )
+            artist.genres.add(*(self.genres[g] for g in genres))
+            self.artists[name] = artist
+
+    def test_full_rebuild_scores(self):
+        """Test that neighbours are ranked by cosine similarity of genres."""
+        rebuild_similarity_index(self.user)
+        self.assertEqual(similar_names(self.artists["A"]), ["B", "C"])
+        self.assertEqual(similar_names(self.artists["D"]), ["B"])
+        self.assertEqual(similar_names(self.artists["E"]), [])
+        score = ArtistSimilarity.objects.get(
+            artist=self.artists["A"], similar=self.artists["B"]
+        ).score
+        self.assertAlmostEqual(score, 2 / (2**0.5 * 3**0.5))
+
+    def test_top_k_limits_neighbours(self):
+        """Test that only k neighbours are stored per artist."""
+        rebuild_similarity_index(self.user, k=1)
+        self.assertEqual(similar_names(self.artists["B"]), ["A"])
+        self.assertEqual(ArtistSimilarity.objects.count(), 4)
+
+    def test_index_is_per_user(self):
+        """Test that artists of other users are never listed as similar."""
+        other = get_user_model().objects.create_user(username="other")
+        Artist.objects.create(user=other, spotify_id="x", name="X").genres.add(
+            self.genres["rock"], self.genres["indie"]
+        )
+        rebuild_similarity_index(self.user)
+        self.assertEqual(similar_names(self.artists["A"]), ["B", "C"])
+
+    def test_shared_artist_has_neighbours_per_user(self):
+        """Test that an artist in several libraries is indexed per library."""
+        other = get_user_model().objects.create_user(username="other")
+        LibraryArtist.objects.create(user=other, artist=self.artists["A"])
+        Artist.objects.create(user=other, spotify_id="x", name="X").genres.add(
+            self.genres["rock"]
+        )
+        rebuild_similarity_index(self.user)
+        rebuild_similarity_index(other)
+        self.assertEqual(similar_names(self.artists["A"], self.user), ["B", "C"])
+        self.assertEqual(similar_names(self.artists["A"], other), ["X"])
+
+    def test_incremental_rebuild_matches_full_rebuild(self):
+        """Test that an incremental rebuild gives the same result as a full one."""
+        rebuild_similarity_index(self.user)
+        self.artists["E"].genres.add(self.genres["jazz"])
+        self.artists["C"].genres.remove(self.genres["rock"])
+        self.artists["C"].genres.add(self.genres["pop"])
+
+        rebuilt = rebuild_similarity_index(
+            self.user, [self.artists["E"].id, self.artists["C"].id]
+        )
+        incremental = set(
+            ArtistSimilarity.objects.values_list("artist_id", "similar_id", "score")
+        )
+        rebuild_similarity_index(self.user)
+        full = set(
+            ArtistSimilarity.objects.values_list("artist_id", "similar_id", "score")
+        )
+        self.assertEqual(incremental, full)
+        self.assertLess(rebuilt, len(self.artists) + 1)
+
+    def test_incremental_rebuild_skips_unaffected_artists(self):
+        """Test that only artists related to the changed ones are rebuilt."""
+        rebuild_similarity_index(self.user)
+        self.assertEqual(rebuild_similarity_index(self.user, [self.artists["E"].id]), 1)
+        self.assertEqual(rebuild_similarity_index(self.user, []), 0)
+
+    def test_matrix_neighbours(self):
+        """Test that neighbours are the artists sharing a genre."""
+        matrix = GenreMatrix.load(self.user)
+        rows = matrix.positions([self.artists["D"].id])
+        neighbours = matrix.artist_ids[matrix.neighbours(rows)].tolist()
+        self.assertEqual(
+            sorted(neighbours), sorted([self.artists["B"].id, self.artists["D"].id])
+        )
+
+    def test_import_updates_index(self):
+        """Test that the enrichment indexes artists whose genres changed."""
+        importer = mock_importer()
+        importer.retrieve_artists_by_id.return_value = [
+            {"id": artist.spotify_id, "genres": ["rock"]}
+            for artist in Artist.objects.for_user(self.user).order_by("id")
+        ]
+        enrich_from_spotify(self.user, importer=importer)
+        self.assertIn("C", similar_names(self.artists["E"]))
+
+    def test_second_user_import_indexes_catalog_artists(self):
+        """Test that artists already in the catalog get indexed for a new user."""
+        other = get_user_model().objects.create_user(username="other")
+        for user in [self.user, other]:
+            importer = mock_importer()
+            importer.retrieve_artists_by_id.return_value = [
+                {"id": artist.spotify_id, "genres": ["rock"]}
+                for artist in Artist.objects.all().order_by("id")
+            ]
+            for artist in Artist.objects.all():
+                LibraryArtist.objects.get_or_create(user=user, artist=artist)
+            enrich_from_spotify(user, importer=importer)
+        self.assertEqual(
+            ArtistSimilarity.objects.filter(user=other).count(),
+            ArtistSimilarity.objects.filter(user=self.user).count(),
+        )
+        self.assertIn("C", similar_names(self.artists["E"], user=other))
+
+    def test_management_command(self):
+        """Test that the management command rebuilds the index."""
+        out = StringIO()
+        call_command("rebuild_similarity_index", "testuser", stdout=out)
+        self.assertIn("testuser: indexed 5 artists", out.getvalue())
+        self.assertEqual(similar_names(self.artists["A"]), ["B", "C"])
+
+    def test_artist_detail_shows_similar_artists(self):
+        """Test that the artist detail page lists similar artists."""
+        rebuild_similarity_index(self.user)
+        self.client.login(username="testuser", password="testpass")
+        response = self.client.get(
+            reverse("spotify_filter:artist_detail", args=(self.artists["A"].id,))
+        )
+        self.assertContains(response, "Similar artists in your library")
+        self.assertContains(
+            response,
+            reverse("spotify_filter:artist_detail", args=(self.artists["B"].id,)),
+        )
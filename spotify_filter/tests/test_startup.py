@@ -0,0 +1,28 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase
+
+
+class StartupBenchmarkTests(SimpleTestCase):
+    """Tests for the web process startup benchmark."""
+
+    # the probes boot the project settings, pointed at the test database
+    databases = {"default"}
+
+    def test_web_process_does_not_load_spotify_client(self):
+        """Test that booting and serving a page leaves spotipy unloaded."""
+        out = StringIO()
+        probe_env = {
+            "DJANGO_SECRET_KEY": "startup-probe",
+            "POSTGRES_DB": connection.settings_dict["NAME"],
+        }
+        with mock.patch.dict(os.environ, probe_env):
+            call_command("benchmark_startup", "--repeat", "1", stdout=out)
+        output = out.getvalue()
+        self.assertIn("first request", output)
+        self.assertIn("status: 200 OK", output)
+        self.assertIn("Spotify client modules loaded: -", output)
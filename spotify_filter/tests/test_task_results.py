@@ -0,0 +1,59 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+
+from analytics_site.celery import app
+from spotify_filter.tasks import prune_task_results_task
+
+
+class TaskStatusTests(TestCase):
+    """Tests for polling task results from the result cache."""
+
+    def setUp(self):
+        caches["task-results"].clear()
+
+    def test_task_status_reads_result_from_cache(self):
+        """Test that a stored result is served without touching the database."""
+        app.backend.store_result("task-1", {"status": "success"}, "SUCCESS")
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse("spotify_filter:task_status", args=["task-1"])
+            )
+        self.assertEqual(
+            response.json(), {"status": "SUCCESS", "result": {"status": "success"}}
+        )
+        self.assertFalse(TaskResult.objects.exists())
+
+    def test_unknown_task_is_pending(self):
+        """Test that a task without a stored result reads as pending."""
+        response = self.client.get(
+            reverse("spotify_filter:task_status", args=["unknown"])
+        )
+        self.assertEqual(response.json(), {"status": "PENDING", "result": None})
+
+    def test_results_expire(self):
+        """Test that results are stored with the configured expiry."""
+        self.assertEqual(app.backend.expires, timedelta(days=1).total_seconds())
+
+
+class PruneTaskResultsTests(TestCase):
+    """Tests for the sweep deleting old task result rows."""
+
+    @patch("spotify_filter.tasks.PRUNE_BATCH_SIZE", 2)
+    def test_old_rows_are_deleted_in_batches(self):
+        """Test that only rows older than the result expiry are deleted."""
+        TaskResult.objects.bulk_create(
+            TaskResult(task_id=f"task-{i}", status="SUCCESS") for i in range(7)
+        )
+        TaskResult.objects.exclude(task_id="task-6").update(
+            date_done=timezone.now() - timedelta(days=2)
+        )
+        self.assertEqual(prune_task_results_task(), {"deleted": 6})
+        self.assertEqual(
+            list(TaskResult.objects.values_list("task_id", flat=True)), ["task-6"]
+        )
@@ -0,0 +1,84 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from analytics_site.celery import app
+from spotify_filter.models import Artist, LibraryState
+from spotify_filter.spotify_import.import_logic import import_from_spotify
+from spotify_filter.tasks import enrich_library_task
+from spotify_filter.tests.helpers import mock_importer
+
+
+def route(task_name):
+    """Return the queue name and priority a task is sent with."""
+    options = app.amqp.router.route({}, f"spotify_filter.tasks.{task_name}")
+    return options["queue"].name, options.get("priority")
+
+
+class TaskRoutingTests(TestCase):
+    """Tests for the Celery queues the import phases are sent to."""
+
+    def test_import_phases_have_their_own_queues(self):
+        """Test that each import phase is routed to its queue and priority."""
+        self.assertEqual(route("import_spotify_data_task"), ("interactive", 0))
+        self.assertEqual(route("import_library_file_task"), ("interactive", 0))
+        self.assertEqual(route("enrich_library_task"), ("enrichment", 3))
+        self.assertEqual(route("sync_library_task"), ("sync", 6))
+
+    def test_housekeeping_uses_the_default_queue(self):
+        """Test that periodic housekeeping tasks aren't routed to a phase queue."""
+        self.assertEqual(route("refresh_expiring_tokens_task")[0], "default")
+        self.assertEqual(route("schedule_library_syncs_task")[0], "default")
+
+
+class EnrichLibraryTaskTests(TestCase):
+    """Tests for enriching artists separately from the album import."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="testuser")
+        with open("spotify_filter/tests/data/albums2.json", "r", encoding="utf-8") as f:
+            self.albums = json.load(f)
+        with open(
+            "spotify_filter/tests/data/artists2.json", "r", encoding="utf-8"
+        ) as f:
+            self.artists = json.load(f)
+        self.importer = mock_importer()
+        self.importer.retrieve_albums.return_value = self.albums
+        self.importer.retrieve_artists_by_id.return_value = self.artists
+
+    def test_import_without_enrichment_skips_artists(self):
+        """Test that the album import alone doesn't fetch artists."""
+        stats = import_from_spotify(self.user, importer=self.importer, enrich=False)
+        self.assertEqual(stats["albums_processed"], 2)
+        self.assertEqual(stats["artists_updated"], 0)
+        self.importer.retrieve_artists_by_id.assert_not_called()
+        self.assertFalse(Artist.objects.filter(genres__isnull=False).exists())
+
+    @patch("spotify_filter.spotify_import.import_logic.SpotifyImporter")
+    def test_enrich_task_updates_artists(self, mock_importer_class):
+        """Test that the enrichment task adds genres and touches the library."""
+        import_from_spotify(self.user, importer=self.importer, enrich=False)
+        modified = LibraryState.last_modified_for(self.user)
+        mock_importer_class.return_value = self.importer
+
+        result = enrich_library_task(self.user.id)
+
+        self.assertEqual(result, {"status": "success"})
+        mock_importer_class.assert_called_once_with(user=self.user)
+        self.assertTrue(Artist.objects.filter(genres__isnull=False).exists())
+        self.assertGreater(LibraryState.last_modified_for(self.user), modified)
+
+    @patch("spotify_filter.spotify_import.import_logic.SpotifyImporter")
+    def test_enrich_task_parses_since(self, mock_importer_class):
+        """Test that a delta enrichment only fetches the new albums' artists."""
+        import_from_spotify(self.user, importer=self.importer, enrich=False)
+        mock_importer_class.return_value = self.importer
+        self.importer.retrieve_artists_by_id.return_value = self.artists[:1]
+
+        enrich_library_task(self.user.id, since="2025-06-01T00:00:00+00:00")
+
+        self.importer.retrieve_artists_by_id.assert_called_once_with(
+            [self.albums[0]["album"]["artists"][0]["id"]]
+        )
@@ -0,0 +1,156 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from spotipy.oauth2 import SpotifyOauthError
+
+from spotify_filter.models import SpotifyToken
+from spotify_filter.spotify_import.api import SpotifyImporter
+from spotify_filter.tasks import (
+    refresh_expiring_tokens_task,
+    refresh_spotify_token_task,
+)
+
+TOKEN_INFO = {"access_token": "fresh", "expires_in": 3600}
+
+
+def oauth_mock(side_effect=None):
+    """Return a SpotifyOAuth mock whose refreshes return TOKEN_INFO."""
+    sp_oauth = MagicMock()
+    sp_oauth.refresh_access_token.return_value = TOKEN_INFO
+    sp_oauth.refresh_access_token.side_effect = side_effect
+    return sp_oauth
+
+
+class TokenRefreshTests(TestCase):
+    """Tests for refreshing Spotify tokens ahead of expiry."""
+
+    def setUp(self):
+        self.tokens = {}
+        for name, expires_in in [("soon", 5), ("expired", -60), ("later", 50)]:
+            user = get_user_model().objects.create_user(username=name)
+            self.tokens[name] = SpotifyToken.objects.create(
+                user=user,
+                access_token="old",
+                refresh_token=f"refresh-{name}",
+                expires_at=timezone.now() + timedelta(minutes=expires_in),
+            )
+
+    @patch("spotify_filter.tasks.refresh_spotify_token_task.apply_async")
+    def test_only_expiring_tokens_are_queued_with_jitter(self, mock_apply):
+        """Test that tokens close to expiry are queued with random delays."""
+        result = refresh_expiring_tokens_task()
+        self.assertEqual(result, {"queued": 2})
+        queued = {call.args[0][0] for call in mock_apply.call_args_list}
+        self.assertEqual(queued, {self.tokens["soon"].id, self.tokens["expired"].id})
+        for call in mock_apply.call_args_list:
+            self.assertTrue(0 <= call.kwargs["countdown"] <= 120)
+
+    @override_settings(SPOTIFY_TOKEN_REFRESH_BATCH_SIZE=1)
+    @patch("spotify_filter.tasks.refresh_spotify_token_task.apply_async")
+    def test_batch_size_starts_with_the_oldest_tokens(self, mock_apply):
+        """Test that a run queues at most one batch, soonest expiry first."""
+        refresh_expiring_tokens_task()
+        mock_apply.assert_called_once()
+        self.assertEqual(mock_apply.call_args.args[0], (self.tokens["expired"].id,))
+
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_refresh_task_stores_token(self, mock_oauth):
+        """Test that the refreshed token is stored with its new expiry."""
+        mock_oauth.return_value = oauth_mock()
+        result = refresh_spotify_token_task(self.tokens["soon"].id)
+        token = SpotifyToken.objects.get(id=self.tokens["soon"].id)
+        self.assertEqual(result, {"status": "success"})
+        self.assertEqual(token.access_token, "fresh")
+        self.assertEqual(token.refresh_token, "refresh-soon")
+        self.assertGreater(token.expires_at, timezone.now() + timedelta(minutes=55))
+        self.assertIsNotNone(token.refreshed_at)
+
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_tokens_being_refreshed_are_skipped(self, mock_oauth):
+        """Test that the token is claimed, not locked, while Spotify answers."""
+        token = self.tokens["soon"]
+        during_refresh = []
+
+        def refresh(_refresh_token):
+            # a concurrent task sees the claim and leaves the token alone
+            during_refresh.append(refresh_spotify_token_task(token.id))
+            return TOKEN_INFO
+
+        mock_oauth.return_value = oauth_mock(refresh)
+        result = refresh_spotify_token_task(token.id)
+        token.refresh_from_db()
+        self.assertEqual(result, {"status": "success"})
+        self.assertEqual(during_refresh, [{"status": "skipped"}])
+        mock_oauth.return_value.refresh_access_token.assert_called_once()
+        self.assertEqual(token.access_token, "fresh")
+        self.assertIsNone(token.refreshing_at)
+
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_stale_claims_are_taken_over(self, mock_oauth):
+        """Test that the claim of a crashed task expires."""
+        token = self.tokens["soon"]
+        SpotifyToken.objects.filter(id=token.id).update(
+            refreshing_at=timezone.now() - timedelta(minutes=1)
+        )
+        mock_oauth.return_value = oauth_mock()
+        self.assertEqual(refresh_spotify_token_task(token.id), {"status": "skipped"})
+        SpotifyToken.objects.filter(id=token.id).update(
+            refreshing_at=timezone.now() - timedelta(minutes=3)
+        )
+        self.assertEqual(refresh_spotify_token_task(token.id), {"status": "success"})
+
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_refresh_task_skips_fresh_tokens(self, mock_oauth):
+        """Test that tokens refreshed meanwhile aren't refreshed again."""
+        result = refresh_spotify_token_task(self.tokens["later"].id)
+        self.assertEqual(result, {"status": "skipped"})
+        mock_oauth.assert_not_called()
+
+    @patch("spotify_filter.tasks.refresh_spotify_token_task.apply_async")
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_failures_are_recorded_and_retried_later(self, mock_oauth, mock_apply):
+        """Test that failed refreshes are marked and not retried right away."""
+        mock_oauth.return_value = oauth_mock(SpotifyOauthError("invalid_grant"))
+        result = refresh_spotify_token_task(self.tokens["soon"].id)
+        token = SpotifyToken.objects.get(id=self.tokens["soon"].id)
+        self.assertEqual(result, {"status": "failed"})
+        self.assertEqual(token.access_token, "old")
+        self.assertEqual(token.refresh_failures, 1)
+        self.assertIn("invalid_grant", token.refresh_error)
+        self.assertIsNotNone(token.refresh_failed_at)
+        self.assertIsNone(token.refreshing_at)
+
+        refresh_expiring_tokens_task()
+        queued = {call.args[0][0] for call in mock_apply.call_args_list}
+        self.assertNotIn(token.id, queued)
+
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_success_clears_failures(self, mock_oauth):
+        """Test that a successful refresh clears the failure marks."""
+        token = self.tokens["soon"]
+        token.record_refresh_failure("timeout")
+        mock_oauth.return_value = oauth_mock()
+        refresh_spotify_token_task(token.id)
+        token.refresh_from_db()
+        self.assertEqual(token.refresh_failures, 0)
+        self.assertEqual(token.refresh_error, "")
+        self.assertIsNone(token.refresh_failed_at)
+
+    @patch("spotify_filter.spotify_import.api.spotipy.Spotify")
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_importer_uses_fresh_token_without_refresh(self, mock_oauth, mock_sp):
+        """Test that the importer doesn't refresh tokens that are still valid."""
+        SpotifyImporter(user=self.tokens["later"].user)
+        mock_oauth.assert_not_called()
+        mock_sp.assert_called_once_with(auth="old")
+
+    @patch("spotify_filter.spotify_import.api.spotipy.Spotify")
+    @patch("spotify_filter.spotify_import.api.get_spotify_oauth")
+    def test_importer_refreshes_expired_token(self, mock_oauth, mock_sp):
+        """Test that the importer still refreshes expired tokens itself."""
+        mock_oauth.return_value = oauth_mock()
+        SpotifyImporter(user=self.tokens["expired"].user)
+        mock_sp.assert_called_once_with(auth="fresh")
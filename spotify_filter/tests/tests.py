@@ -1,15 +1,25 @@
 import json
 import logging
-from unittest.mock import MagicMock, patch
+from datetime import datetime, timezone
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
 
 from spotify_filter.filters import AlbumFilter, ArtistFilter
-from spotify_filter.models import Album, AlbumTrack, Artist, Genre, Track
+from spotify_filter.models import (
+    Album,
+    AlbumTrack,
+    Artist,
+    Genre,
+    LibraryAlbum,
+    LibraryArtist,
+    Track,
+)
 from spotify_filter.spotify_import.import_logic import import_from_spotify
 from spotify_filter.tasks import import_spotify_data_task
+from spotify_filter.tests.helpers import mock_importer
 
 logging.disable(logging.CRITICAL)
 
@@ -127,16 +137,12 @@ class ArtistModelTests(TestCase):
 
     def test_name_verbose_name(self):
         """Test the verbose_name of the name field in Artist model."""
-        artist = Artist(
-            user=get_user_model().objects.create_user(username="testuser"),
-        )
+        artist = Artist()
         self.assertEqual(artist._meta.get_field("name").verbose_name, "Artist Name")
 
     def test_genres_verbose_name(self):
         """Test the verbose_name of the genres field in Artist model."""
-        artist = Artist(
-            user=get_user_model().objects.create_user(username="testuser"),
-        )
+        artist = Artist()
         self.assertEqual(artist._meta.get_field("genres").verbose_name, "Genres")
 
     def test_artist_with_genres(self):
@@ -350,6 +356,28 @@ class ArtistDetailViewTests(TestCase):
         )
         self.assertTemplateUsed(response, "spotify_filter/artist_detail.html")
 
+    def test_artist_detail_view_query_count_is_constant(self):
+        """Test that the number of queries doesn't grow with albums or genres."""
+        artist = Artist.objects.create(
+            user=self.user,
+            spotify_id="a1",
+            name="Artist One",
+        )
+        for i in range(10):
+            album = Album.objects.create(
+                user=self.user, spotify_id=f"al{i}", title=f"Album {i}"
+            )
+            album.artists.add(artist)
+            artist.genres.add(Genre.objects.create(name=f"genre {i}"))
+
+        # session, user, library state, artist, albums, genres, similar artists
+        with self.assertNumQueries(7):
+            response = self.client.get(
+                reverse("spotify_filter:artist_detail", args=(artist.id,))
+            )
+        self.assertContains(response, "Album 9")
+        self.assertContains(response, "genre 9")
+
 
 class AlbumDetailViewTests(TestCase):
     """Tests for the AlbumDetailView."""
@@ -384,6 +412,31 @@ class AlbumDetailViewTests(TestCase):
         )
         self.assertTemplateUsed(response, "spotify_filter/album_detail.html")
 
+    def test_album_detail_view_query_count_is_constant(self):
+        """Test that the number of queries doesn't grow with tracks or artists."""
+        album = Album.objects.create(
+            user=self.user,
+            spotify_id="12345",
+            title="Test Album",
+        )
+        for i in range(3):
+            album.artists.add(
+                Artist.objects.create(
+                    user=self.user, spotify_id=f"a{i}", name=f"Artist {i}"
+                )
+            )
+        for i in range(30):
+            track = Track.objects.create(spotify_id=f"t{i}", title=f"Track {i}")
+            AlbumTrack.objects.create(album=album, track=track, track_number=i + 1)
+
+        # session, user, library state, album, artists, album tracks with tracks
+        with self.assertNumQueries(6):
+            response = self.client.get(
+                reverse("spotify_filter:album_detail", args=(album.id,))
+            )
+        self.assertContains(response, "Artist 2")
+        self.assertContains(response, "30. Track 29")
+
 
 class DashboardViewTests(TestCase):
     """Tests for the DashboardView."""
@@ -420,6 +473,21 @@ class DashboardViewTests(TestCase):
         self.assertIn(artist1, response.context["artist_list"])
         self.assertIn(artist2, response.context["artist_list"])
 
+    def test_dashboard_albums_sorted_by_added_at(self):
+        """Test that albums can be sorted by when the user saved them."""
+        for year, title in [(2023, "Older"), (2025, "Newer")]:
+            Album.objects.create(
+                user=self.user,
+                spotify_id=title,
+                title=title,
+                added_at=datetime(year, 1, 1, tzinfo=timezone.utc),
+            )
+        response = self.client.get(
+            reverse("spotify_filter:dashboard") + "?view=albums&sort=-added_at"
+        )
+        titles = [row.record.title for row in response.context["table"].rows]
+        self.assertEqual(titles, ["Newer", "Older"])
+
 
 class ImportSpotifyTests(TestCase):
     """Tests for the Spotify data import functionality."""
@@ -439,12 +507,13 @@ class ImportSpotifyTests(TestCase):
         user = get_user_model().objects.create_user(
             username="testuser", password="testpass"
         )
-        mock_importer = MagicMock()
-        mock_importer.retrieve_albums.return_value = self.two_albums
-        mock_importer.retrieve_artists_by_id.return_value = self.two_artists
-        mock_importer.user = user
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.two_albums
+        importer.retrieve_artists_by_id.return_value = self.two_artists
+        importer.user = user
 
-        stats = import_from_spotify(user, importer=mock_importer)
+        stats = import_from_spotify(user, importer=importer)
+        stats.pop("timing")
 
         assert stats == {
             "albums_processed": 2,
@@ -454,23 +523,29 @@ class ImportSpotifyTests(TestCase):
             "artists_failed": 0,
             "tracks_processed": 25,
             "tracks_failed": 0,
+            "albums_removed": 0,
+            "artists_removed": 0,
+            "album_pages_failed": 0,
+            "track_pages_failed": 0,
         }
         assert Album.objects.count() == 2
         assert Artist.objects.count() == 2
         assert Track.objects.count() == 25
         assert AlbumTrack.objects.count() == 25
 
-    @patch("spotify_filter.tasks.import_from_spotify")
-    def test_celery_task_runs(self, mock_import):
+    @patch("spotify_filter.tasks.enrich_library_task")
+    @patch("spotify_filter.spotify_import.import_logic.import_from_spotify")
+    def test_celery_task_runs(self, mock_import, mock_enrich):
         """Test that the import_spotify_data_task calls the import function."""
         user = get_user_model().objects.create_user(username="testuser")
         import_spotify_data_task(user.id)
-        mock_import.assert_called_once()
+        mock_import.assert_called_once_with(user, enrich=False)
+        mock_enrich.delay.assert_called_once_with(user.id)
 
     def test_import_from_spotify_data_error_in_album(self):
         """Test handling of KeyError exception when album data is weird"""
-        mock_importer = MagicMock()
-        mock_importer.retrieve_albums.return_value = [
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = [
             {
                 "added_at": "",
                 "album": {
@@ -480,10 +555,11 @@ class ImportSpotifyTests(TestCase):
                 },
             }
         ]
-        mock_importer.retrieve_artists_by_id.return_value = []
+        importer.retrieve_artists_by_id.return_value = []
 
         user = get_user_model().objects.create_user(username="testuser")
-        stats = import_from_spotify(user, importer=mock_importer)
+        stats = import_from_spotify(user, importer=importer)
+        stats.pop("timing")
         assert stats == {
             "albums_processed": 0,
             "albums_failed": 1,
@@ -492,20 +568,25 @@ class ImportSpotifyTests(TestCase):
             "artists_failed": 0,
             "tracks_processed": 0,
             "tracks_failed": 0,
+            "albums_removed": 0,
+            "artists_removed": 0,
+            "album_pages_failed": 0,
+            "track_pages_failed": 0,
         }
 
     def test_import_from_spotify_data_error_in_artist(self):
         """Test handling of KeyError exception when artist data is weird"""
         user = get_user_model().objects.create_user(username="testuser")
-        mock_importer = MagicMock()
-        mock_importer.retrieve_albums.return_value = self.two_albums
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.two_albums
         correct_artists = self.two_artists
-        mock_importer.retrieve_artists_by_id.return_value = [
+        importer.retrieve_artists_by_id.return_value = [
             {"id": ar["id"]} for ar in correct_artists
         ]
-        mock_importer.user = user
+        importer.user = user
 
-        stats = import_from_spotify(user, importer=mock_importer)
+        stats = import_from_spotify(user, importer=importer)
+        stats.pop("timing")
         assert stats == {
             "albums_processed": 2,
             "albums_failed": 0,
@@ -514,6 +595,10 @@ class ImportSpotifyTests(TestCase):
             "artists_failed": 2,
             "tracks_processed": 25,
             "tracks_failed": 0,
+            "albums_removed": 0,
+            "artists_removed": 0,
+            "album_pages_failed": 0,
+            "track_pages_failed": 0,
         }
 
 
@@ -637,18 +722,52 @@ class MultiUserDataIsolationTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
     def test_same_spotify_artist_for_different_users(self):
-        """Test that the same Spotify artist can exist for different users."""
-        Artist.objects.create(user=self.user1, spotify_id="artist1", name="Artist")
-        Artist.objects.create(user=self.user2, spotify_id="artist1", name="Artist")
+        """Test that users share one catalog entry of the same Spotify artist."""
+        artist = Artist.objects.create(
+            user=self.user1, spotify_id="artist1", name="Artist"
+        )
+        LibraryArtist.objects.create(user=self.user2, artist=artist)
 
-        self.assertEqual(Artist.objects.filter(spotify_id="artist1").count(), 2)
+        self.assertEqual(Artist.objects.filter(spotify_id="artist1").count(), 1)
+        self.assertIn(artist, Artist.objects.for_user(self.user1))
+        self.assertIn(artist, Artist.objects.for_user(self.user2))
 
     def test_same_spotify_album_for_different_users(self):
-        """Test that the same Spotify album can exist for different users."""
-        Album.objects.create(user=self.user1, spotify_id="album1", title="Album")
-        Album.objects.create(user=self.user2, spotify_id="album1", title="Album")
+        """Test that users share one catalog entry of the same Spotify album."""
+        album = Album.objects.create(
+            user=self.user1,
+            spotify_id="album1",
+            title="Album",
+            added_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        )
+        LibraryAlbum.objects.create(
+            user=self.user2,
+            album=album,
+            added_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        )
+
+        self.assertEqual(Album.objects.filter(spotify_id="album1").count(), 1)
+        self.assertEqual(Album.objects.for_user(self.user1).get().added_at.year, 2024)
+        self.assertEqual(Album.objects.for_user(self.user2).get().added_at.year, 2025)
+
+    def test_user_only_sees_own_albums_of_shared_artist(self):
+        """Test that the artist page lists only the user's albums of the artist."""
+        artist = Artist.objects.create(user=self.user1, spotify_id="1", name="Artist")
+        LibraryArtist.objects.create(user=self.user2, artist=artist)
+        Album.objects.create(
+            user=self.user1, spotify_id="a1", title="Mine"
+        ).artists.add(artist)
+        Album.objects.create(
+            user=self.user2, spotify_id="a2", title="Theirs"
+        ).artists.add(artist)
+
+        self.client.login(username="user1", password="pass1")
+        response = self.client.get(
+            reverse("spotify_filter:artist_detail", args=[artist.pk])
+        )
 
-        self.assertEqual(Album.objects.filter(spotify_id="album1").count(), 2)
+        self.assertContains(response, "Mine")
+        self.assertNotContains(response, "Theirs")
 
 
 class AuthenticationRequirementTests(TestCase):
@@ -706,45 +825,43 @@ class MultiUserImportTests(TestCase):
             username="testuser", password="testpass"
         )
 
-        mock_importer = MagicMock()
-        mock_importer.retrieve_albums.return_value = self.two_albums
-        mock_importer.retrieve_artists_by_id.return_value = self.two_artists
-        mock_importer.user = user
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.two_albums
+        importer.retrieve_artists_by_id.return_value = self.two_artists
+        importer.user = user
 
-        import_from_spotify(user, importer=mock_importer)
+        import_from_spotify(user, importer=importer)
 
-        # Check all albums belong to user
-        for album in Album.objects.all():
-            self.assertEqual(album.user, user)
+        # Check all albums are in the user's library
+        self.assertEqual(Album.objects.for_user(user).count(), Album.objects.count())
 
-        # Check all artists belong to user
-        for artist in Artist.objects.all():
-            self.assertEqual(artist.user, user)
+        # Check all artists are in the user's library
+        self.assertEqual(Artist.objects.for_user(user).count(), Artist.objects.count())
 
-    def test_import_for_different_users_creates_separate_data(self):
-        """Test that imports for different users create separate data."""
+    def test_import_for_different_users_shares_the_catalog(self):
+        """Test that imports for different users share the catalog entries."""
         user1 = get_user_model().objects.create_user(username="user1")
         user2 = get_user_model().objects.create_user(username="user2")
 
-        mock_importer = MagicMock()
-        mock_importer.retrieve_albums.return_value = self.two_albums
-        mock_importer.retrieve_artists_by_id.return_value = self.two_artists
-        mock_importer.user = None
+        importer = mock_importer()
+        importer.retrieve_albums.return_value = self.two_albums
+        importer.retrieve_artists_by_id.return_value = self.two_artists
+        importer.user = None
 
         # Import for user1
-        import_from_spotify(user1, importer=mock_importer)
-        user1_albums = Album.objects.filter(user=user1).count()
-        user1_artists = Artist.objects.filter(user=user1).count()
+        import_from_spotify(user1, importer=importer)
+        user1_albums = Album.objects.for_user(user1).count()
+        user1_artists = Artist.objects.for_user(user1).count()
 
         # Import for user2
-        import_from_spotify(user2, importer=mock_importer)
-        user2_albums = Album.objects.filter(user=user2).count()
-        user2_artists = Artist.objects.filter(user=user2).count()
+        import_from_spotify(user2, importer=importer)
+        user2_albums = Album.objects.for_user(user2).count()
+        user2_artists = Artist.objects.for_user(user2).count()
 
-        # Both users should have the same count (separate data)
+        # Both users should have the same library
         self.assertEqual(user1_albums, user2_albums)
         self.assertEqual(user1_artists, user2_artists)
 
-        # Total should be double
-        self.assertEqual(Album.objects.count(), user1_albums + user2_albums)
-        self.assertEqual(Artist.objects.count(), user1_artists + user2_artists)
+        # The catalog is stored once
+        self.assertEqual(Album.objects.count(), user1_albums)
+        self.assertEqual(Artist.objects.count(), user1_artists)
@@ -22,9 +22,12 @@ urlpatterns = [
     ),
     path("spotify/connect/", views.spotify_connect, name="spotify_connect"),
     path("spotify/callback/", views.spotify_callback, name="spotify_callback"),
+    path("upload/", views.upload_library, name="upload_library"),
     path("importing/<str:task_id>/", views.importing, name="importing"),
     path("tasks/status/<str:task_id>/", views.task_status, name="task_status"),
     path("dashboard/", views.DashboardView.as_view(), name="dashboard"),
+    path("stats/", views.StatsView.as_view(), name="stats"),
+    path("export/<str:export_format>/", views.export_library, name="export"),
     path("artist/<str:pk>/", views.ArtistDetailView.as_view(), name="artist_detail"),
     path("album/<str:pk>/", views.AlbumDetailView.as_view(), name="album_detail"),
 ]
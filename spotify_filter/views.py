@@ -1,21 +1,231 @@
+import csv
+import hashlib
+import json
+from functools import wraps
+
 from celery.result import AsyncResult
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import JsonResponse
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.response import SimpleTemplateResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.views.generic.edit import CreateView
 from django_filters.views import FilterView
 from django_tables2.views import SingleTableMixin
 
+from .analytics import LibraryAnalytics
 from .filters import AlbumFilter, ArtistFilter
-from .forms import UserRegisterForm
-from .models import Album, Artist, SpotifyToken
-from .spotify_import.api import get_spotify_oauth
+from .forms import LibraryUploadForm, UserRegisterForm
+from .models import (
+    Album,
+    AlbumTrack,
+    Artist,
+    ArtistSimilarity,
+    LibraryState,
+    LibraryStats,
+    LibraryUpload,
+    SpotifyToken,
+)
+from .routers import iterate_on_replica, replica_configured, replica_reads
 from .tables import AlbumTable, ArtistTable
-from .tasks import import_spotify_data_task
+from .tasks import import_library_file_task, import_spotify_data_task
+
+
+def library_last_modified(request, *_args, **_kwargs):
+    """Return when the requesting user's library last changed."""
+    if not request.user.is_authenticated:
+        return None
+    if not hasattr(request, "library_last_modified"):
+        request.library_last_modified = LibraryState.last_modified_for(request.user)
+    return request.library_last_modified
+
+
+def content_last_modified(request, *_args, **_kwargs):
+    """
+    Return when the content of the requesting user's library pages last
+    changed: their library or the shared catalog, which other users'
+    imports update.
+    """
+    if not request.user.is_authenticated:
+        return None
+    if not hasattr(request, "content_last_modified"):
+        request.content_last_modified = LibraryState.content_last_modified_for(
+            request.user
+        )
+    return request.content_last_modified
+
+
+def library_etag(request, *args, **kwargs):
+    """
+    Build an ETag from the version of the user's library pages. The CSRF
+    cookie is included so that a cached page never carries a stale token
+    for the logout form.
+    """
+    last_modified = content_last_modified(request, *args, **kwargs)
+    if last_modified is None:
+        return None
+    key = ":".join(
+        [
+            str(request.user.pk),
+            last_modified.isoformat(),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        ]
+    )
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def reads_from_replica(view_func):
+    """
+    Run a read-only view with its queries sent to the replica database,
+    unless the user's library changed within REPLICA_READ_YOUR_WRITES_WINDOW
+    and the replica may not have caught up yet. Template responses are
+    rendered and streaming responses are produced on the replica too.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not replica_configured():
+            return view_func(request, *args, **kwargs)
+        # the user and their library state are read from the primary
+        last_modified = library_last_modified(request)
+        window_start = timezone.now() - settings.REPLICA_READ_YOUR_WRITES_WINDOW
+        if last_modified is not None and last_modified > window_start:
+            return view_func(request, *args, **kwargs)
+        with replica_reads():
+            response = view_func(request, *args, **kwargs)
+            if isinstance(response, SimpleTemplateResponse):
+                response.render()
+        if response.streaming:
+            response.streaming_content = iterate_on_replica(response.streaming_content)
+        return response
+
+    return wrapper
+
+
+class LibraryConditionalMixin:
+    """
+    Answer GET requests with 304 Not Modified while neither the user's
+    library nor the catalog changed since the client's copy of the page.
+    """
+
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(
+        condition(etag_func=library_etag, last_modified_func=content_last_modified)
+    )
+    def get(self, request, *args, **kwargs):
+        """Render the page unless the client's copy is still current."""
+        return super().get(request, *args, **kwargs)
+
+
+EXPORT_CHUNK_SIZE = 500
+CSV_EXPORT_FIELDS = [
+    "spotify_id",
+    "title",
+    "artists",
+    "release_date",
+    "added_at",
+    "total_tracks",
+    "popularity",
+]
+
+
+class Echo:
+    """Pseudo-buffer whose write returns the value instead of storing it."""
+
+    def write(self, value):
+        """Return the written value so csv.writer output can be streamed."""
+        return value
+
+
+def _iter_export_albums(user, with_tracks=False):
+    """
+    Iterate over the user's albums through a server-side cursor. Related
+    objects are prefetched once per chunk, so the number of queries depends
+    on the number of chunks and the memory used on the chunk size only.
+    """
+    prefetches = ["artists"]
+    if with_tracks:
+        prefetches.append(
+            Prefetch(
+                "albumtrack_set", queryset=AlbumTrack.objects.select_related("track")
+            )
+        )
+    return (
+        Album.objects.for_user(user)
+        .order_by("id")
+        .prefetch_related(*prefetches)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _stream_csv(user):
+    """Yield the user's library as CSV lines, one album per line."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_EXPORT_FIELDS)
+    for album in _iter_export_albums(user):
+        yield writer.writerow(
+            [
+                album.spotify_id,
+                album.title,
+                ", ".join(artist.name for artist in album.artists.all()),
+                album.release_date.isoformat(),
+                album.added_at.isoformat(),
+                album.total_tracks,
+                album.popularity,
+            ]
+        )
+
+
+def _stream_ndjson(user):
+    """Yield the user's library as newline-delimited JSON, one album per line."""
+    for album in _iter_export_albums(user, with_tracks=True):
+        record = {
+            "spotify_id": album.spotify_id,
+            "title": album.title,
+            "artists": [
+                {"spotify_id": artist.spotify_id, "name": artist.name}
+                for artist in album.artists.all()
+            ],
+            "release_date": album.release_date.isoformat(),
+            "added_at": album.added_at.isoformat(),
+            "total_tracks": album.total_tracks,
+            "popularity": album.popularity,
+            "tracks": [
+                {
+                    "spotify_id": rel.track.spotify_id,
+                    "title": rel.track.title,
+                    "disc_number": rel.disc_number,
+                    "track_number": rel.track_number,
+                    "duration_ms": rel.track.duration_ms,
+                }
+                for rel in album.albumtrack_set.all()
+            ],
+        }
+        yield json.dumps(record) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (_stream_csv, "text/csv"),
+    "ndjson": (_stream_ndjson, "application/x-ndjson"),
+}
+
+
+def _bars(labels, counts):
+    """Pair labels with counts and their width relative to the largest count."""
+    largest = max(counts, default=0) or 1
+    return [
+        {"label": label, "count": int(count), "width": round(100 * count / largest)}
+        for label, count in zip(labels, counts)
+    ]
 
 
 def index(request):
@@ -26,6 +236,11 @@ def index(request):
 @login_required
 def spotify_connect(request):
     """Redirect user to Spotify for authorization"""
+    # imported here so that spotipy is only loaded by the OAuth views
+    from .spotify_import.api import (  # pylint: disable=import-outside-toplevel
+        get_spotify_oauth,
+    )
+
     sp_oauth = get_spotify_oauth()
     auth_url = sp_oauth.get_authorize_url()
     return redirect(auth_url)
@@ -34,6 +249,10 @@ def spotify_connect(request):
 @login_required
 def spotify_callback(request):
     """Handle Spotify OAuth callback"""
+    from .spotify_import.api import (  # pylint: disable=import-outside-toplevel
+        get_spotify_oauth,
+    )
+
     code = request.GET.get("code")
 
     sp_oauth = get_spotify_oauth()
@@ -55,6 +274,23 @@ def spotify_callback(request):
     return redirect("spotify_filter:importing", task_id=task.id)
 
 
+@login_required
+def upload_library(request):
+    """Import a library from an uploaded Spotify account data export."""
+    if request.method == "POST":
+        form = LibraryUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            # stored in the database, the worker may not see this file system
+            upload = LibraryUpload.objects.create(
+                user=request.user, data=form.cleaned_data["library_file"].read()
+            )
+            task = import_library_file_task.delay(request.user.id, upload.id)
+            return redirect("spotify_filter:importing", task_id=task.id)
+    else:
+        form = LibraryUploadForm()
+    return render(request, "spotify_filter/upload.html", {"form": form})
+
+
 @login_required
 def importing(request, task_id):
     """View to start the Spotify data import process."""
@@ -72,6 +308,20 @@ def task_status(request, task_id):
     )
 
 
+@reads_from_replica
+@login_required
+def export_library(request, export_format):
+    """Stream the user's library as a CSV or NDJSON download."""
+    if export_format not in EXPORT_FORMATS:
+        raise Http404(f"Unknown export format {export_format}")
+    stream, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream(request.user), content_type=content_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="spotify_library.{export_format}"'
+    )
+    return response
+
+
 class SignupView(SuccessMessageMixin, CreateView):
     """View for user signup/registration."""
 
@@ -81,7 +331,10 @@ class SignupView(SuccessMessageMixin, CreateView):
     success_message = "Your profile was created successfully"
 
 
-class DashboardView(LoginRequiredMixin, SingleTableMixin, FilterView):
+@method_decorator(reads_from_replica, name="dispatch")
+class DashboardView(
+    LoginRequiredMixin, LibraryConditionalMixin, SingleTableMixin, FilterView
+):
     """
     Dashboard view to display artists or albums with filtering and table representation.
     """
@@ -90,10 +343,13 @@ class DashboardView(LoginRequiredMixin, SingleTableMixin, FilterView):
 
     def get_queryset(self):
         """Provide the appropriate queryset based on the view mode."""
+        user = self.request.user
         view_mode = self.request.GET.get("view", "artists")
         if view_mode == "albums":
-            Album.objects.filter(user=self.request.user)
-        return Artist.objects.filter(user=self.request.user)
+            return Album.objects.for_user(user).prefetch_related("artists")
+        return Artist.objects.for_user(user).prefetch_related(
+            Prefetch("albums", queryset=Album.objects.for_user(user)), "genres"
+        )
 
     def get_filterset_class(self):
         """Provide the appropriate filterset class based on the view mode."""
@@ -112,37 +368,78 @@ class DashboardView(LoginRequiredMixin, SingleTableMixin, FilterView):
     def get_filterset_kwargs(self, filterset_class):
         """Provide the appropriate queryset to the filterset based on the view mode."""
         kwargs = super().get_filterset_kwargs(filterset_class)
-        view_mode = self.request.GET.get("view", "artists")
-        if view_mode == "albums":
-            kwargs["queryset"] = Album.objects.filter(user=self.request.user)
-        else:
-            kwargs["queryset"] = Artist.objects.filter(user=self.request.user)
+        kwargs["queryset"] = self.get_queryset()
         return kwargs
 
     def get_context_data(self, **kwargs):
         """Add the active view to the context data."""
         context = super().get_context_data(**kwargs)
         context["active_view"] = self.request.GET.get("view", "artists")
+        context["library_stats"] = LibraryStats.objects.filter(
+            user=self.request.user
+        ).first()
         return context
 
 
-class ArtistDetailView(LoginRequiredMixin, generic.DetailView):
+@method_decorator(reads_from_replica, name="dispatch")
+class ArtistDetailView(LoginRequiredMixin, LibraryConditionalMixin, generic.DetailView):
     """View to display detailed information about a specific artist."""
 
     model = Artist
     template_name = "spotify_filter/artist_detail.html"
 
     def get_queryset(self):
-        """Return the queryset for artists."""
-        return Artist.objects.filter(user=self.request.user)
-
-
-class AlbumDetailView(LoginRequiredMixin, generic.DetailView):
+        """Return the queryset for artists with everything the page renders."""
+        user = self.request.user
+        return Artist.objects.for_user(user).prefetch_related(
+            Prefetch("albums", queryset=Album.objects.for_user(user)),
+            "genres",
+            Prefetch(
+                "similarities",
+                queryset=ArtistSimilarity.objects.filter(user=user).select_related(
+                    "similar"
+                ),
+            ),
+        )
+
+
+@method_decorator(reads_from_replica, name="dispatch")
+class AlbumDetailView(LoginRequiredMixin, LibraryConditionalMixin, generic.DetailView):
     """View to display detailed information about a specific album."""
 
     model = Album
     template_name = "spotify_filter/album_detail.html"
 
     def get_queryset(self):
-        """Return the queryset for albums."""
-        return Album.objects.filter(user=self.request.user)
+        """Return the queryset for albums with everything the page renders."""
+        return Album.objects.for_user(self.request.user).prefetch_related(
+            "artists",
+            Prefetch(
+                "albumtrack_set", queryset=AlbumTrack.objects.select_related("track")
+            ),
+        )
+
+
+class StatsView(LoginRequiredMixin, LibraryConditionalMixin, generic.TemplateView):
+    """View to display statistics and charts about the user's library."""
+
+    template_name = "spotify_filter/stats.html"
+
+    def get_context_data(self, **kwargs):
+        """Add the statistics computed from the user's library to the context."""
+        context = super().get_context_data(**kwargs)
+        analytics = LibraryAnalytics.load(self.request.user)
+        years, year_counts = analytics.release_year_histogram()
+        months, month_counts = analytics.added_at_series(unit="M")
+        context["release_years"] = _bars(
+            [int(year) for year in years], year_counts.tolist()
+        )
+        context["added_per_month"] = _bars(
+            [str(month) for month in months], month_counts.tolist()
+        )
+        context["top_artists"] = [
+            {"name": name, "minutes": duration // 60000}
+            for name, duration in analytics.top_artists_by_duration()
+        ]
+        context["genre_pairs"] = analytics.top_genre_pairs()
+        return context